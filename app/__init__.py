@@ -1,37 +1,72 @@
+import time
+_import_started = time.perf_counter()
+
+import logging
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+from flask_migrate import Migrate
 from app.config import Config
-from app.logger import setup_logging
+from app.logger import setup_logging, init_app as init_request_logging
 
 db = SQLAlchemy()
 login_manager = LoginManager()
-logger = setup_logging()
+migrate = Migrate()
+# Обработчики и файлы логов настраиваются в create_app, импорт пакета ничего не создает на диске.
+# Подмодуль app.logger импортирован выше, поэтому имя logger здесь больше не перезапишется
+logger = logging.getLogger('quizmaster')
+access_logger = logging.getLogger('quizmaster.access')  # hot per-request lines, see LOG_ACCESS_*
+
+def create_app(config_class=Config):
+    from app import startup
+    timer = startup.StartupTimer(IMPORT_SECONDS)
+
+    with timer.phase('config'):
+        app = Flask(__name__)
+        app.config.from_object(config_class)
+        startup.enable_bytecode_cache(app)
+
+    with timer.phase('logging'):
+        setup_logging(app.config)
+        init_request_logging(app)
 
-def create_app():
-    app = Flask(__name__)
-    app.config.from_object(Config)
-    
     # Initialize extensions
-    db.init_app(app)
-    login_manager.init_app(app)
-    login_manager.login_view = 'auth.login'
-    
+    with timer.phase('extensions'):
+        db.init_app(app)
+        migrate.init_app(app, db, directory=app.config.get('MIGRATIONS_DIR', 'migrations'), render_as_batch=True)
+        from app.database import configure_engine
+        configure_engine(app)
+        from app import metrics
+        metrics.init_app(app)
+        from app import submission_queue
+        submission_queue.init_app(app)
+        from app import attempts
+        attempts.init_app(app)
+        from app import search
+        search.init_app(app)
+        login_manager.init_app(app)
+        login_manager.login_view = 'auth.login'
+
     # Register blueprints
-    from app.routes.main import main_bp
-    from app.routes.auth_routes import auth_bp
-    from app.routes.quiz_routes import quiz_bp
-    from app.routes.admin_routes import admin_bp
-    
-    app.register_blueprint(main_bp)
-    app.register_blueprint(auth_bp, url_prefix='/auth')
-    app.register_blueprint(quiz_bp, url_prefix='/quizzes')
-    app.register_blueprint(admin_bp)
-    
+    with timer.phase('blueprints'):
+        from app.routes.main import main_bp
+        from app.routes.auth_routes import auth_bp
+        from app.routes.quiz_routes import quiz_bp
+        from app.routes.admin_routes import admin_bp
+
+        app.register_blueprint(main_bp)
+        app.register_blueprint(auth_bp, url_prefix='/auth')
+        app.register_blueprint(quiz_bp, url_prefix='/quizzes')
+        app.register_blueprint(admin_bp)
+
     # User loader for Flask-Login
     @login_manager.user_loader
     def load_user(user_id):
-        from app.models import User
-        return User.query.get(int(user_id))
-    
-    return app
\ No newline at end of file
+        # Пользователь берется из TTL/LRU-кэша, без запроса к БД на каждый запрос
+        from app.user_cache import load_principal
+        return load_principal(int(user_id))
+
+    startup.finish(app, timer)
+    return app
+
+IMPORT_SECONDS = time.perf_counter() - _import_started
@@ -0,0 +1,383 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from flask_login.utils import decode_cookie
+from itsdangerous import BadSignature
+from sqlalchemy import insert, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+from werkzeug.http import parse_etags, quote_etag
+
+from app import logger, access_logger, database, quiz_cache, grading, variants, attempts, responses, item_stats, \
+    result_details, results_query, submission_queue, user_cache
+from app.models import Question, Answer, QuizAttempt, QuizResult, QuizResponse
+from app.routes.quiz_routes import PAYLOAD_MAX_AGE
+
+
+def async_url(uri):
+    """sqlite:///path -> sqlite+aiosqlite:///path"""
+    return make_url(uri).set(drivername='sqlite+aiosqlite')
+
+
+class AsyncApi:
+    """State of the async endpoints in one process
+
+    Reads and writes go through an aiosqlite engine whose pool is bounded
+    (ASYNC_DB_POOL_SIZE, no overflow): a request waiting for a connection
+    awaits on the event loop and gets 503 after ASYNC_DB_POOL_TIMEOUT.
+    SQLite has one writer, so the writers of this process take turns on an
+    asyncio lock instead of each holding a connection in the busy wait.
+    The compiled quizzes, answer keys, principals, autosave buffer and
+    submission queue are the ones of the Flask app in the same process.
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.config = flask_app.config
+        self.engine = create_async_engine(
+            async_url(self.config['SQLALCHEMY_DATABASE_URI']),
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=self.config.get('ASYNC_DB_POOL_SIZE', 8),
+            max_overflow=0,
+            pool_timeout=self.config.get('ASYNC_DB_POOL_TIMEOUT', 10),
+            connect_args={'timeout': 15}
+        )
+        if self.config.get('SQLITE_TUNING', True):
+            database.install_pragmas(self.engine, self.config)
+        self.write_lock = asyncio.Lock()
+        self._serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+        self._session_max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+
+    def _cookie_user_id(self, request):
+        """User id from the Flask session, else from the Flask-Login remember cookie, or None"""
+        session = {}
+        cookie = request.cookies.get(self.config['SESSION_COOKIE_NAME'])
+        if cookie and self._serializer is not None:
+            try:
+                session = self._serializer.loads(cookie, max_age=self._session_max_age)
+            except BadSignature:
+                pass
+        user_id = session.get('_user_id')
+        if user_id is None and session.get('_remember') != 'clear':
+            # Как Flask-Login: вошедший с «запомнить меня» после закрытия браузера приходит без сессии
+            remember = request.cookies.get(self.config.get('REMEMBER_COOKIE_NAME', 'remember_token'))
+            if remember:
+                user_id = decode_cookie(remember, key=self.config['SECRET_KEY'])
+        try:
+            return None if user_id is None else int(user_id)
+        except (TypeError, ValueError):
+            return None
+
+    async def principal(self, request):
+        """Principal of the Flask-Login session or remember cookie, None if not logged in"""
+        user_id = self._cookie_user_id(request)
+        if user_id is None:
+            return None
+
+        principal = user_cache.cached(user_id)
+        if principal is not None:
+            return principal
+        async with self.engine.connect() as conn:
+            row = (await conn.execute(user_cache.principal_statement(user_id))).first()
+        if row is None:
+            user_cache.invalidate(user_id)
+            return None
+        return user_cache.remember(row, self.config)
+
+    async def compiled_quiz(self, quiz_id, conn=None):
+        """quiz_cache.get_compiled_quiz, compiling a miss through the async engine"""
+        if quiz_cache.claim_version_check(self.config.get('QUIZ_CACHE_CHECK_SECONDS', 1.0)):
+            async with self.engine.connect() as version_conn:
+                version = await version_conn.run_sync(quiz_cache.read_version)
+            quiz_cache.apply_version(version)
+        compiled, generation = quiz_cache.lookup(quiz_id)
+        if compiled is not None:
+            return compiled
+        if conn is None:
+            async with self.engine.connect() as conn:
+                rows = (await conn.execute(quiz_cache.compile_statement(quiz_id))).all()
+        else:
+            rows = (await conn.execute(quiz_cache.compile_statement(quiz_id))).all()
+        compiled = quiz_cache.build_compiled(rows)
+        if compiled is None:
+            return None
+        return quiz_cache.store(compiled, generation, self.config.get('QUIZ_CACHE_SIZE', 128))
+
+    async def write(self, work):
+        """await work(conn) in one write transaction, committed when it returns"""
+        async with self.write_lock:
+            async with self.engine.begin() as conn:
+                return await work(conn)
+
+
+async def _insert_result(conn, pending, compiled):
+    """Async submission_queue.store_results for one submission; returns the result id"""
+    result_id = (await conn.execute(insert(QuizResult).values(
+        user_id=pending.user_id, quiz_id=pending.quiz_id, score=pending.score,
+        completed_at=pending.completed_at, details=pending.details
+    ))).inserted_primary_key[0]
+    rows = responses.response_rows(result_id, pending.results)
+    if rows:
+        await conn.execute(insert(QuizResponse), rows)
+    for statement, rows in item_stats.submission_upserts(compiled, pending.score, pending.results):
+        await conn.execute(statement, rows)
+    if pending.attempt_id is not None:
+        await conn.execute(attempts.link_statement(pending.attempt_id, result_id))
+    return result_id
+
+
+def _error(message, status_code):
+    return JSONResponse({'success': False, 'message': message}, status_code=status_code)
+
+
+def _login_required(endpoint):
+    async def wrapper(request):
+        principal = await request.app.state.api.principal(request)
+        if principal is None:
+            return _error('Login required', 401)
+        request.state.user = principal
+        return await endpoint(request)
+    wrapper.__name__ = endpoint.__name__
+    return wrapper
+
+
+async def _json_body(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+@_login_required
+async def quiz_payload(request):
+    """Same response as quiz.quiz_payload, ETag and ?v=<content hash> included"""
+    quiz = await request.app.state.api.compiled_quiz(request.path_params['quiz_id'])
+    if quiz is None:
+        return _error('Quiz not found', 404)
+
+    etag = quiz.content_hash
+    immutable = request.query_params.get('v') == etag
+    if parse_etags(request.headers.get('if-none-match')).contains(etag):
+        response = Response(status_code=304)
+    else:
+        response = JSONResponse({
+            'id': quiz.id,
+            'title': quiz.title,
+            'description': quiz.description,
+            'version': etag,
+            'draw_count': quiz.draw_count,
+            'questions': [] if quiz.is_pooled else quiz.payload()
+        })
+    response.headers['ETag'] = quote_etag(etag)
+    response.headers['Cache-Control'] = \
+        f'private, max-age={PAYLOAD_MAX_AGE}, immutable' if immutable else 'private, no-cache'
+    response.headers['Vary'] = 'Cookie'
+    return response
+
+
+@_login_required
+async def submit_quiz(request):
+    """quiz.submit_quiz: grade {question_id: [answer_id, ...]} and store the result"""
+    api = request.app.state.api
+    user = request.state.user
+    quiz_id = request.path_params['quiz_id']
+    try:
+        user_answers = await _json_body(request)
+        quiz = await api.compiled_quiz(quiz_id)
+        if quiz is None:
+            return _error('Quiz not found', 404)
+        if quiz.is_pooled:
+            # Вариант квиза с пулом известен только попытке
+            return _error('This quiz is submitted through an attempt', 400)
+
+        try:
+            full_results = grading.grade(grading.answer_key(quiz), user_answers)
+        except (AttributeError, TypeError, ValueError) as e:
+            # Нет тела, не JSON или не {question_id: [answer_id, ...]}
+            return _error(f'Invalid answers: {e}', 400)
+        pending = submission_queue.make_pending(user.id, quiz_id, grading.score(full_results), full_results)
+        await api.write(lambda conn: _insert_result(conn, pending, quiz))
+
+        access_logger.info('User %s completed quiz %s with score %s/%s', user.username, quiz_id,
+                           full_results['correct_count'], full_results['total_questions'])
+        return JSONResponse(dict(full_results, result_token=None))
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        logger.error('Error submitting quiz %s for user %s: %s', quiz_id, user.username, e)
+        return _error(str(e), 500)
+
+
+def _served_answers(owner, compiled, answers):
+    """{question_id: [answer_id, ...]} sent with the submit, only questions served in the attempt"""
+    question_ids = owner.question_ids if owner.question_ids is not None else compiled.questions_by_id
+    served = {}
+    for question_id, answer_ids in answers.items():
+        question_id = int(question_id)
+        if question_id not in question_ids:
+            raise ValueError(f'Question {question_id} was not served in this attempt')
+        served[str(question_id)] = attempts.normalize_answer_ids(answer_ids)
+    return served
+
+
+@_login_required
+async def submit_attempt(request):
+    """quiz.submit_attempt in a single transaction: claim, grade, insert the result, link it"""
+    api = request.app.state.api
+    user = request.state.user
+    attempt_id = request.path_params['attempt_id']
+    buffer = attempts.get_buffer(api.flask_app)
+
+    owner = buffer.known_owner(attempt_id)
+    if owner is None:
+        async with api.engine.connect() as conn:
+            row = (await conn.execute(
+                select(QuizAttempt.user_id, QuizAttempt.quiz_id, QuizAttempt.variant)
+                .where(QuizAttempt.id == attempt_id, QuizAttempt.submitted_at.is_(None))
+            )).first()
+        if row is not None:
+            owner = buffer.remember(attempt_id, row.user_id, row.quiz_id, variants.decode(row.variant))
+    if owner is None or owner.user_id != user.id:
+        return _error('Attempt not found', 404)
+
+    quiz_id = owner.quiz_id
+    try:
+        quiz = await api.compiled_quiz(quiz_id)
+        if quiz is None:
+            return _error('Quiz not found', 404)
+
+        # Клиент досылает ответы, автосохранение которых могло не успеть
+        data = await _json_body(request) or {}
+        try:
+            sent = _served_answers(owner, quiz, data.get('answers') or {})
+        except (AttributeError, TypeError, ValueError) as e:
+            return _error(f'Invalid answer: {e}', 400)
+
+        # В потоке: ждет сброса, идущего в фоне. Что сброшено до этого, прочитается из БД ниже
+        buffered = await asyncio.to_thread(buffer.pending_for, attempt_id)
+
+        async def grade_and_store(conn):
+            # Захват попытки берет блокировку записи SQLite: до коммита автосохранение ее не изменит
+            if (await conn.execute(attempts.claim_statement(attempt_id))).rowcount != 1:
+                return None
+            row = (await conn.execute(select(QuizAttempt.answers, QuizAttempt.variant)
+                                      .where(QuizAttempt.id == attempt_id))).one()
+            user_answers = json.loads(row.answers or '{}')
+            user_answers.update({str(q_id): a_ids for q_id, a_ids in buffered.items()})
+            user_answers.update(sent)
+
+            key = grading.answer_key(quiz)
+            if row.variant is not None:
+                # Оцениваются только вопросы выданного варианта
+                key = grading.variant_key(key, variants.decode(row.variant))
+            full_results = grading.grade(key, user_answers)
+            pending = submission_queue.make_pending(user.id, quiz_id, grading.score(full_results), full_results,
+                                                    attempt_id=attempt_id)
+            await _insert_result(conn, pending, quiz)
+            return full_results
+
+        full_results = await api.write(grade_and_store)
+        buffer.forget(attempt_id)
+        if full_results is None:
+            return _error('Attempt already submitted', 409)
+
+        access_logger.info('User %s completed quiz %s with score %s/%s', user.username, quiz_id,
+                           full_results['correct_count'], full_results['total_questions'])
+        return JSONResponse(dict(full_results, result_token=None, quiz_id=quiz_id))
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        logger.error('Error submitting attempt %s for user %s: %s', attempt_id, user.username, e)
+        return _error(str(e), 500)
+
+
+@_login_required
+async def quiz_result(request):
+    """The user's latest result of a quiz with question and answer texts, as JSON"""
+    api = request.app.state.api
+    user = request.state.user
+    quiz_id = request.path_params['quiz_id']
+
+    async with api.engine.connect() as conn:
+        result = (await conn.execute(results_query.latest_statement(user.id, quiz_id))).first()
+        queue = submission_queue.get_queue(api.flask_app)
+        if queue is not None:
+            # Результат из очереди еще может быть не записан в БД
+            pending = queue.get_pending(user.id, quiz_id, token=request.query_params.get('token'))
+            if pending and pending.quiz_id == quiz_id and (result is None or pending.completed_at >= result.completed_at):
+                result = pending
+        if result is None:
+            return _error('No result found for this quiz', 404)
+
+        quiz_results, items = result_details.parse_details(result.details)
+        if not isinstance(quiz_results, dict):
+            # Старый формат: только список результатов
+            correct = sum(1 for item in items if isinstance(item, dict) and item.get('is_correct'))
+            quiz_results = {'total_questions': len(items), 'correct_count': correct, 'incorrect_count': len(items) - correct}
+
+        # Тексты из кэша квиза, недостающие id — IN-запросами, как в result_details.load_texts
+        quiz = await api.compiled_quiz(quiz_id, conn)
+        questions, answers = result_details.compiled_texts(quiz)
+        question_ids, answer_ids = result_details.referenced_ids(items)
+        for column_id, column_text, texts, ids in ((Question.id, Question.text, questions, question_ids),
+                                                   (Answer.id, Answer.text, answers, answer_ids)):
+            for statement in result_details.text_statements(column_id, column_text, ids - texts.keys()):
+                texts.update((await conn.execute(statement)).all())
+
+    access_logger.info('User %s viewed result for quiz %s', user.username, quiz_id)
+    return JSONResponse(dict(
+        quiz_results,
+        success=True,
+        quiz_id=quiz_id,
+        title=quiz.title if quiz is not None else None,
+        score=result.score,
+        completed_at=result.completed_at.isoformat() if result.completed_at else None,
+        results=result_details.attach_texts(items, questions, answers)
+    ))
+
+
+async def _pool_exhausted(request, exc):
+    logger.warning('Async DB pool exhausted on %s', request.url.path)
+    return JSONResponse({'success': False, 'message': 'Server is busy, try again'}, status_code=503,
+                        headers={'Retry-After': '1'})
+
+
+ROUTES = [
+    Route('/quizzes/{quiz_id:int}/payload', quiz_payload),
+    Route('/quizzes/{quiz_id:int}/submit', submit_quiz, methods=['POST']),
+    Route('/quizzes/{quiz_id:int}/result', quiz_result),
+    Route('/attempts/{attempt_id:int}/submit', submit_attempt, methods=['POST']),
+]
+
+
+def create_asgi_app(flask_app):
+    """ASGI app: the async API under ASYNC_API_PREFIX, the Flask app for everything else"""
+    api = AsyncApi(flask_app)
+    prefix = flask_app.config.get('ASYNC_API_PREFIX', '/api')
+    # Страница прохождения отправляет ответы через асинхронный API
+    flask_app.config['ASYNC_API_ENABLED'] = True
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        await api.engine.dispose()
+
+    app = Starlette(
+        routes=[
+            Mount(prefix, routes=ROUTES),
+            # Остальные страницы обслуживает Flask из пула потоков
+            Mount('/', app=WSGIMiddleware(flask_app, workers=flask_app.config.get('ASGI_WSGI_THREADS', 32))),
+        ],
+        exception_handlers={PoolTimeout: _pool_exhausted},
+        lifespan=lifespan
+    )
+    app.state.api = api
+    logger.info('Async API enabled under %s (pool of %s connections)', prefix, api.engine.pool.size())
+    return app
@@ -0,0 +1,242 @@
+import atexit
+import json
+import threading
+import time
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from sqlalchemy import text
+
+from app import db, logger, variants
+from app.models import QuizAttempt
+
+# json_set меняет один ключ атомарно в БД: параллельные сбросы из разных процессов не затирают друг друга
+_SET_ANSWER = text(
+    "UPDATE quiz_attempt SET answers = json_set(answers, :path, json(:value)), updated_at = :updated_at "
+    "WHERE id = :attempt_id AND submitted_at IS NULL"
+)
+
+
+class AttemptOwner(NamedTuple):
+    attempt_id: int
+    user_id: int
+    quiz_id: int
+    question_ids: Optional[frozenset] = None  # served variant of a pooled quiz
+
+
+def get_open_attempt(user_id, quiz_id):
+    return QuizAttempt.query.filter_by(user_id=user_id, quiz_id=quiz_id, submitted_at=None)\
+        .order_by(QuizAttempt.id.desc()).first()
+
+
+def start_attempt(user_id, compiled):
+    """Return the user's open attempt of the quiz, creating one if needed
+
+    A new attempt of a pooled quiz gets its own seed and the drawn variant.
+    """
+    attempt = get_open_attempt(user_id, compiled.id)
+    if attempt is None:
+        attempt = QuizAttempt(user_id=user_id, quiz_id=compiled.id, answers='{}')
+        if compiled.is_pooled:
+            attempt.seed = variants.new_seed()
+            attempt.variant = variants.encode(variants.draw(compiled, attempt.seed))
+        db.session.add(attempt)
+        db.session.commit()
+    return attempt
+
+
+def normalize_answer_ids(answer_ids):
+    return sorted({int(a) for a in answer_ids or []})
+
+
+class AutosaveBuffer:
+    """Coalesces per-question autosaves in memory and flushes them in batches
+
+    Only the last selection of each (attempt, question) is kept, so a user
+    clicking through options costs one write per flush interval, not one
+    per click. A writer thread flushes every ATTEMPT_FLUSH_SECONDS with
+    one executemany; a full buffer wakes it early. Unflushed answers are
+    lost if the process dies, at most one interval's worth.
+
+    A flush holds _flush_lock from taking the answers out of the buffer
+    until they are committed, and pending_for and flush wait for it: an
+    answer is always either still in the buffer or already in the DB.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.flush_interval = app.config.get('ATTEMPT_FLUSH_SECONDS', 5.0)
+        self.max_pending = app.config.get('ATTEMPT_BUFFER_MAX', 10000)
+        self._pending = {}  # {(attempt_id, question_id): [answer_id, ...]}
+        self._owners = {}  # {attempt_id: AttemptOwner} of attempts seen by this process
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # held from the swap until the write is committed
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def _ensure_writer(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='attempt-autosave', daemon=True)
+                    self._thread.start()
+                    atexit.register(self.stop)
+
+    def owner(self, attempt_id):
+        """AttemptOwner of an open attempt, or None if it is missing or submitted"""
+        owner = self.known_owner(attempt_id)
+        if owner is not None:
+            return owner
+        row = db.session.query(QuizAttempt.user_id, QuizAttempt.quiz_id, QuizAttempt.variant)\
+            .filter(QuizAttempt.id == attempt_id, QuizAttempt.submitted_at.is_(None)).first()
+        if row is None:
+            return None
+        return self.remember(attempt_id, row.user_id, row.quiz_id, variants.decode(row.variant))
+
+    def known_owner(self, attempt_id):
+        """AttemptOwner seen by this process, without a DB read"""
+        with self._lock:
+            return self._owners.get(attempt_id)
+
+    def remember(self, attempt_id, user_id, quiz_id, question_ids=None):
+        owner = AttemptOwner(attempt_id, user_id, quiz_id, None if question_ids is None else frozenset(question_ids))
+        with self._lock:
+            if len(self._owners) >= self.max_pending:
+                self._owners.clear()  # брошенные попытки; при промахе владелец читается из БД
+            self._owners[attempt_id] = owner
+        return owner
+
+    def record(self, attempt_id, question_id, answer_ids):
+        """Buffer the current selection of one question"""
+        if self.flush_interval <= 0:
+            self._write({(attempt_id, question_id): answer_ids})
+            return
+        self._ensure_writer()
+        with self._lock:
+            self._pending[(attempt_id, question_id)] = answer_ids
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wake.set()
+
+    def pending_for(self, attempt_id):
+        """Buffered answers of an attempt; waits for a flush in progress to commit"""
+        with self._flush_lock, self._lock:
+            return {q_id: a_ids for (a_id, q_id), a_ids in self._pending.items() if a_id == attempt_id}
+
+    def flush(self, attempt_id=None):
+        """Write buffered answers (of one attempt or all) and commit
+
+        Returns after every answer of the attempt recorded so far is
+        committed, including the ones a concurrent flush had taken.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if attempt_id is None:
+                    batch, self._pending = self._pending, {}
+                else:
+                    keys = [key for key in self._pending if key[0] == attempt_id]
+                    batch = {key: self._pending.pop(key) for key in keys}
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception:
+                    # Возвращаем несохраненное в буфер, если пользователь не успел ответить заново
+                    with self._lock:
+                        for key, answer_ids in batch.items():
+                            self._pending.setdefault(key, answer_ids)
+                    raise
+        return len(batch)
+
+    def forget(self, attempt_id):
+        with self._lock:
+            self._owners.pop(attempt_id, None)
+            for key in [key for key in self._pending if key[0] == attempt_id]:
+                del self._pending[key]
+
+    def _write(self, batch):
+        now = datetime.utcnow()
+        params = [{'attempt_id': a_id, 'path': f'$."{q_id}"', 'value': json.dumps(a_ids), 'updated_at': now}
+                  for (a_id, q_id), a_ids in batch.items()]
+        try:
+            db.session.execute(_SET_ANSWER, params)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error('Autosave flush of %s answers failed: %s', len(params), e)
+            raise
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stopping.is_set():
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                started = time.perf_counter()
+                try:
+                    n = self.flush()
+                except Exception:
+                    continue
+                finally:
+                    db.session.remove()
+                if n:
+                    logger.debug('Autosave flushed %s answers in %.3fs', n, time.perf_counter() - started)
+
+    def stop(self):
+        """Flush what is left and stop the writer thread"""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        with self.app.app_context():
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+
+def load_answers(buffer, attempt):
+    """Stored answers of an attempt merged with the ones still in the buffer"""
+    answers = json.loads(attempt.answers or '{}')
+    answers.update({str(q_id): a_ids for q_id, a_ids in buffer.pending_for(attempt.id).items()})
+    return answers
+
+
+def claim_attempt(buffer, attempt_id):
+    """Mark an open attempt as submitted, in the caller's transaction
+
+    Returns False if it was already submitted (a concurrent or repeated
+    submit), so every attempt is graded once.
+    """
+    buffer.forget(attempt_id)
+    return db.session.execute(claim_statement(attempt_id)).rowcount == 1
+
+
+def claim_statement(attempt_id):
+    return db.update(QuizAttempt)\
+        .where(QuizAttempt.id == attempt_id, QuizAttempt.submitted_at.is_(None))\
+        .values(submitted_at=datetime.utcnow())\
+        .execution_options(synchronize_session=False)
+
+
+def link_result(attempt_id, result_id):
+    db.session.execute(link_statement(attempt_id, result_id))
+
+
+def link_statement(attempt_id, result_id):
+    return db.update(QuizAttempt).where(QuizAttempt.id == attempt_id).values(result_id=result_id)\
+        .execution_options(synchronize_session=False)
+
+
+def reopen_attempt(attempt_id):
+    """Undo claim_attempt after the result could not be saved"""
+    db.session.query(QuizAttempt).filter(QuizAttempt.id == attempt_id, QuizAttempt.result_id.is_(None))\
+        .update({'submitted_at': None}, synchronize_session=False)
+
+
+def init_app(app):
+    app.extensions['attempt_buffer'] = AutosaveBuffer(app)
+
+
+def get_buffer(app):
+    return app.extensions['attempt_buffer']
+
@@ -5,12 +5,99 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-key-quizmaster-pro'
     SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(Path(__file__).parent.parent, 'quizmaster.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    MIGRATIONS_DIR = os.path.join(Path(__file__).parent.parent, 'migrations')  # `flask db upgrade` for existing databases
+    
+    # Connection pool for multi-threaded servers; the sqlite3 timeout (seconds)
+    # is the busy wait used before "database is locked" is raised
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': 30,
+        'connect_args': {'timeout': 15, 'check_same_thread': False},
+    }
+    
+    # SQLite tuning, applied on every new connection (see app/database.py)
+    SQLITE_TUNING = os.environ.get('SQLITE_TUNING', '1') != '0'
+    SQLITE_JOURNAL_MODE = 'WAL'  # readers no longer block the writer
+    SQLITE_SYNCHRONOUS = 'NORMAL'  # safe with WAL, fsync only at checkpoints
+    SQLITE_BUSY_TIMEOUT = 15000  # ms
+    SQLITE_CACHE_SIZE = -65536  # negative value is KiB: 64 MB page cache per connection
+    SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+    SQLITE_TEMP_STORE = 'MEMORY'
     
     # Logging settings
     LOG_FOLDER = os.path.join(Path(__file__).parent.parent, 'logs')
     LOG_FILE = os.path.join(LOG_FOLDER, 'quizmaster.log')
     ERROR_LOG_FILE = os.path.join(LOG_FOLDER, 'errors.log')
     LOG_LEVEL = 'INFO'
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')  # 'text' or 'json'
+    LOG_ASYNC = os.environ.get('LOG_ASYNC', '1') != '0'  # write log files from a background thread
+    LOG_SOURCE_LOCATION = os.environ.get('LOG_SOURCE_LOCATION', '1') != '0'  # [in path:line] in text logs
+    # Per-request info lines (page views, submits): level and share of records kept
+    LOG_ACCESS_LEVEL = os.environ.get('LOG_ACCESS_LEVEL', 'INFO')
+    LOG_ACCESS_SAMPLE_RATE = float(os.environ.get('LOG_ACCESS_SAMPLE_RATE', '1.0'))
+    
+    # Request/SQL instrumentation (/admin/metrics, /metrics); nothing is hooked when off
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'
+    METRICS_SLOW_QUERY_MS = 100
+    METRICS_N_PLUS_ONE_THRESHOLD = 10  # same statement this many times in one request
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # Bearer token for scrapers, admins need none
+    
+    # Startup: on-disk Jinja bytecode cache and optional warm-up before serving
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR', os.path.join(Path(__file__).parent.parent, '.jinja_cache'))
+    STARTUP_PRECOMPILE_TEMPLATES = os.environ.get('STARTUP_PRECOMPILE_TEMPLATES', '0') == '1'
+    STARTUP_WARM_QUIZZES = os.environ.get('STARTUP_WARM_QUIZZES', '0') == '1'
+    
+    # Cached user principals behind load_user; TTL bounds staleness across processes
+    USER_CACHE_TTL = 300
+    USER_CACHE_SIZE = 1024
+    
+    # Write-behind submission queue: 'off' (commit in the request), 'durable'
+    # (request waits for the group commit) or 'async' (request returns at once)
+    SUBMIT_QUEUE_MODE = os.environ.get('SUBMIT_QUEUE_MODE', 'off')
+    SUBMIT_QUEUE_BATCH_SIZE = 200
+    SUBMIT_QUEUE_FLUSH_MS = 50
+    SUBMIT_QUEUE_MAX_SIZE = 5000
+    SUBMIT_QUEUE_PUT_TIMEOUT = 2.0  # seconds to wait for room before writing directly
+    SUBMIT_QUEUE_COMMIT_TIMEOUT = 30.0
+    
+    # Autosave of in-progress attempts: answers are coalesced in memory and
+    # written every ATTEMPT_FLUSH_SECONDS (0 writes every autosave at once)
+    ATTEMPT_FLUSH_SECONDS = float(os.environ.get('ATTEMPT_FLUSH_SECONDS', '5'))
+    ATTEMPT_BUFFER_MAX = 10000
+    
+    # SQLite FTS5 index over question and answer text for the admin search,
+    # created by the migrations and kept in sync by triggers; startup only
+    # warns if it is missing
+    SEARCH_INDEX = True
+    
+    # Bulk user import and password reset hash passwords on a process pool
+    # of this many workers (None: one per CPU)
+    USER_HASH_WORKERS = int(os.environ['USER_HASH_WORKERS']) if os.environ.get('USER_HASH_WORKERS') else None
+    
+    # One-time quiz links minted by admins (hours until a new batch expires)
+    QUIZ_LINK_TTL_HOURS = 72
+    
+    # Async API tier (asgi.py): payload, submit and result run on the event loop
+    # with aiosqlite; the pool is bounded, a request that waits longer than the
+    # timeout for a connection gets 503. Flask serves the rest from a thread pool
+    ASYNC_API_PREFIX = '/api'
+    ASYNC_DB_POOL_SIZE = int(os.environ.get('ASYNC_DB_POOL_SIZE', 8))
+    ASYNC_DB_POOL_TIMEOUT = 10  # seconds
+    ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 32))
+    
+    # Production runner (python asgi.py): uvicorn processes and per-process limits
+    ASGI_HOST = os.environ.get('ASGI_HOST', '0.0.0.0')
+    ASGI_PORT = int(os.environ.get('ASGI_PORT', 8000))
+    ASGI_WORKERS = int(os.environ.get('ASGI_WORKERS', 1))
+    ASGI_LIMIT_CONCURRENCY = int(os.environ.get('ASGI_LIMIT_CONCURRENCY', 4000))  # 503 above this many open connections
+    ASGI_BACKLOG = 4096
+    ASGI_KEEP_ALIVE = 5  # seconds
+    
+    # Compiled quiz cache (number of quizzes kept in memory per process). Edits made
+    # by other processes are noticed through content_version, read at most this often
+    QUIZ_CACHE_SIZE = 128
+    QUIZ_CACHE_CHECK_SECONDS = float(os.environ.get('QUIZ_CACHE_CHECK_SECONDS', '1.0'))
     
     # Material UI color scheme
     THEME_COLORS = {
@@ -0,0 +1,73 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app import db, logger
+
+
+def sqlite_pragmas(config):
+    """PRAGMA statements applied to every new SQLite connection"""
+    pragmas = []
+    if config.get('SQLITE_BUSY_TIMEOUT') is not None:
+        pragmas.append(f'PRAGMA busy_timeout = {int(config["SQLITE_BUSY_TIMEOUT"])}')
+    if config.get('SQLITE_JOURNAL_MODE'):
+        pragmas.append(f'PRAGMA journal_mode = {config["SQLITE_JOURNAL_MODE"]}')
+    if config.get('SQLITE_SYNCHRONOUS'):
+        pragmas.append(f'PRAGMA synchronous = {config["SQLITE_SYNCHRONOUS"]}')
+    if config.get('SQLITE_CACHE_SIZE') is not None:
+        pragmas.append(f'PRAGMA cache_size = {int(config["SQLITE_CACHE_SIZE"])}')
+    if config.get('SQLITE_MMAP_SIZE') is not None:
+        pragmas.append(f'PRAGMA mmap_size = {int(config["SQLITE_MMAP_SIZE"])}')
+    if config.get('SQLITE_TEMP_STORE'):
+        pragmas.append(f'PRAGMA temp_store = {config["SQLITE_TEMP_STORE"]}')
+    return pragmas
+
+
+def configure_engine(app):
+    """Apply the SQLite tuning from the app config to the engine's connections"""
+    if not app.config.get('SQLITE_TUNING', True):
+        return
+
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+
+    pragmas = install_pragmas(engine, app.config)
+    logger.info('SQLite tuning enabled: %s', "; ".join(pragmas))
+
+
+def install_pragmas(engine, config):
+    """Run the configured PRAGMAs on every new connection of a (sync or async) engine"""
+    pragmas = sqlite_pragmas(config)
+
+    @event.listens_for(getattr(engine, 'sync_engine', engine), 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    return pragmas
+
+
+@contextmanager
+def write_transaction():
+    """Run the block in one session transaction that holds the write lock from the start
+
+    SQLite: BEGIN IMMEDIATE instead of the driver's deferred BEGIN, so no
+    other connection can commit between the reads and the writes of the
+    block. Commits when the block returns, rolls back on errors. The session
+    must not have uncommitted writes when it is entered.
+    """
+    connection = db.session.connection()
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+    try:
+        yield
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
@@ -0,0 +1,102 @@
+from threading import Lock
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional
+
+from app import quiz_cache
+
+
+class AnswerKey(NamedTuple):
+    """Correct answer ids per question, built once per compiled quiz version"""
+    quiz_id: int
+    version: int
+    correct: Mapping  # {question_id: frozenset(answer_id, ...)}
+    total: int
+    variant: Optional[tuple] = None  # served question ids when graded against a variant
+
+
+_keys = {}  # {quiz_id: AnswerKey}
+_lock = Lock()
+
+
+def build_answer_key(compiled):
+    correct = {}
+    for q in compiled.questions:
+        ids = frozenset(a.id for a in q.answers if a.is_correct)
+        # Вопросы без правильных ответов не оцениваются (как и раньше)
+        if ids:
+            correct[q.id] = ids
+    return AnswerKey(
+        quiz_id=compiled.id,
+        version=compiled.version,
+        correct=MappingProxyType(correct),
+        total=len(correct)
+    )
+
+
+def get_answer_key(quiz_id):
+    """Return the answer key for the current version of the quiz, or None"""
+    compiled = quiz_cache.get_compiled_quiz(quiz_id)
+    if compiled is None:
+        return None
+    return answer_key(compiled)
+
+
+def answer_key(compiled):
+    """The answer key of this compiled quiz version, built on first use"""
+    quiz_id = compiled.id
+    key = _keys.get(quiz_id)
+    if key is None or key.version != compiled.version:
+        key = build_answer_key(compiled)
+        with _lock:
+            _keys[quiz_id] = key
+    return key
+
+
+def variant_key(key, question_ids):
+    """The key restricted to the questions of a served variant, O(len(question_ids))"""
+    correct = {q_id: key.correct[q_id] for q_id in question_ids if q_id in key.correct}
+    return key._replace(correct=MappingProxyType(correct), total=len(correct), variant=tuple(question_ids))
+
+
+def grade(key, user_answers):
+    """Grade one submission {question_id: [answer_id, ...]} against the key"""
+    results = []
+    correct = 0
+
+    for q_id, user_a_ids in user_answers.items():
+        q_id = int(q_id)
+        # Чужие, неоцениваемые и не выданные в варианте вопросы не считаются:
+        # иначе пустой ответ на них засчитывался и correct_count превышал total
+        correct_a_ids = key.correct.get(q_id)
+        if correct_a_ids is None:
+            continue
+        user_a_ids = [int(a_id) for a_id in user_a_ids]
+
+        is_correct = correct_a_ids == frozenset(user_a_ids)
+
+        if is_correct:
+            correct += 1
+
+        results.append({
+            'question_id': q_id,
+            'is_correct': is_correct,
+            'user_answers': user_a_ids,
+            'correct_answers': sorted(correct_a_ids)
+        })
+
+    total = key.total
+    full_results = {
+        'total_questions': total,
+        'correct_count': correct,
+        'incorrect_count': total - correct,
+        'results': results
+    }
+    if key.variant is not None:
+        full_results['variant'] = list(key.variant)  # нужен для пересчета результата
+    return full_results
+
+
+def score(full_results):
+    total = full_results['total_questions']
+    return full_results['correct_count'] / total * 100 if total > 0 else 0
+
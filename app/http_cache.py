@@ -0,0 +1,69 @@
+import hashlib
+from threading import Lock
+
+from flask import request, session, make_response, render_template
+from flask_login import current_user
+from markupsafe import Markup
+
+from app import quiz_cache
+
+_fragments = {}  # {template: (table_version, Markup, hash)}
+_lock = Lock()
+
+
+def page_etag(*parts):
+    """ETag of a page for the current user
+
+    The navbar shows the user's name and, for admins, the admin links, and
+    queued flash messages are rendered into the page once, so all of them
+    are part of the tag.
+    """
+    parts += (current_user.get_id(), current_user.username, current_user.is_admin, session.get('_flashes'))
+    data = '|'.join(str(p) for p in parts)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def is_fresh(etag):
+    """True if the client already has this version of the page"""
+    return request.if_none_match.contains(etag)
+
+
+def cached_response(body, etag, max_age=0, immutable=False):
+    """Response with ETag and Cache-Control, 304 if the client copy is current"""
+    response = make_response(body)
+    response.set_etag(etag)
+    response.cache_control.private = True
+    if immutable:
+        response.cache_control.max_age = max_age
+        response.cache_control.immutable = True
+    else:
+        # Браузер хранит копию, но перепроверяет ее: back/forward стоит 304, а не полной отрисовки
+        response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response.make_conditional(request)
+
+
+def not_modified(etag):
+    return cached_response('', etag)
+
+
+def render_fragment(template, load_context):
+    """Render a template fragment that depends only on the quiz table
+
+    Returns (html, hash). The result is kept until any quiz changes
+    (quiz_cache.table_version), so load_context (the DB read) runs once per
+    change, not once per request.
+    """
+    version = quiz_cache.table_version()
+    with _lock:
+        cached = _fragments.get(template)
+    if cached is not None and cached[0] == version:
+        return cached[1], cached[2]
+
+    html = Markup(render_template(template, **load_context()))
+    digest = hashlib.sha1(html.encode('utf-8')).hexdigest()
+    with _lock:
+        # Квиз мог измениться во время отрисовки — тогда не сохраняем устаревший фрагмент
+        if quiz_cache.table_version() == version:
+            _fragments[template] = (version, html, digest)
+    return html, digest
@@ -0,0 +1,236 @@
+import math
+import time
+from functools import cache
+
+from sqlalchemy import text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app import db, logger, database, quiz_cache
+from app.models import QuestionStat, AnswerStat, QuizResponse, QuizResult
+from app.responses import decode_answer_ids
+
+DEFAULT_CHUNK_SIZE = 2000
+
+_COUNTERS = ('attempts', 'correct', 'score_sum', 'score_sum_correct', 'score_sum_sq')
+
+
+def _precompiled(stmt):
+    # У ON CONFLICT нет ключа кэша компиляции SQLAlchemy: без этого upsert компилируется на каждую отправку
+    return text(str(stmt.compile(dialect=sqlite.dialect(paramstyle='named'))))
+
+
+@cache
+def _upsert_question_stats():
+    stmt = sqlite_insert(QuestionStat)
+    return _precompiled(stmt.on_conflict_do_update(
+        index_elements=['question_id'],
+        set_={name: getattr(QuestionStat, name) + getattr(stmt.excluded, name) for name in _COUNTERS}
+    ))
+
+
+@cache
+def _upsert_answer_stats():
+    stmt = sqlite_insert(AnswerStat)
+    return _precompiled(stmt.on_conflict_do_update(
+        index_elements=['answer_id'],
+        set_={'picks': AnswerStat.picks + stmt.excluded.picks}
+    ))
+
+
+def record_submission(quiz_id, score, results):
+    """Add one graded submission to the materialized counters
+
+    Runs inside the caller's transaction. Question and answer ids that are
+    not part of the current quiz are ignored.
+    """
+    compiled = quiz_cache.get_compiled_quiz(quiz_id)
+    if compiled is None:
+        return
+    for stmt, rows in submission_upserts(compiled, score, results):
+        db.session.execute(stmt, rows)
+
+
+def submission_upserts(compiled, score, results):
+    """[(upsert statement, rows)] that add one submission to the counters"""
+    quiz_id = compiled.id
+    valid = {q.id: {a.id for a in q.answers} for q in compiled.questions}
+
+    question_rows = []
+    answer_rows = []
+    for item in results:
+        q_id = item['question_id']
+        if q_id not in valid:
+            continue
+        correct = 1 if item['is_correct'] else 0
+        question_rows.append({
+            'question_id': q_id,
+            'quiz_id': quiz_id,
+            'attempts': 1,
+            'correct': correct,
+            'score_sum': score,
+            'score_sum_correct': score * correct,
+            'score_sum_sq': score * score
+        })
+        for a_id in set(item['user_answers']):
+            if a_id in valid[q_id]:
+                answer_rows.append({'answer_id': a_id, 'question_id': q_id, 'picks': 1})
+
+    upserts = []
+    if question_rows:
+        upserts.append((_upsert_question_stats(), question_rows))
+    if answer_rows:
+        upserts.append((_upsert_answer_stats(), answer_rows))
+    return upserts
+
+
+def _iter_response_chunks(quiz_id, chunk_size):
+    """Yield lists of (score, question_id, is_correct, answer_ids) for ranges of results"""
+    last_id = 0
+    while True:
+        result_ids = [row[0] for row in db.session.query(QuizResult.id)
+                      .filter(QuizResult.quiz_id == quiz_id, QuizResult.id > last_id)
+                      .order_by(QuizResult.id)
+                      .limit(chunk_size)]
+        if not result_ids:
+            return
+        rows = db.session.query(QuizResult.score, QuizResponse.question_id,
+                                QuizResponse.is_correct, QuizResponse.answer_ids)\
+            .join(QuizResult, QuizResponse.result_id == QuizResult.id)\
+            .filter(QuizResult.quiz_id == quiz_id,
+                    QuizResponse.result_id.between(result_ids[0], result_ids[-1]))\
+            .all()
+        yield rows
+        last_id = result_ids[-1]
+
+
+def rebuild(quiz_id, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Recompute a quiz's counters from quiz_response with NumPy
+
+    Responses are read chunk by chunk as a sparse (result x question) matrix
+    and reduced per column with bincount, so memory stays bounded. The reads
+    and the replace run in one write transaction: a submission committed in
+    between would otherwise be counted by neither.
+    """
+    compiled = quiz_cache.get_compiled_quiz(quiz_id)
+    if compiled is None:
+        raise LookupError(f'Quiz {quiz_id} not found')
+
+    started = time.perf_counter()
+    with database.write_transaction():
+        processed = _rebuild(quiz_id, compiled, chunk_size)
+
+    elapsed = time.perf_counter() - started
+    logger.info('Rebuilt item statistics of quiz %s from %s responses in %.2fs', quiz_id, processed, elapsed)
+    return {'responses': processed, 'elapsed': elapsed}
+
+
+def _rebuild(quiz_id, compiled, chunk_size):
+    import numpy as np
+
+    question_ids = np.array(compiled.question_ids, dtype=np.int64)
+    q_index = {q_id: idx for idx, q_id in enumerate(compiled.question_ids)}
+    answer_ids = np.array([a.id for q in compiled.questions for a in q.answers], dtype=np.int64)
+    answer_question = [q.id for q in compiled.questions for a in q.answers]
+    a_index = {a_id: idx for idx, a_id in enumerate(answer_ids.tolist())}
+
+    n_questions, n_answers = len(question_ids), len(answer_ids)
+    totals = {name: np.zeros(n_questions) for name in _COUNTERS}
+    picks = np.zeros(n_answers, dtype=np.int64)
+    processed = 0
+
+    for rows in _iter_response_chunks(quiz_id, chunk_size):
+        rows = [row for row in rows if row[1] in q_index]
+        if not rows:
+            continue
+        processed += len(rows)
+        cols = np.fromiter((q_index[row[1]] for row in rows), dtype=np.int64, count=len(rows))
+        score = np.fromiter((row[0] or 0 for row in rows), dtype=np.float64, count=len(rows))
+        correct = np.fromiter((1.0 if row[2] else 0.0 for row in rows), dtype=np.float64, count=len(rows))
+
+        totals['attempts'] += np.bincount(cols, minlength=n_questions)
+        totals['correct'] += np.bincount(cols, weights=correct, minlength=n_questions)
+        totals['score_sum'] += np.bincount(cols, weights=score, minlength=n_questions)
+        totals['score_sum_correct'] += np.bincount(cols, weights=score * correct, minlength=n_questions)
+        totals['score_sum_sq'] += np.bincount(cols, weights=score * score, minlength=n_questions)
+
+        chosen = [a_index[a_id] for row in rows for a_id in set(decode_answer_ids(row[3])) if a_id in a_index]
+        if chosen:
+            picks += np.bincount(np.array(chosen, dtype=np.int64), minlength=n_answers)
+
+    question_rows = [{
+        'question_id': int(question_ids[i]),
+        'quiz_id': quiz_id,
+        'attempts': int(totals['attempts'][i]),
+        'correct': int(totals['correct'][i]),
+        'score_sum': float(totals['score_sum'][i]),
+        'score_sum_correct': float(totals['score_sum_correct'][i]),
+        'score_sum_sq': float(totals['score_sum_sq'][i])
+    } for i in range(n_questions)]
+    answer_rows = [{
+        'answer_id': int(answer_ids[i]),
+        'question_id': answer_question[i],
+        'picks': int(picks[i])
+    } for i in range(n_answers)]
+
+    db.session.query(AnswerStat)\
+        .filter(AnswerStat.question_id.in_(db.session.query(QuestionStat.question_id)
+                                           .filter(QuestionStat.quiz_id == quiz_id)))\
+        .delete(synchronize_session=False)
+    db.session.query(QuestionStat).filter(QuestionStat.quiz_id == quiz_id).delete(synchronize_session=False)
+    if answer_ids.size:
+        db.session.query(AnswerStat).filter(AnswerStat.answer_id.in_(answer_ids.tolist()))\
+            .delete(synchronize_session=False)
+    if question_rows:
+        db.session.execute(QuestionStat.__table__.insert(), question_rows)
+    if answer_rows:
+        db.session.execute(AnswerStat.__table__.insert(), answer_rows)
+    return processed
+
+
+def _point_biserial(stat):
+    n, n1 = stat.attempts, stat.correct
+    n0 = n - n1
+    if n == 0 or n1 == 0 or n0 == 0:
+        return None
+    mean = stat.score_sum / n
+    variance = stat.score_sum_sq / n - mean * mean
+    if variance <= 1e-12:
+        return None
+    mean_correct = stat.score_sum_correct / n1
+    mean_incorrect = (stat.score_sum - stat.score_sum_correct) / n0
+    return (mean_correct - mean_incorrect) / math.sqrt(variance) * math.sqrt(n1 * n0) / n
+
+
+def item_analysis(quiz_id):
+    """Difficulty, discrimination and distractor statistics of every question of a quiz"""
+    compiled = quiz_cache.get_compiled_quiz(quiz_id)
+    if compiled is None:
+        return None
+
+    question_stats = {s.question_id: s for s in QuestionStat.query.filter_by(quiz_id=quiz_id)}
+    answer_picks = dict(db.session.query(AnswerStat.answer_id, AnswerStat.picks)
+                        .filter(AnswerStat.question_id.in_(compiled.question_ids)))
+
+    items = []
+    for number, q in enumerate(compiled.questions, 1):
+        stat = question_stats.get(q.id)
+        attempts = stat.attempts if stat else 0
+        discrimination = _point_biserial(stat) if stat else None
+        items.append({
+            'question_id': q.id,
+            'number': number,
+            'text': q.text,
+            'attempts': attempts,
+            'correct': stat.correct if stat else 0,
+            'p_value': stat.correct / attempts if attempts else None,
+            'discrimination': round(discrimination, 4) if discrimination is not None else None,
+            'answers': [{
+                'answer_id': a.id,
+                'text': a.text,
+                'is_correct': a.is_correct,
+                'picks': answer_picks.get(a.id, 0),
+                'pick_rate': answer_picks.get(a.id, 0) / attempts if attempts else None
+            } for a in q.answers]
+        })
+    return {'quiz_id': quiz_id, 'title': compiled.title, 'questions': items}
@@ -1,55 +1,206 @@
+import atexit
+import json
 import logging
-from logging.handlers import RotatingFileHandler
-from app.config import Config
 import os
-from datetime import date
+import queue
+import random
+import time
+import uuid
+from datetime import date, datetime
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from app.config import Config
+
+_listener = None
+
+
+class DatedFileHandler(RotatingFileHandler):
+    """RotatingFileHandler writing to <prefix>_<YYYY-MM-DD>.log
+
+    Switches to a new file at midnight, not only at process start; within
+    a day the file still rotates by size.
+    """
+
+    def __init__(self, folder, prefix, **kwargs):
+        self.folder = folder
+        self.prefix = prefix
+        self.day = date.today()
+        super().__init__(self._path(self.day), **kwargs)
+
+    def _path(self, day):
+        return os.path.join(self.folder, f'{self.prefix}_{day.isoformat()}.log')
+
+    def shouldRollover(self, record):
+        if date.fromtimestamp(record.created) != self.day:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        today = date.today()
+        if today == self.day:
+            return super().doRollover()
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        self.day = today
+        self.baseFilename = os.path.abspath(self._path(today))
+        if not self.delay:
+            self.stream = self._open()
+
+
+class RequestContextFilter(logging.Filter):
+    """Adds request_id, user, quiz_id and latency_ms to records logged in a request
+
+    Runs in the request thread (on the QueueHandler), where the Flask
+    context is still available.
+    """
+
+    def filter(self, record):
+        from flask import g, has_request_context, request
+        if not has_request_context():
+            return True
+        record.request_id = g.get('request_id')
+        record.quiz_id = (request.view_args or {}).get('quiz_id')
+        started = g.get('request_started')
+        record.latency_ms = round((time.perf_counter() - started) * 1000, 2) if started else None
+        try:
+            from flask_login import current_user
+            record.user = current_user.username if current_user.is_authenticated else None
+        except Exception:
+            record.user = None
+        return True
+
+
+class SampleFilter(logging.Filter):
+    """Lets through only a share of the records below WARNING"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    FIELDS = ('request_id', 'user', 'quiz_id', 'latency_ms')
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for field in self.FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def _text_formatter(source_location):
+    fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    if source_location:
+        fmt += ' [in %(pathname)s:%(lineno)d]'
+    return logging.Formatter(fmt)
+
+
+def _stop_listener():
+    """Flush queued records to the files and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(_stop_listener)
+
+
+def setup_logging(config=None):
+    """Configure logging for the application
+
+    config is the app config (a mapping); Config is used when omitted.
+    Called from create_app, so importing the package touches no files.
+    """
+    global _listener
+    if config is None:
+        config = {name: getattr(Config, name) for name in dir(Config) if name.isupper()}
 
-def setup_logging():
-    """Configure logging for the application"""
-    
     # Create logs directory if it doesn't exist
-    os.makedirs(Config.LOG_FOLDER, exist_ok=True)
-    
-    today = date.today().isoformat()
-    log_file = os.path.join(Config.LOG_FOLDER, f'app_{today}.log')
-    error_log_file = os.path.join(Config.LOG_FOLDER, f'errors_{today}.log')
-    
-    # Formatter for logs
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s [in %(pathname)s:%(lineno)d]'
-    )
-    
+    os.makedirs(config['LOG_FOLDER'], exist_ok=True)
+
+    source_location = config.get('LOG_SOURCE_LOCATION', True)
+    formatter = JsonFormatter() if config.get('LOG_FORMAT') == 'json' else _text_formatter(source_location)
+
     # Main logger for all events
     logger = logging.getLogger('quizmaster')
-    logger.setLevel(getattr(logging, Config.LOG_LEVEL))
-    
+    logger.setLevel(getattr(logging, config.get('LOG_LEVEL', 'INFO')))
+
     # Clear any existing handlers to prevent duplicates
+    _stop_listener()
     logger.handlers.clear()
-    
+
+    handlers = []
+
     # File handler for all events
-    file_handler = RotatingFileHandler(
-        log_file,
+    file_handler = DatedFileHandler(
+        config['LOG_FOLDER'], 'app',
         maxBytes=1024 * 1024 * 5,  # 5 MB
         backupCount=10
     )
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
-    
+    handlers.append(file_handler)
+
     # Error handler (ERROR and above)
-    error_handler = RotatingFileHandler(
-        error_log_file,
+    error_handler = DatedFileHandler(
+        config['LOG_FOLDER'], 'errors',
         maxBytes=1024 * 1024 * 5,  # 5 MB
         backupCount=5
     )
     error_handler.setLevel(logging.ERROR)
     error_handler.setFormatter(formatter)
-    logger.addHandler(error_handler)
-    
+    handlers.append(error_handler)
+
     # Console output for development
     if os.environ.get('FLASK_ENV') == 'development':
         console_handler = logging.StreamHandler()
         console_handler.setLevel(logging.DEBUG)
         console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
-    
-    return logger
\ No newline at end of file
+        handlers.append(console_handler)
+
+    context_filter = RequestContextFilter()
+    if config.get('LOG_ASYNC', True):
+        # Потоки запросов только кладут запись в очередь, запись в файлы — в отдельном потоке
+        queue_handler = QueueHandler(queue.SimpleQueue())
+        queue_handler.addFilter(context_filter)
+        logger.addHandler(queue_handler)
+        _listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+    else:
+        for handler in handlers:
+            handler.addFilter(context_filter)
+            logger.addHandler(handler)
+
+    # Per-request lines (page views, submits) go through their own logger
+    access_logger = logging.getLogger('quizmaster.access')
+    access_logger.setLevel(getattr(logging, config.get('LOG_ACCESS_LEVEL', 'INFO')))
+    access_logger.filters.clear()
+    sample_rate = config.get('LOG_ACCESS_SAMPLE_RATE', 1.0)
+    if sample_rate < 1:
+        access_logger.addFilter(SampleFilter(sample_rate))
+
+    return logger
+
+
+def init_app(app):
+    """Stamp each request with an id and start time for the log records"""
+    from flask import g, request
+
+    @app.before_request
+    def start_request_log_context():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+        g.request_started = time.perf_counter()
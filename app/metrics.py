@@ -0,0 +1,231 @@
+import copy
+import time
+from collections import Counter, deque
+from threading import Lock
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from app import db, logger
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)  # seconds
+
+
+class EndpointStats:
+    """Latency histogram and query counters of one endpoint"""
+    __slots__ = ('requests', 'errors', 'latency_sum', 'buckets', 'queries', 'query_time',
+                 'max_queries', 'n_plus_one')
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.latency_sum = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)  # last one is +Inf
+        self.queries = 0
+        self.query_time = 0.0
+        self.max_queries = 0
+        self.n_plus_one = 0
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (None without data)"""
+        if not self.requests:
+            return None
+        rank = q * self.requests
+        seen = 0
+        for bound, n in zip(BUCKETS + (float('inf'),), self.buckets):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+_stats = {}  # {endpoint: EndpointStats}
+_slow_queries = deque(maxlen=50)  # (time, endpoint, ms, statement)
+_n_plus_one = deque(maxlen=50)  # (time, endpoint, count, statement)
+_totals = Counter()  # slow_queries, n_plus_one
+_lock = Lock()
+_enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def _endpoint():
+    return request.endpoint or 'unknown'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute не вызывается для упавшего запроса — снимаем его отметку времени
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('query_start'):
+        conn.info['query_start'].pop()
+
+
+def _make_after_cursor_execute(slow_seconds):
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        current = g.get('_metrics') if has_request_context() else None
+        if current is not None:
+            current['queries'] += 1
+            current['query_time'] += elapsed
+            current['statements'][statement] += 1
+        if elapsed >= slow_seconds:
+            endpoint = _endpoint() if has_request_context() else 'background'
+            logger.warning('Slow query (%.1f ms) in %s: %s', elapsed * 1000, endpoint, statement)
+            with _lock:
+                _totals['slow_queries'] += 1
+                _slow_queries.append((time.time(), endpoint, elapsed * 1000, statement))
+    return _after_cursor_execute
+
+
+def _start_request():
+    g._metrics = {'start': time.perf_counter(), 'queries': 0, 'query_time': 0.0, 'statements': Counter()}
+
+
+def _record(status_code, n_plus_one_threshold):
+    current = g.pop('_metrics', None)
+    if current is None:
+        return
+    latency = time.perf_counter() - current['start']
+    endpoint = _endpoint()
+
+    # Один и тот же SQL много раз за запрос — признак N+1
+    repeated = [(n, statement) for statement, n in current['statements'].items() if n >= n_plus_one_threshold]
+    for n, statement in repeated:
+        logger.warning('Possible N+1 in %s: %s executions of %s', endpoint, n, statement)
+
+    with _lock:
+        stats = _stats.get(endpoint)
+        if stats is None:
+            stats = _stats[endpoint] = EndpointStats()
+        stats.requests += 1
+        if status_code >= 500:
+            stats.errors += 1
+        stats.latency_sum += latency
+        idx = 0
+        while idx < len(BUCKETS) and latency > BUCKETS[idx]:
+            idx += 1
+        stats.buckets[idx] += 1
+        stats.queries += current['queries']
+        stats.query_time += current['query_time']
+        stats.max_queries = max(stats.max_queries, current['queries'])
+        if repeated:
+            stats.n_plus_one += 1
+            _totals['n_plus_one'] += 1
+            now = time.time()
+            for n, statement in repeated:
+                _n_plus_one.append((now, endpoint, n, statement))
+
+
+def init_app(app):
+    """Hook the request and SQL timing into app if METRICS_ENABLED
+
+    When disabled nothing is registered, so there is no per-request or
+    per-query cost at all.
+    """
+    global _enabled
+    if not app.config.get('METRICS_ENABLED', False):
+        return
+    _enabled = True
+
+    slow_seconds = app.config.get('METRICS_SLOW_QUERY_MS', 100) / 1000
+    n_plus_one_threshold = app.config.get('METRICS_N_PLUS_ONE_THRESHOLD', 10)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _make_after_cursor_execute(slow_seconds))
+    event.listen(engine, 'handle_error', _handle_error)
+
+    app.before_request(_start_request)
+
+    @app.after_request
+    def record_request_metrics(response):
+        _record(response.status_code, n_plus_one_threshold)
+        return response
+
+    @app.teardown_request
+    def record_failed_request(exc):
+        # after_request не вызывается при необработанном исключении
+        if exc is not None:
+            _record(500, n_plus_one_threshold)
+
+
+def snapshot():
+    """Per-endpoint summary for the admin metrics page"""
+    with _lock:
+        endpoints = []
+        for endpoint, s in sorted(_stats.items(), key=lambda item: -item[1].latency_sum):
+            endpoints.append({
+                'endpoint': endpoint,
+                'requests': s.requests,
+                'errors': s.errors,
+                'avg_ms': s.latency_sum / s.requests * 1000 if s.requests else None,
+                'p50_ms': s.quantile(0.5) * 1000,
+                'p95_ms': s.quantile(0.95) * 1000,
+                'p99_ms': s.quantile(0.99) * 1000,
+                'avg_queries': s.queries / s.requests if s.requests else None,
+                'max_queries': s.max_queries,
+                'query_ms': s.query_time / s.requests * 1000 if s.requests else None,
+                'n_plus_one': s.n_plus_one
+            })
+        return {
+            'endpoints': endpoints,
+            'slow_queries': list(reversed(_slow_queries)),
+            'n_plus_one': list(reversed(_n_plus_one)),
+            'totals': dict(_totals)
+        }
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text():
+    """Metrics in the Prometheus text exposition format"""
+    lines = [
+        '# HELP quizmaster_request_duration_seconds Request latency by endpoint',
+        '# TYPE quizmaster_request_duration_seconds histogram'
+    ]
+    with _lock:
+        stats = [(endpoint, copy.copy(s)) for endpoint, s in sorted(_stats.items())]
+        totals = dict(_totals)
+    for endpoint, s in stats:
+        label = f'endpoint="{_label(endpoint)}"'
+        cumulative = 0
+        for bound, n in zip(BUCKETS, s.buckets):
+            cumulative += n
+            lines.append(f'quizmaster_request_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f'quizmaster_request_duration_seconds_bucket{{{label},le="+Inf"}} {s.requests}')
+        lines.append(f'quizmaster_request_duration_seconds_sum{{{label}}} {s.latency_sum:.6f}')
+        lines.append(f'quizmaster_request_duration_seconds_count{{{label}}} {s.requests}')
+
+    counters = (
+        ('quizmaster_request_errors_total', 'Requests answered with 5xx', 'errors'),
+        ('quizmaster_sql_queries_total', 'SQL statements executed by requests', 'queries'),
+        ('quizmaster_sql_query_seconds_total', 'Time spent in SQL statements by requests', 'query_time'),
+        ('quizmaster_n_plus_one_requests_total', 'Requests that repeated one statement many times', 'n_plus_one')
+    )
+    for name, help_text, attr in counters:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for endpoint, s in stats:
+            lines.append(f'{name}{{endpoint="{_label(endpoint)}"}} {getattr(s, attr)}')
+
+    lines.append('# HELP quizmaster_slow_queries_total SQL statements slower than METRICS_SLOW_QUERY_MS')
+    lines.append('# TYPE quizmaster_slow_queries_total counter')
+    lines.append(f'quizmaster_slow_queries_total {totals.get("slow_queries", 0)}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+        _slow_queries.clear()
+        _n_plus_one.clear()
+        _totals.clear()
@@ -8,6 +8,8 @@ class User(db.Model, UserMixin):
     username = db.Column(db.String(64), index=True, unique=True)
     password_hash = db.Column(db.String(128))
     is_admin = db.Column(db.Boolean, default=False)
+    # Заменяет UserMixin.is_active: login_user не пускает отключенных
+    is_active = db.Column(db.Boolean, nullable=False, default=True, server_default=db.true())
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def set_password(self, password):
@@ -16,9 +18,23 @@ class User(db.Model, UserMixin):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
     
+    @staticmethod
+    def username_prefix(prefix):
+        """Condition: username starts with prefix, ASCII case-insensitive like LIKE
+
+        A range on lower(username), so SQLite serves it from
+        ix_user_username_lower; LIKE itself cannot use an index.
+        """
+        # lower() в SQLite меняет регистр только у ASCII, префикс приводится так же
+        prefix = ''.join(c.lower() if c.isascii() else c for c in prefix)
+        key = db.func.lower(User.username)
+        return db.and_(key >= prefix, key < prefix + '\U0010ffff')
+    
     def __repr__(self):
         return f'<User {self.username}>'
 
+db.Index('ix_user_username_lower', db.func.lower(User.username))  # поиск по началу имени
+
 class Quiz(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(128), nullable=False)
@@ -33,6 +49,9 @@ class Quiz(db.Model):
         return f'<Quiz {self.title}>'
 
 class Question(db.Model):
+    __table_args__ = (
+        db.Index('ix_question_quiz_order', 'quiz_id', 'order'),  # compile_quiz
+    )
     id = db.Column(db.Integer, primary_key=True)
     quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'))
     text = db.Column(db.Text, nullable=False)
@@ -45,7 +64,7 @@ class Question(db.Model):
 
 class Answer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    question_id = db.Column(db.Integer, db.ForeignKey('question.id'))
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), index=True)
     text = db.Column(db.Text, nullable=False)
     is_correct = db.Column(db.Boolean, default=False)
     order = db.Column(db.Integer)
@@ -54,6 +73,11 @@ class Answer(db.Model):
         return f'<Answer {self.text[:50]}...>'
 
 class QuizResult(db.Model):
+    __table_args__ = (
+        db.Index('ix_quiz_result_user_quiz_completed', 'user_id', 'quiz_id', 'completed_at'),  # quiz_result
+        db.Index('ix_quiz_result_quiz_completed', 'quiz_id', 'completed_at'),  # results list of one quiz
+        db.Index('ix_quiz_result_completed', 'completed_at'),  # results list by date
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'))
@@ -65,4 +89,103 @@ class QuizResult(db.Model):
     quiz = db.relationship('Quiz', backref='results')
     
     def __repr__(self):
-        return f'<QuizResult {self.user_id}-{self.quiz_id}: {self.score}>'
\ No newline at end of file
+        return f'<QuizResult {self.user_id}-{self.quiz_id}: {self.score}>'
+
+db.Index('ix_quiz_result_score_value', db.func.coalesce(QuizResult.score, db.literal_column('0')))  # results list by score
+
+class QuizResponse(db.Model):
+    """One answered question of a QuizResult, for SQL-side statistics"""
+    id = db.Column(db.Integer, primary_key=True)
+    result_id = db.Column(db.Integer, db.ForeignKey('quiz_result.id'), nullable=False, index=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), nullable=False, index=True)
+    is_correct = db.Column(db.Boolean, default=False)
+    answer_ids = db.Column(db.Text)  # chosen answer ids, comma separated
+    
+    result = db.relationship('QuizResult', backref=db.backref('responses', lazy='dynamic', cascade='all, delete-orphan'))
+    
+    def __repr__(self):
+        return f'<QuizResponse {self.result_id}-{self.question_id}: {self.is_correct}>'
+
+
+class QuestionStat(db.Model):
+    """Materialized item-analysis counters of a question"""
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), primary_key=True)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), index=True)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    correct = db.Column(db.Integer, default=0, nullable=False)
+    score_sum = db.Column(db.Float, default=0, nullable=False)  # sum of total scores of respondents
+    score_sum_correct = db.Column(db.Float, default=0, nullable=False)  # same, for correct respondents only
+    score_sum_sq = db.Column(db.Float, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f'<QuestionStat {self.question_id}: {self.correct}/{self.attempts}>'
+
+
+class AnswerStat(db.Model):
+    """How many times an answer option was picked"""
+    answer_id = db.Column(db.Integer, db.ForeignKey('answer.id'), primary_key=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), index=True)
+    picks = db.Column(db.Integer, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f'<AnswerStat {self.answer_id}: {self.picks}>'
+
+
+class QuizPool(db.Model):
+    """Draw settings of a quiz: each attempt gets draw_count random questions of it"""
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), primary_key=True)
+    draw_count = db.Column(db.Integer, nullable=False)
+    shuffle_answers = db.Column(db.Boolean, default=True, nullable=False)
+    
+    quiz = db.relationship('Quiz', backref=db.backref('pool', uselist=False, cascade='all, delete-orphan'))
+    
+    def __repr__(self):
+        return f'<QuizPool {self.quiz_id}: {self.draw_count}>'
+
+
+class QuizAttempt(db.Model):
+    """A quiz in progress: answers are autosaved here and graded on submit"""
+    __table_args__ = (
+        db.Index('ix_quiz_attempt_user_quiz_open', 'user_id', 'quiz_id', 'submitted_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False, index=True)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    submitted_at = db.Column(db.DateTime)  # NULL while the attempt is open
+    answers = db.Column(db.Text, default='{}', nullable=False)  # JSON {question_id: [answer_id, ...]}
+    result_id = db.Column(db.Integer, db.ForeignKey('quiz_result.id'))
+    seed = db.Column(db.Integer)  # seed of the served variant of a pooled quiz
+    variant = db.Column(db.Text)  # served question ids, comma separated; NULL = the whole quiz
+    
+    def __repr__(self):
+        return f'<QuizAttempt {self.user_id}-{self.quiz_id}: {"submitted" if self.submitted_at else "open"}>'
+
+
+class QuizLinkBatch(db.Model):
+    """One bulk minting of signed one-time quiz links; the links themselves are not stored"""
+    id = db.Column(db.Integer, primary_key=True)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False, index=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    count = db.Column(db.Integer, default=0, nullable=False)
+    revoked_at = db.Column(db.DateTime)
+    
+    quiz = db.relationship('Quiz', backref=db.backref('link_batches', cascade='all, delete-orphan'))
+    uses = db.relationship('QuizLinkUse', lazy='dynamic', cascade='all, delete-orphan')
+    
+    def __repr__(self):
+        return f'<QuizLinkBatch {self.id}: quiz {self.quiz_id} x{self.count}>'
+
+
+class QuizLinkUse(db.Model):
+    """Redeemed link of a batch: the compact used-token set, one short row per redemption"""
+    __table_args__ = {'sqlite_with_rowid': False}
+    batch_id = db.Column(db.Integer, db.ForeignKey('quiz_link_batch.id'), primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+    used_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<QuizLinkUse {self.batch_id}-{self.user_id}>'
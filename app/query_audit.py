@@ -0,0 +1,166 @@
+import re
+from contextlib import contextmanager
+from typing import Callable, NamedTuple
+
+from sqlalchemy import event
+from werkzeug.datastructures import MultiDict
+
+from app import db, quiz_cache, results_query, attempts, user_cache, regrade, responses, item_stats, users, \
+    quiz_links, search
+from app.models import Quiz, User, Question
+
+# Полный просмотр таблицы: "SCAN quiz_result" без USING INDEX (подзапросы, виртуальные таблицы
+# и системный каталог sqlite_master не в счет)
+_FULL_SCAN = re.compile(r'^SCAN (?!sqlite_)(\w+)(?: AS \w+)?$')
+_TEMP_BTREE = 'USE TEMP B-TREE'
+
+
+class Sample(NamedTuple):
+    quiz_id: int
+    user_id: int
+    question_id: int
+    username: str
+
+
+class HotPath(NamedTuple):
+    name: str
+    run: Callable[[Sample], object]
+
+
+class PlanStep(NamedTuple):
+    detail: str
+    full_scan: bool
+
+
+class StatementPlan(NamedTuple):
+    sql: str
+    steps: list
+
+    @property
+    def full_scans(self):
+        return [step.detail for step in self.steps if step.full_scan]
+
+
+class PathReport(NamedTuple):
+    name: str
+    statements: list
+    error: str = None
+
+    @property
+    def ok(self):
+        return self.error is None and not any(plan.full_scans for plan in self.statements)
+
+
+def _results_pages(sample):
+    for sort in results_query.SORT_COLUMNS:
+        for order in ('desc', 'asc'):
+            for extra in ({}, {'quiz_id': sample.quiz_id}, {'user': sample.username[:2]}):
+                filters = results_query.parse_filters(MultiDict(dict(extra, sort=sort, order=order)))
+                _, cursor = results_query.fetch_page(filters, limit=1)
+                if cursor:
+                    results_query.fetch_page(filters, cursor=cursor, limit=1)
+
+
+def _results_counts(sample):
+    for extra in ({}, {'quiz_id': sample.quiz_id}, {'user': sample.username[:2]}):
+        results_query.count_results(results_query.parse_filters(MultiDict(extra)))
+
+
+def _principal(sample):
+    user_cache.invalidate(sample.user_id)
+    user_cache.load_principal(sample.user_id)
+
+
+# Запросы, которые выполняются на каждый запрос студента или на каждой странице админки
+HOT_PATHS = [
+    HotPath('take_quiz / payload / submit: compile_quiz', lambda s: quiz_cache.compile_quiz(s.quiz_id)),
+    HotPath('quiz_result: latest result', lambda s: results_query.latest_result(s.user_id, s.quiz_id)),
+    HotPath('results_overview: pages', _results_pages),
+    HotPath('results_overview: counts', _results_counts),
+    HotPath('attempt: open attempt', lambda s: attempts.get_open_attempt(s.user_id, s.quiz_id)),
+    HotPath('user loader', _principal),
+    HotPath('regrade: result chunk', lambda s: next(regrade.iter_result_chunks(s.quiz_id), None)),
+    HotPath('stats: question stats', lambda s: responses.question_stats(s.quiz_id)),
+    HotPath('stats: item analysis', lambda s: item_stats.item_analysis(s.quiz_id)),
+    HotPath('stats: user history', lambda s: responses.user_question_history(s.user_id, s.question_id)),
+    HotPath('admin users: list', lambda s: (users.fetch_page(''), users.fetch_page(s.username[:2]),
+                                            users.count_users(s.username[:2]))),
+    HotPath('admin links: batch usage', lambda s: quiz_links.batch_usage(s.quiz_id)),
+    HotPath('admin search', lambda s: search.search('question') if search.has_index() else None),
+]
+
+
+def pick_sample():
+    """Ids of existing rows, so the paths run their real queries; 1 in an empty database"""
+    quiz_id = db.session.query(db.func.min(Quiz.id)).scalar() or 1
+    user = db.session.query(User.id, User.username).order_by(User.id).first()
+    question_id = db.session.query(db.func.min(Question.id)).filter(Question.quiz_id == quiz_id).scalar() or 1
+    return Sample(quiz_id, user.id if user else 1, question_id, user.username if user else 'user')
+
+
+@contextmanager
+def _captured_statements():
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith('EXPLAIN'):
+            statements.append((statement, parameters[0] if executemany else parameters))
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+
+def explain(statement, parameters=()):
+    """EXPLAIN QUERY PLAN of one statement as PlanSteps"""
+    rows = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+    steps = []
+    for row in rows:
+        detail = row[-1]
+        steps.append(PlanStep(detail, bool(_FULL_SCAN.match(detail))))
+    return steps
+
+
+def audit_path(path, sample):
+    """Run one hot path, then explain every statement it executed"""
+    quiz_cache.invalidate()
+    with _captured_statements() as statements:
+        try:
+            path.run(sample)
+        except Exception as e:
+            db.session.rollback()
+            return PathReport(path.name, [], error=str(e))
+    plans = []
+    seen = set()
+    for statement, parameters in statements:
+        if statement in seen or statement.lstrip().upper().startswith(('PRAGMA', 'SAVEPOINT', 'RELEASE')):
+            continue
+        seen.add(statement)
+        plans.append(StatementPlan(statement, explain(statement, parameters)))
+    db.session.rollback()
+    return PathReport(path.name, plans)
+
+
+def audit(paths=None, sample=None):
+    """PathReports of the hot paths (all registered ones by default)"""
+    sample = sample or pick_sample()
+    return [audit_path(path, sample) for path in (paths or HOT_PATHS)]
+
+
+def format_report(reports, verbose=False):
+    lines = []
+    for report in reports:
+        lines.append(f'{"ok  " if report.ok else "FAIL"} {report.name} ({len(report.statements)} statements)')
+        if report.error:
+            lines.append(f'     error: {report.error}')
+        for plan in report.statements:
+            if not (verbose or plan.full_scans):
+                continue
+            lines.append('     ' + ' '.join(plan.sql.split())[:200])
+            for step in plan.steps:
+                marker = '!!' if step.full_scan else ('~ ' if _TEMP_BTREE in step.detail else '  ')
+                lines.append(f'       {marker} {step.detail}')
+    return '\n'.join(lines)
@@ -0,0 +1,259 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from itertools import count
+from threading import RLock
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional
+
+from flask import current_app
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+
+from app import db, logger
+from app.models import Quiz, Question, Answer, QuizPool
+
+
+class CompiledAnswer(NamedTuple):
+    id: int
+    text: str
+    is_correct: bool
+    order: int
+
+
+class CompiledQuestion(NamedTuple):
+    id: int
+    text: str
+    order: int
+    answers: tuple  # tuple[CompiledAnswer, ...]
+
+
+class CompiledQuiz(NamedTuple):
+    """Immutable snapshot of a quiz with its questions and answers"""
+    id: int
+    title: str
+    description: Optional[str]
+    is_active: bool
+    version: int
+    questions: tuple  # tuple[CompiledQuestion, ...]
+    content_hash: str  # hash of everything a user sees, stable across processes
+    question_ids: tuple  # ids in question order, the array variants are drawn from
+    questions_by_id: Mapping  # {question_id: CompiledQuestion}
+    draw_count: int = 0  # questions per attempt of a pooled quiz, 0 = all in order
+    shuffle_answers: bool = False
+
+    @property
+    def is_pooled(self):
+        return self.draw_count > 0
+
+    def payload(self, questions=None):
+        """Questions for the take page, without the correct flags"""
+        return [
+            {
+                'id': q.id,
+                'text': q.text,
+                'answers': [{'id': a.id, 'text': a.text} for a in q.answers]
+            }
+            for q in (self.questions if questions is None else questions)
+        ]
+
+
+_cache = OrderedDict()  # {quiz_id: CompiledQuiz}, least recently used first
+_lock = RLock()
+_versions = count(1)
+_generation = 0  # bumped on every invalidation so in-flight compiles are not cached
+_checked_at = float('-inf')  # monotonic time of the last content_version read
+_db_version = None  # content_version seen by this process
+
+# Счетчик изменений содержимого квизов в самой БД: его поднимают триггеры на любую
+# запись в quiz/question/answer/quiz_pool, из какого бы процесса она ни шла
+# (другой воркер, импорт из CLI, правка руками). invalidate() видит только свой процесс
+CONTENT_TABLES = ('quiz', 'question', 'answer', 'quiz_pool')
+_VERSION_DDL = (
+    "CREATE TABLE IF NOT EXISTS content_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)",
+    "INSERT OR IGNORE INTO content_version (id, version) VALUES (1, 0)",
+) + tuple(
+    f"CREATE TRIGGER IF NOT EXISTS {table}_version_a{op[0].lower()} AFTER {op} ON {table} BEGIN "
+    "UPDATE content_version SET version = version + 1 WHERE id = 1; END"
+    for table in CONTENT_TABLES for op in ('INSERT', 'UPDATE', 'DELETE')
+)
+VERSION_TRIGGERS = tuple(f"{table}_version_a{op}" for table in CONTENT_TABLES for op in ('i', 'u', 'd'))
+version_statement = text("SELECT version FROM content_version WHERE id = 1")
+
+
+def compile_statement(quiz_id):
+    """The single joined query behind compile_quiz (also run by the async API)"""
+    return db.select(
+        Quiz.id, Quiz.title, Quiz.description, Quiz.is_active,
+        Question.id, Question.text, Question.order,
+        Answer.id, Answer.text, Answer.is_correct, Answer.order,
+        QuizPool.draw_count, QuizPool.shuffle_answers
+    ).select_from(Quiz)\
+        .outerjoin(Question, Question.quiz_id == Quiz.id)\
+        .outerjoin(Answer, Answer.question_id == Question.id)\
+        .outerjoin(QuizPool, QuizPool.quiz_id == Quiz.id)\
+        .where(Quiz.id == quiz_id)\
+        .order_by(Question.order, Question.id, Answer.order, Answer.id)
+
+
+def compile_quiz(quiz_id):
+    """Load a quiz with all questions and answers in a single joined query"""
+    return build_compiled(db.session.execute(compile_statement(quiz_id)).all())
+
+
+def build_compiled(rows):
+    """CompiledQuiz from the rows of compile_statement, None if there are none"""
+    if not rows:
+        return None
+
+    questions = []
+    current = None
+    answers = []
+    for row in rows:
+        q_id = row[4]
+        if q_id is None:
+            continue
+        if current is None or current[0] != q_id:
+            if current is not None:
+                questions.append(CompiledQuestion(*current, tuple(answers)))
+            current = (q_id, row[5], row[6])
+            answers = []
+        if row[7] is not None:
+            answers.append(CompiledAnswer(row[7], row[8], bool(row[9]), row[10]))
+    if current is not None:
+        questions.append(CompiledQuestion(*current, tuple(answers)))
+
+    first = rows[0]
+    questions = tuple(questions)
+    is_active = bool(first[3]) if first[3] is not None else True
+    draw_count = first[11] or 0
+    shuffle_answers = bool(first[12]) if draw_count else False
+    return CompiledQuiz(
+        id=first[0],
+        title=first[1],
+        description=first[2],
+        is_active=is_active,
+        version=next(_versions),
+        questions=questions,
+        content_hash=content_hash(first[0], first[1], first[2], is_active, questions, draw_count, shuffle_answers),
+        question_ids=tuple(q.id for q in questions),
+        questions_by_id=MappingProxyType({q.id: q for q in questions}),
+        draw_count=draw_count,
+        shuffle_answers=shuffle_answers
+    )
+
+
+def content_hash(quiz_id, title, description, is_active, questions, draw_count=0, shuffle_answers=False):
+    """Hash of the quiz content, correct flags included (they change grading)"""
+    data = json.dumps([quiz_id, title, description, is_active, questions, draw_count, shuffle_answers],
+                      ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def ensure_version_table(connection):
+    """Create content_version and its triggers if missing (idempotent DDL, run by migrations)"""
+    if connection.dialect.name != 'sqlite':
+        return
+    for statement in _VERSION_DDL:
+        connection.exec_driver_sql(statement)
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_after_tables(target, connection, **kw):
+    ensure_version_table(connection)
+
+
+def claim_version_check(interval):
+    """True if this caller should read content_version now (at most once per interval)"""
+    global _checked_at
+    now = time.monotonic()
+    with _lock:
+        if now - _checked_at < interval:
+            return False
+        _checked_at = now
+        return True
+
+
+def apply_version(version):
+    """Drop the whole cache if content_version moved since the last check"""
+    global _db_version
+    with _lock:
+        changed = _db_version is not None and version != _db_version
+        _db_version = version
+    if changed:
+        logger.debug('Quiz content changed in the database (version %s), cache dropped', version)
+        invalidate()
+
+
+def read_version(connection):
+    """content_version.version, or None where the table is missing (database not upgraded)"""
+    try:
+        return connection.execute(version_statement).scalar()
+    except OperationalError:
+        return None
+
+
+def refresh():
+    """Pick up quiz changes made by other processes, checked every QUIZ_CACHE_CHECK_SECONDS"""
+    if not claim_version_check(current_app.config.get('QUIZ_CACHE_CHECK_SECONDS', 1.0)):
+        return
+    # Своим соединением, чтобы не открывать транзакцию чтения в сессии запроса
+    with db.engine.connect() as connection:
+        apply_version(read_version(connection))
+
+
+def get_compiled_quiz(quiz_id):
+    """Return the cached compiled quiz, compiling it on a miss"""
+    refresh()
+    compiled, generation = lookup(quiz_id)
+    if compiled is not None:
+        return compiled
+
+    compiled = compile_quiz(quiz_id)
+    if compiled is None:
+        return None
+    return store(compiled, generation, current_app.config.get('QUIZ_CACHE_SIZE', 128))
+
+
+def lookup(quiz_id):
+    """(cached CompiledQuiz or None, generation to pass to store after compiling)"""
+    with _lock:
+        compiled = _cache.get(quiz_id)
+        if compiled is not None:
+            _cache.move_to_end(quiz_id)
+        return compiled, _generation
+
+
+def store(compiled, generation, maxsize):
+    """Cache a quiz compiled at generation; returns the copy to use"""
+    quiz_id = compiled.id
+    with _lock:
+        if generation != _generation:
+            return compiled
+        # Another thread may have compiled the same quiz meanwhile, keep the first one
+        existing = _cache.get(quiz_id)
+        if existing is not None:
+            _cache.move_to_end(quiz_id)
+            return existing
+        _cache[quiz_id] = compiled
+        while len(_cache) > maxsize:
+            _cache.popitem(last=False)
+    return compiled
+
+
+def table_version():
+    """Counter that changes whenever any quiz was changed (in any process, see refresh)"""
+    refresh()
+    return _generation
+
+
+def invalidate(quiz_id=None):
+    """Drop one quiz (or the whole cache) after its content was changed"""
+    global _generation
+    with _lock:
+        _generation += 1
+        if quiz_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(quiz_id, None)
@@ -0,0 +1,222 @@
+import io
+import os
+import re
+import time
+from typing import NamedTuple
+
+from app import db, logger, quiz_cache
+from app.models import Quiz
+from app.quiz_store import insert_questions
+
+BATCH_SIZE = 500
+
+_NUMBERED = re.compile(r'^(\d+)[.)]\s*(.*)$')
+_OPTION = re.compile(r'^([A-Za-z])[.)]\s+(.*)$')
+_ANSWER = re.compile(r'^(?:Правильн\w*\s+ответ\w*|Answers?)\s*:\s*(.*)$', re.IGNORECASE)
+_ANSWER_COMMENT = re.compile(r'[(\[—–]|\s-\s|\.(?:\s|$)')  # "b (для plain-формата)", "c. потому что..."
+_ANSWER_SPLIT = re.compile(r'[\s,;/&+]+')
+_CONNECTIVES = frozenset({'and', 'и'})
+
+
+class ImportIssue(NamedTuple):
+    line: int
+    message: str
+
+
+class ImportReport(NamedTuple):
+    quiz_id: int
+    title: str
+    questions: int
+    answers: int
+    issues: list
+    elapsed: float
+
+
+class BankParser:
+    """Streaming parser for the zquiz plain-text question banks
+
+    A bank is an optional header line (the quiz title) followed by question
+    blocks: the question text (optionally numbered "1." and possibly spanning
+    several lines), options "a) ..." or "A. ...", and a line
+    "Правильный ответ: b" / "Answer: A" with one or more letters
+    ("a, b", "BCE", "A E", "A and B"), optionally followed by a comment in
+    parentheses or after a full stop. Malformed blocks, including answer
+    lines with words that are not option letters, are skipped and reported
+    in issues with their line number.
+    """
+
+    def __init__(self):
+        self.title = None
+        self.issues = []
+        self._reset(None)
+        self._seen_question = False
+
+    def _reset(self, line_no):
+        self._start = line_no
+        self._text = []
+        self._options = []  # [(letter, text)]
+
+    def _issue(self, line_no, message):
+        self.issues.append(ImportIssue(line_no, message))
+
+    def _discard(self, reason):
+        if self._text or self._options:
+            self._issue(self._start, reason)
+        self._reset(None)
+
+    def _parse_letters(self, value):
+        """Set of option letters named by an answer line value
+
+        A comment after the letters ("b (для plain-формата)") is ignored.
+        Raises ValueError if any other word is neither option letters nor a
+        connective: a partly understood key would import silently wrong.
+        """
+        letters = set(o[0] for o in self._options)
+        chosen = set()
+        for token in _ANSWER_SPLIT.split(_ANSWER_COMMENT.split(value, 1)[0].strip().lower()):
+            if not token or token in _CONNECTIVES:
+                continue
+            if any(ch not in letters for ch in token):
+                raise ValueError(f'cannot read "{value}" as option letters')
+            chosen.update(token)
+        if not chosen:
+            raise ValueError(f'no valid option letter in "{value}"')
+        return chosen
+
+    def parse(self, lines):
+        """Yield {'text', 'answers', 'line'} dicts from an iterable of lines"""
+        for line_no, raw in enumerate(lines, 1):
+            line = raw.strip()
+            if not line:
+                continue
+
+            answer = _ANSWER.match(line)
+            if answer:
+                if not self._text:
+                    self._issue(line_no, 'answer line without a question')
+                    self._reset(None)
+                    continue
+                if not self._options:
+                    self._discard('question has no options')
+                    continue
+                try:
+                    correct = self._parse_letters(answer.group(1))
+                except ValueError as e:
+                    self._issue(line_no, str(e))
+                    self._reset(None)
+                    continue
+                self._seen_question = True
+                yield {
+                    'text': '\n'.join(self._text),
+                    'answers': [{'text': text, 'is_correct': letter in correct} for letter, text in self._options],
+                    'line': self._start
+                }
+                self._reset(None)
+                continue
+
+            option = _OPTION.match(line)
+            if option and self._text:
+                letter = option.group(1).lower()
+                if any(o[0] == letter for o in self._options):
+                    self._issue(line_no, f'duplicate option "{option.group(1)}"')
+                self._options.append((letter, option.group(2).strip()))
+                continue
+
+            numbered = _NUMBERED.match(line)
+            if numbered:
+                if self._options:
+                    self._discard('question has no answer line')
+                elif self._text:
+                    if not self._seen_question and self.title is None:
+                        # Текст перед первым нумерованным вопросом — заголовок банка
+                        self.title = ' '.join(self._text)
+                    else:
+                        self._issue(self._start, 'text without options')
+                self._reset(line_no)
+                if numbered.group(2):
+                    self._text.append(numbered.group(2))
+                continue
+
+            if self._options:
+                # Текст после вариантов без строки ответа — начало следующего вопроса
+                self._discard('question has no answer line')
+            if self._start is None:
+                self._start = line_no
+            self._text.append(line)
+
+        if self._options:
+            self._discard('question has no answer line')
+        elif self._text:
+            self._discard('text without options')
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_bank(lines, title=None, default_title='Imported quiz', created_by=None, commit=True):
+    """Parse a bank and insert it as a new quiz
+
+    The quiz title is title, else the bank header, else default_title.
+    Questions are inserted in bulk batches inside a single transaction.
+    Returns an ImportReport; no quiz is created if nothing could be parsed.
+    """
+    started = time.perf_counter()
+    parser = BankParser()
+    quiz = None
+    n_questions = n_answers = 0
+
+    try:
+        for batch in _batches(parser.parse(lines), BATCH_SIZE):
+            if quiz is None:
+                # Заголовок банка идет до первого вопроса, поэтому уже известен
+                quiz = Quiz(title=(title or parser.title or default_title)[:128],
+                            created_by=created_by, is_active=True)
+                db.session.add(quiz)
+                db.session.flush()
+            insert_questions(quiz.id, batch, start_order=n_questions + 1)
+            n_questions += len(batch)
+            n_answers += sum(len(q['answers']) for q in batch)
+        if commit:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if quiz is not None:
+        quiz_cache.invalidate(quiz.id)
+    elapsed = time.perf_counter() - started
+    report = ImportReport(
+        quiz_id=quiz.id if quiz else None,
+        title=quiz.title if quiz else (title or parser.title or default_title),
+        questions=n_questions,
+        answers=n_answers,
+        issues=parser.issues,
+        elapsed=elapsed
+    )
+    logger.info('Imported quiz "%s": %s questions, %s answers, %s issues in %.3fs',
+                report.title, n_questions, n_answers, len(parser.issues), elapsed)
+    return report
+
+
+def _file_title(filename):
+    return os.path.splitext(os.path.basename(filename or ''))[0] or 'Imported quiz'
+
+
+def import_file(path, created_by=None, commit=True):
+    """Import one bank file; the file name is the title if the bank has no header"""
+    with open(path, encoding='utf-8-sig') as f:
+        return import_bank(f, default_title=_file_title(path), created_by=created_by, commit=commit)
+
+
+def import_upload(storage, created_by=None):
+    """Import an uploaded werkzeug FileStorage, reading it line by line"""
+    stream = io.TextIOWrapper(storage.stream, encoding='utf-8-sig')
+    return import_bank(stream, default_title=_file_title(storage.filename), created_by=created_by)
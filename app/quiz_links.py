@@ -0,0 +1,131 @@
+import base64
+import hashlib
+import hmac
+import struct
+import time
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from flask import current_app
+from sqlalchemy import text
+
+from app import db
+from app.models import QuizLinkBatch, User
+
+# Версия, batch_id, quiz_id, user_id, срок действия (unix time) и 16 байт HMAC-SHA256:
+# 33 байта, 44 символа base64url без '='
+_PAYLOAD = struct.Struct('>BIIII')
+_VERSION = 1
+_MAC_SIZE = 16
+
+# Одна вставка в множество использованных ссылок; отозванная партия не дает вставить строку
+_REDEEM = text(
+    "INSERT INTO quiz_link_use (batch_id, user_id, used_at) "
+    "SELECT :batch_id, :user_id, :used_at WHERE EXISTS "
+    "(SELECT 1 FROM quiz_link_batch WHERE id = :batch_id AND revoked_at IS NULL) "
+    "ON CONFLICT DO NOTHING"
+)
+
+
+class InvalidLink(Exception):
+    pass
+
+
+class LinkToken(NamedTuple):
+    batch_id: int
+    quiz_id: int
+    user_id: int
+    expires_at: int  # unix time
+
+
+_keys = {}  # {SECRET_KEY: derived key}
+
+
+def _key():
+    secret = current_app.config['SECRET_KEY']
+    key = _keys.get(secret)
+    if key is None:
+        # Отдельный ключ: подпись ссылки не подходит ни для чего, что подписано самим SECRET_KEY
+        key = _keys[secret] = hmac.new(str(secret).encode('utf-8'), b'quizmaster.quiz-link', hashlib.sha256).digest()
+    return key
+
+
+def sign(token):
+    payload = _PAYLOAD.pack(_VERSION, *token)
+    mac = hmac.new(_key(), payload, hashlib.sha256).digest()[:_MAC_SIZE]
+    return base64.urlsafe_b64encode(payload + mac).rstrip(b'=').decode('ascii')
+
+
+def verify(value, now=None):
+    """Decode and check a link: signature and expiry, no DB access
+
+    Raises InvalidLink; returns the LinkToken otherwise.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+    except (ValueError, TypeError):
+        raise InvalidLink('malformed')
+    if len(raw) != _PAYLOAD.size + _MAC_SIZE:
+        raise InvalidLink('malformed')
+    payload, mac = raw[:_PAYLOAD.size], raw[_PAYLOAD.size:]
+    if not hmac.compare_digest(mac, hmac.new(_key(), payload, hashlib.sha256).digest()[:_MAC_SIZE]):
+        raise InvalidLink('bad signature')
+    version, *fields = _PAYLOAD.unpack(payload)
+    if version != _VERSION:
+        raise InvalidLink('unknown version')
+    token = LinkToken(*fields)
+    if token.expires_at < (now if now is not None else time.time()):
+        raise InvalidLink('expired')
+    return token
+
+
+def resolve_users(usernames=None):
+    """(id, username) of the named active non-admin users, or of all of them if no names are given
+
+    Admins never get links: a link logs its holder in without a password.
+    """
+    query = db.session.query(User.id, User.username).filter(User.is_admin.isnot(True), User.is_active.isnot(False))
+    if not usernames:
+        return query.order_by(User.username).all()
+    found = {}
+    names = list(dict.fromkeys(usernames))
+    for start in range(0, len(names), 500):
+        chunk = names[start:start + 500]
+        found.update({row.username: row for row in query.filter(User.username.in_(chunk))})
+    return [found[name] for name in names if name in found]
+
+
+def mint(quiz_id, users, hours, created_by=None):
+    """Create a batch of links to a quiz, one per user
+
+    users: [(user_id, username), ...]. Only the batch row is written:
+    the links are signed, not stored. Returns (batch, [(username, token), ...]).
+    Runs inside the caller's transaction.
+    """
+    expires = datetime.utcnow().replace(microsecond=0) + timedelta(hours=hours)
+    batch = QuizLinkBatch(quiz_id=quiz_id, created_by=created_by, expires_at=expires, count=len(users))
+    db.session.add(batch)
+    db.session.flush()
+    expires_at = int((expires - datetime(1970, 1, 1)).total_seconds())
+    links = [(username, sign(LinkToken(batch.id, quiz_id, user_id, expires_at))) for user_id, username in users]
+    return batch, links
+
+
+def redeem(token):
+    """Mark a verified link as used; False if it was used before or its batch was revoked
+
+    One INSERT on the (batch_id, user_id) primary key, atomic across
+    processes. Runs inside the caller's transaction.
+    """
+    result = db.session.execute(_REDEEM, {'batch_id': token.batch_id, 'user_id': token.user_id,
+                                          'used_at': datetime.utcnow()})
+    return result.rowcount == 1
+
+
+def batch_usage(quiz_id):
+    """Batches of a quiz, newest first, with the number of redeemed links"""
+    used = dict(db.session.execute(text(
+        "SELECT u.batch_id, count(*) FROM quiz_link_use u JOIN quiz_link_batch b ON b.id = u.batch_id "
+        "WHERE b.quiz_id = :quiz_id GROUP BY u.batch_id"), {'quiz_id': quiz_id}).all())
+    batches = QuizLinkBatch.query.filter_by(quiz_id=quiz_id).order_by(QuizLinkBatch.id.desc()).all()
+    return [(batch, used.get(batch.id, 0)) for batch in batches]
@@ -0,0 +1,105 @@
+from sqlalchemy import insert, update
+
+from app import db, search
+from app.models import Question, Answer, QuestionStat, AnswerStat, QuizResponse, QuizAttempt
+
+
+def insert_questions(quiz_id, questions, start_order=1):
+    """Bulk insert questions with their answers, returns the new question ids
+
+    questions: [{'text': ..., 'answers': [{'text': ..., 'is_correct': ...}, ...]}, ...]
+    Question ids come back from a multi-row INSERT ... RETURNING, answers are
+    written with one executemany, then indexed for search in one statement.
+    Runs inside the caller's transaction.
+    """
+    if not questions:
+        return []
+
+    # Поисковый индекс заполняется один раз на пачку, а не триггерами на каждую строку
+    with search.deferred():
+        # order уникален внутри пачки, по нему сопоставляем возвращенные id без построчных INSERT
+        rows = db.session.execute(
+            insert(Question).returning(Question.id, Question.order),
+            [{'quiz_id': quiz_id, 'text': q['text'], 'order': order}
+             for order, q in enumerate(questions, start_order)]
+        ).all()
+        id_by_order = {order: q_id for q_id, order in rows}
+        question_ids = [id_by_order[order] for order in range(start_order, start_order + len(questions))]
+
+        answer_rows = [
+            {'question_id': q_id, 'text': a['text'], 'is_correct': bool(a['is_correct']), 'order': a_order}
+            for q_id, q in zip(question_ids, questions)
+            for a_order, a in enumerate(q.get('answers', []), 1)
+        ]
+        if answer_rows:
+            db.session.execute(insert(Answer), answer_rows)
+    search.index_questions(question_ids)
+    return question_ids
+
+
+def sync_answers(question, existing, incoming):
+    """Apply an edited answer list to a question with the minimum of writes
+
+    existing: the question's current Answer rows
+    incoming: [{'id': ... or None, 'text': ..., 'is_correct': ...}, ...] in display order
+    Incoming answers are matched to existing rows by id, then by identical
+    text, so unchanged answers keep their ids (old QuizResult.details keep
+    resolving). Removed answers take their AnswerStat rows with them.
+    Returns the number of changed rows.
+    """
+    by_id = {a.id: a for a in existing}
+    unmatched = dict(by_id)
+    matches = [None] * len(incoming)
+
+    for idx, a_data in enumerate(incoming):
+        try:
+            a_id = int(a_data.get('id'))
+        except (TypeError, ValueError):
+            continue
+        if a_id in unmatched:
+            matches[idx] = unmatched.pop(a_id)
+
+    for idx, a_data in enumerate(incoming):
+        if matches[idx] is None:
+            same_text = next((a for a in unmatched.values() if a.text == a_data['text']), None)
+            if same_text is not None:
+                matches[idx] = unmatched.pop(same_text.id)
+
+    updates, inserts = [], []
+    for order, (a_data, answer) in enumerate(zip(incoming, matches), 1):
+        values = {'text': a_data['text'], 'is_correct': bool(a_data['is_correct']), 'order': order}
+        if answer is None:
+            inserts.append(dict(values, question_id=question.id))
+        elif (answer.text, bool(answer.is_correct), answer.order) != (values['text'], values['is_correct'], order):
+            updates.append(dict(values, id=answer.id))
+
+    if updates:
+        db.session.execute(update(Answer), updates)
+    if inserts:
+        db.session.execute(insert(Answer), inserts)
+    if unmatched:
+        # Счетчики выборов удаленных ответов не в каскаде ORM, как и в delete_dependent_rows
+        db.session.query(AnswerStat).filter(AnswerStat.answer_id.in_(list(unmatched)))\
+            .delete(synchronize_session=False)
+        db.session.query(Answer).filter(Answer.id.in_(list(unmatched)))\
+            .delete(synchronize_session=False)
+    return len(updates) + len(inserts) + len(unmatched)
+
+
+def delete_dependent_rows(quiz_id):
+    """Delete the rows that point at a quiz's questions but are not in its ORM cascade
+
+    SQLite does not enforce the foreign keys, so without this deleting a quiz
+    leaves item statistics, responses and attempts behind. Results are kept.
+    Runs in the caller's transaction, before the quiz itself is deleted.
+    """
+    question_ids = db.session.query(Question.id).filter(Question.quiz_id == quiz_id).scalar_subquery()
+    db.session.query(AnswerStat).filter(AnswerStat.question_id.in_(question_ids))\
+        .delete(synchronize_session=False)
+    db.session.query(QuestionStat).filter(db.or_(QuestionStat.quiz_id == quiz_id,
+                                                 QuestionStat.question_id.in_(question_ids)))\
+        .delete(synchronize_session=False)
+    db.session.query(QuizResponse).filter(QuizResponse.question_id.in_(question_ids))\
+        .delete(synchronize_session=False)
+    db.session.query(QuizAttempt).filter(QuizAttempt.quiz_id == quiz_id)\
+        .delete(synchronize_session=False)
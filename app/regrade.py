@@ -0,0 +1,198 @@
+import json
+import time
+import uuid
+from threading import Lock, Thread
+
+from sqlalchemy import text
+
+from app import db, logger, quiz_cache, grading, responses, item_stats
+from app.models import QuizResult
+
+DEFAULT_CHUNK_SIZE = 500
+
+_UPDATE_SQL = text('UPDATE quiz_result SET score = :score, details = :details WHERE id = :id')
+
+_jobs = {}  # {job_id: status dict}
+_jobs_lock = Lock()
+
+
+def parse_items(details):
+    """The stored per-question result items of a details blob"""
+    data = json.loads(details or '{}')
+    # Старые записи хранили только список результатов
+    items = data.get('results', []) if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        raise ValueError('details has no results list')
+    return items
+
+
+def parse_submission(details):
+    """Restore the submitted answers {question_id: [answer_id, ...]} from a details blob"""
+    return {int(item['question_id']): item.get('user_answers', []) for item in parse_items(details)}
+
+
+def stale_items(items, answer_ids):
+    """{question_id: item} of stored items naming answers their question no longer has
+
+    Edits keep the ids of answers they match (quiz_store.sync_answers), but an
+    answer removed since, or any answer of a result stored before answer ids
+    were kept stable, no longer exists. Such items cannot be compared with the
+    current key: regrading them would turn every such correct answer into a
+    wrong one.
+    """
+    stale = {}
+    for item in items:
+        q_id = int(item['question_id'])
+        current = answer_ids.get(q_id)
+        if current is None:
+            continue
+        stored = list(item.get('user_answers') or []) + list(item.get('correct_answers') or [])
+        if any(int(a_id) not in current for a_id in stored):
+            stale[q_id] = item
+    return stale
+
+
+def keep_stale(full_results, stale):
+    """Put the stored verdicts of stale items back into a fresh grading"""
+    results = [stale.get(item['question_id'], item) for item in full_results['results']]
+    correct = sum(1 for item in results if item.get('is_correct'))
+    full_results.update(results=results, correct_count=correct,
+                        incorrect_count=full_results['total_questions'] - correct)
+    return full_results
+
+
+def parse_variant(details):
+    """Question ids of the variant a result was graded against, or None"""
+    data = json.loads(details or '{}')
+    variant = data.get('variant') if isinstance(data, dict) else None
+    return None if variant is None else [int(q_id) for q_id in variant]
+
+
+def iter_result_chunks(quiz_id, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield (id, details, score) chunks of a quiz's results using keyset pagination on id"""
+    last_id = 0
+    while True:
+        rows = db.session.query(QuizResult.id, QuizResult.details, QuizResult.score)\
+            .filter(QuizResult.quiz_id == quiz_id, QuizResult.id > last_id)\
+            .order_by(QuizResult.id)\
+            .limit(chunk_size)\
+            .all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def regrade_quiz(quiz_id, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """Re-score every stored result of a quiz against the current answer key
+
+    Results are read and written chunk by chunk, one transaction per chunk,
+    so memory use does not depend on the number of results. Answers naming
+    answer ids that no longer exist (see stale_items) keep their stored verdict
+    (counted in stats['kept']) instead of being marked wrong. Results with
+    answers to questions deleted since cannot be regraded and are left as
+    they are (stats['skipped']). Results that still end up with a lower
+    score are counted in stats['lowered'] and logged.
+    """
+    compiled = quiz_cache.get_compiled_quiz(quiz_id)
+    if compiled is None:
+        raise LookupError(f'Quiz {quiz_id} not found')
+    key = grading.answer_key(compiled)
+    answer_ids = {q.id: frozenset(a.id for a in q.answers) for q in compiled.questions}
+
+    stats = {'processed': 0, 'updated': 0, 'failed': 0, 'skipped': 0, 'kept': 0, 'lowered': 0,
+             'elapsed': 0.0, 'rate': 0.0}
+    started = time.perf_counter()
+
+    for rows in iter_result_chunks(quiz_id, chunk_size):
+        params = []
+        response_rows = []
+        for result_id, details, old_score in rows:
+            try:
+                variant = parse_variant(details)
+                result_key = key if variant is None else grading.variant_key(key, variant)
+                items = parse_items(details)
+                if any(int(item['question_id']) not in answer_ids for item in items):
+                    stats['skipped'] += 1
+                    continue
+                full_results = grading.grade(result_key, {int(item['question_id']): item.get('user_answers', [])
+                                                          for item in items})
+                stale = stale_items(items, answer_ids)
+                if stale:
+                    keep_stale(full_results, stale)
+                    stats['kept'] += len(stale)
+            except (ValueError, TypeError, KeyError) as e:
+                stats['failed'] += 1
+                logger.warning('Regrade quiz %s: skipping result %s: %s', quiz_id, result_id, e)
+                continue
+            new_score = grading.score(full_results)
+            if old_score is not None and new_score < old_score - 1e-9:
+                stats['lowered'] += 1
+                logger.info('Regrade quiz %s: result %s lowered from %.1f to %.1f', quiz_id, result_id,
+                            old_score, new_score)
+            params.append({
+                'id': result_id,
+                'score': new_score,
+                'details': json.dumps(full_results, ensure_ascii=False)
+            })
+            response_rows.extend(responses.response_rows(result_id, full_results['results']))
+
+        if params:
+            db.session.execute(_UPDATE_SQL, params)
+            responses.replace_responses([p['id'] for p in params], response_rows)
+        db.session.commit()
+
+        stats['processed'] += len(rows)
+        stats['updated'] += len(params)
+        stats['elapsed'] = time.perf_counter() - started
+        stats['rate'] = stats['processed'] / stats['elapsed'] if stats['elapsed'] else 0.0
+        if progress:
+            progress(dict(stats))
+
+    # Счетчики статистики зависят от оценок, пересобираем их целиком
+    item_stats.rebuild(quiz_id)
+
+    stats['elapsed'] = time.perf_counter() - started
+    stats['rate'] = stats['processed'] / stats['elapsed'] if stats['elapsed'] else 0.0
+    logger.info('Regraded quiz %s: %s/%s results in %.2fs (%.0f results/s), %s failed, '
+                '%s skipped (questions deleted since), %s answers kept (edited since), %s scores lowered',
+                quiz_id, stats['updated'], stats['processed'], stats['elapsed'], stats['rate'], stats['failed'],
+                stats['skipped'], stats['kept'], stats['lowered'])
+    return stats
+
+
+def _run_job(app, job_id, quiz_id, chunk_size):
+    def progress(stats):
+        with _jobs_lock:
+            _jobs[job_id].update(stats)
+
+    with app.app_context():
+        try:
+            stats = regrade_quiz(quiz_id, chunk_size, progress=progress)
+            with _jobs_lock:
+                _jobs[job_id].update(stats, status='done')
+        except Exception as e:
+            db.session.rollback()
+            logger.error('Regrade job %s for quiz %s failed: %s', job_id, quiz_id, e)
+            with _jobs_lock:
+                _jobs[job_id].update(status='error', message=str(e))
+        finally:
+            db.session.remove()
+
+
+def start_regrade(app, quiz_id, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Run regrade_quiz in a background thread and return the job id"""
+    job_id = uuid.uuid4().hex
+    with _jobs_lock:
+        _jobs[job_id] = {'job_id': job_id, 'quiz_id': quiz_id, 'status': 'running',
+                         'processed': 0, 'updated': 0, 'failed': 0, 'skipped': 0, 'kept': 0, 'lowered': 0,
+                         'elapsed': 0.0, 'rate': 0.0}
+    Thread(target=_run_job, args=(app, job_id, quiz_id, chunk_size), daemon=True,
+           name=f'regrade-{quiz_id}').start()
+    return job_id
+
+
+def get_job(job_id):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
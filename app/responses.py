@@ -0,0 +1,121 @@
+import time
+
+from sqlalchemy import func, insert
+
+from app import db, logger
+from app.models import QuizResponse, QuizResult
+from app.result_details import parse_details
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def encode_answer_ids(answer_ids):
+    return ','.join(str(int(a_id)) for a_id in answer_ids)
+
+
+def decode_answer_ids(value):
+    return [int(a_id) for a_id in value.split(',')] if value else []
+
+
+def response_rows(result_id, items):
+    """QuizResponse insert parameters for the details items of one result"""
+    rows = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            rows.append({
+                'result_id': result_id,
+                'question_id': int(item['question_id']),
+                'is_correct': bool(item.get('is_correct', False)),
+                'answer_ids': encode_answer_ids(item.get('user_answers', []))
+            })
+        except (KeyError, TypeError, ValueError):
+            continue
+    return rows
+
+
+def insert_responses(rows):
+    """Bulk insert QuizResponse rows with a single executemany"""
+    if rows:
+        db.session.execute(insert(QuizResponse), rows)
+
+
+def replace_responses(result_ids, rows):
+    """Delete the responses of the given results and insert the new rows"""
+    if result_ids:
+        db.session.query(QuizResponse)\
+            .filter(QuizResponse.result_id.in_(list(result_ids)))\
+            .delete(synchronize_session=False)
+    insert_responses(rows)
+
+
+def backfill_responses(chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """Create QuizResponse rows for every result that has none yet
+
+    Results are streamed with keyset pagination on id and every chunk is
+    committed separately, so the backfill can be interrupted and resumed.
+    """
+    stats = {'processed': 0, 'inserted': 0, 'failed': 0, 'elapsed': 0.0}
+    started = time.perf_counter()
+    last_id = 0
+    has_responses = db.session.query(QuizResponse.id)\
+        .filter(QuizResponse.result_id == QuizResult.id)\
+        .exists()
+
+    while True:
+        rows = db.session.query(QuizResult.id, QuizResult.details)\
+            .filter(QuizResult.id > last_id)\
+            .filter(~has_responses)\
+            .order_by(QuizResult.id)\
+            .limit(chunk_size)\
+            .all()
+        if not rows:
+            break
+
+        params = []
+        for result_id, details in rows:
+            try:
+                _, items = parse_details(details)
+            except (ValueError, TypeError) as e:
+                stats['failed'] += 1
+                logger.warning('Backfill: skipping result %s: %s', result_id, e)
+                continue
+            params.extend(response_rows(result_id, items))
+
+        insert_responses(params)
+        db.session.commit()
+
+        last_id = rows[-1][0]
+        stats['processed'] += len(rows)
+        stats['inserted'] += len(params)
+        stats['elapsed'] = time.perf_counter() - started
+        if progress:
+            progress(dict(stats))
+
+    stats['elapsed'] = time.perf_counter() - started
+    logger.info('Backfilled %s responses for %s results in %.2fs, %s failed',
+                stats['inserted'], stats['processed'], stats['elapsed'], stats['failed'])
+    return stats
+
+
+def question_stats(quiz_id):
+    """{question_id: (attempts, correct)} for a quiz, computed in SQL"""
+    rows = db.session.query(
+        QuizResponse.question_id,
+        func.count(QuizResponse.id),
+        func.sum(db.case((QuizResponse.is_correct == True, 1), else_=0))
+    ).join(QuizResult, QuizResponse.result_id == QuizResult.id)\
+        .filter(QuizResult.quiz_id == quiz_id)\
+        .group_by(QuizResponse.question_id)\
+        .all()
+    return {q_id: (attempts, correct or 0) for q_id, attempts, correct in rows}
+
+
+def user_question_history(user_id, question_id):
+    """All answers of a user to one question, newest first"""
+    return db.session.query(QuizResult.completed_at, QuizResponse.is_correct, QuizResponse.answer_ids)\
+        .join(QuizResult, QuizResponse.result_id == QuizResult.id)\
+        .filter(QuizResult.user_id == user_id, QuizResponse.question_id == question_id)\
+        .order_by(QuizResult.completed_at.desc())\
+        .all()
@@ -0,0 +1,133 @@
+import json
+
+from app import db, quiz_cache
+from app.models import Question, Answer
+
+IN_CHUNK_SIZE = 500
+
+
+def parse_details(raw):
+    """Return (data, items) for a QuizResult.details blob
+
+    Newer results store a dict with a 'results' list, older ones only the list.
+    Raises ValueError/TypeError on invalid JSON.
+    """
+    data = json.loads(raw or '{}')
+    if isinstance(data, dict):
+        items = data.get('results', [])
+    elif isinstance(data, list):
+        items = data
+    else:
+        items = []
+    return data, items
+
+
+def _ids(values):
+    return [int(a_id) for a_id in values or [] if str(a_id).strip().isdigit()]
+
+
+def text_statements(column_id, column_text, ids):
+    """SELECT id, text ... WHERE id IN (...) in chunks of IN_CHUNK_SIZE ids"""
+    ids = list(ids)
+    for start in range(0, len(ids), IN_CHUNK_SIZE):
+        yield db.select(column_id, column_text).where(column_id.in_(ids[start:start + IN_CHUNK_SIZE]))
+
+
+def _fetch_texts(column_id, column_text, ids):
+    texts = {}
+    for statement in text_statements(column_id, column_text, ids):
+        texts.update(db.session.execute(statement).all())
+    return texts
+
+
+def referenced_ids(items):
+    """Sets of the question ids and answer ids the details items refer to"""
+    question_ids, answer_ids = set(), set()
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            question_ids.add(int(item.get('question_id', 0)))
+        except (TypeError, ValueError):
+            pass
+        answer_ids.update(_ids(item.get('user_answers')))
+        answer_ids.update(_ids(item.get('correct_answers')))
+    return question_ids, answer_ids
+
+
+def compiled_texts(compiled):
+    """{question_id: text} and {answer_id: text} of a compiled quiz (empty for None)"""
+    questions, answers = {}, {}
+    if compiled is not None:
+        for q in compiled.questions:
+            questions[q.id] = q.text
+            for a in q.answers:
+                answers[a.id] = a.text
+    return questions, answers
+
+
+def load_texts(quiz_id, items):
+    """Resolve every question and answer id referenced by the items in bulk
+
+    Ids are looked up in the compiled quiz first; ids that are no longer part
+    of the quiz are fetched with IN (...) queries. Returns two dicts:
+    {question_id: text} and {answer_id: text}.
+    """
+    question_ids, answer_ids = referenced_ids(items)
+    questions, answers = compiled_texts(quiz_cache.get_compiled_quiz(quiz_id) if quiz_id else None)
+
+    missing = question_ids - questions.keys()
+    if missing:
+        questions.update(_fetch_texts(Question.id, Question.text, missing))
+    missing = answer_ids - answers.keys()
+    if missing:
+        answers.update(_fetch_texts(Answer.id, Answer.text, missing))
+    return questions, answers
+
+
+def resolve_items(quiz_id, items, on_missing=None):
+    """Attach question and answer texts to the details items
+
+    Items that are not dicts or reference an unknown question are skipped.
+    on_missing(kind, id, index) is called for every id that could not be resolved.
+    """
+    return attach_texts(items, *load_texts(quiz_id, items), on_missing=on_missing)
+
+
+def attach_texts(items, questions, answers, on_missing=None):
+    """resolve_items with the texts already loaded"""
+    resolved = []
+    for idx, item in enumerate(items):
+        if not isinstance(item, dict):
+            if on_missing:
+                on_missing('item', item, idx)
+            continue
+        try:
+            q_id = int(item.get('question_id', 0))
+        except (TypeError, ValueError):
+            q_id = 0
+        if q_id not in questions:
+            if on_missing:
+                on_missing('question', item.get('question_id'), idx)
+            continue
+
+        texts = {}
+        for field in ('user_answers', 'correct_answers'):
+            texts[field] = []
+            for a_id in _ids(item.get(field)):
+                if a_id in answers:
+                    texts[field].append(answers[a_id])
+                else:
+                    texts[field].append(f'Unknown ({a_id})')
+                    if on_missing:
+                        on_missing(field, a_id, idx)
+
+        resolved.append(dict(
+            item,
+            question_id=q_id,
+            question_text=questions[q_id],
+            is_correct=item.get('is_correct', False),
+            user_answers_text=texts['user_answers'],
+            correct_answers_text=texts['correct_answers']
+        ))
+    return resolved
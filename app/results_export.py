@@ -0,0 +1,201 @@
+import csv
+import io
+import tempfile
+import time
+import zlib
+from datetime import datetime
+
+from app import db, logger, quiz_cache
+from app.models import Question, Answer, QuizResult
+from app.result_details import parse_details
+from app.results_query import SORT_COLUMNS, list_query
+
+YIELD_PER = 1000  # rows fetched from the cursor at a time
+CHUNK_SIZE = 64 * 1024  # bytes per yielded piece of the response
+XLSX_MAX_ROWS = 1048576  # Excel sheet limit, the rest goes to the next sheet
+
+SUMMARY_COLUMNS = ['result_id', 'completed_at', 'username', 'quiz_id', 'quiz', 'score',
+                   'correct_count', 'total_questions']
+DETAIL_COLUMNS = ['result_id', 'completed_at', 'username', 'quiz_id', 'quiz', 'score',
+                  'question_no', 'question_id', 'question', 'is_correct', 'user_answers', 'correct_answers']
+
+
+def export_query(filters):
+    """Results matching the list filters, in the list order, streamed from the cursor
+
+    Only columns are selected, so no ORM objects pile up in the session.
+    """
+    column = SORT_COLUMNS[filters['sort']]
+    if filters['order'] == 'desc':
+        order = (column.desc(), QuizResult.id.desc())
+    else:
+        order = (column.asc(), QuizResult.id.asc())
+    return list_query(filters).add_columns(QuizResult.details).order_by(*order).yield_per(YIELD_PER)
+
+
+class TextResolver:
+    """Question and answer texts for the export, loaded once per quiz
+
+    Ids that are no longer part of their quiz are looked up one by one and
+    remembered, so each costs one query per export at most.
+    """
+
+    def __init__(self):
+        self.questions = {}
+        self.answers = {}
+        self._quizzes = set()
+
+    def load_quiz(self, quiz_id):
+        if quiz_id in self._quizzes:
+            return
+        self._quizzes.add(quiz_id)
+        compiled = quiz_cache.get_compiled_quiz(quiz_id)
+        if compiled is None:
+            return
+        for q in compiled.questions:
+            self.questions[q.id] = q.text
+            for a in q.answers:
+                self.answers[a.id] = a.text
+
+    def question(self, question_id):
+        if question_id not in self.questions:
+            self.questions[question_id] = db.session.query(Question.text).filter_by(id=question_id).scalar() or ''
+        return self.questions[question_id]
+
+    def answer(self, answer_id):
+        if answer_id not in self.answers:
+            self.answers[answer_id] = db.session.query(Answer.text).filter_by(id=answer_id).scalar() or ''
+        return self.answers[answer_id]
+
+    def answer_list(self, answer_ids):
+        texts = []
+        for a_id in answer_ids or []:
+            try:
+                texts.append(self.answer(int(a_id)))
+            except (TypeError, ValueError):
+                continue
+        return ' | '.join(texts)
+
+
+def iter_rows(filters, detail=True):
+    """Export rows: one per result, or one per answered question with detail"""
+    resolver = TextResolver()
+    for row in export_query(filters):
+        base = [row.id, row.completed_at, row.username, row.quiz_id, row.title, round(row.score or 0, 2)]
+        try:
+            data, items = parse_details(row.details)
+        except (ValueError, TypeError):
+            logger.warning('Export: result %s has invalid details', row.id)
+            data, items = {}, []
+        if not detail:
+            data = data if isinstance(data, dict) else {}
+            correct = data.get('correct_count')
+            if correct is None:
+                correct = sum(1 for item in items if isinstance(item, dict) and item.get('is_correct'))
+            yield base + [correct, data.get('total_questions', len(items))]
+            continue
+
+        resolver.load_quiz(row.quiz_id)
+        for number, item in enumerate(items, 1):
+            if not isinstance(item, dict):
+                continue
+            try:
+                question_id = int(item.get('question_id'))
+            except (TypeError, ValueError):
+                continue
+            yield base + [number, question_id, resolver.question(question_id), bool(item.get('is_correct')),
+                          resolver.answer_list(item.get('user_answers')),
+                          resolver.answer_list(item.get('correct_answers'))]
+
+
+def _csv_cell(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@', '\t', '\r'):
+        # Защита от формул при открытии файла в Excel
+        return "'" + value
+    return value
+
+
+def csv_chunks(header, rows, compress=False):
+    """Encoded CSV in pieces of about CHUNK_SIZE bytes, gzip-compressed on the fly if asked
+
+    The header goes out at once, before the query runs, so the download
+    starts immediately. Memory use does not depend on the number of rows.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # wbits 31 = gzip container
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def take(final=False):
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        if compressor is None:
+            return data
+        data = compressor.compress(data)
+        return data + compressor.flush() if final else data
+
+    buffer.write('\ufeff')  # BOM: Excel открывает UTF-8 с кириллицей только с ним
+    writer.writerow(header)
+    first = take()
+    if compressor is not None:
+        first += compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield first
+
+    for row in rows:
+        writer.writerow([_csv_cell(value) for value in row])
+        if buffer.tell() >= CHUNK_SIZE:
+            data = take()
+            if data:
+                yield data
+    yield take(final=True)
+
+
+def xlsx_chunks(header, rows):
+    """XLSX file in pieces of CHUNK_SIZE bytes, built with a write-only workbook
+
+    Rows are written straight to temporary files, so memory stays flat,
+    but an XLSX is a zip archive: bytes are sent only once it is complete.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+    def cell(value):
+        if isinstance(value, str):
+            return ILLEGAL_CHARACTERS_RE.sub('', value)
+        return value
+
+    workbook = Workbook(write_only=True)
+    sheet, written, sheets = None, XLSX_MAX_ROWS, 0
+    for row in rows:
+        if written >= XLSX_MAX_ROWS:
+            sheets += 1
+            sheet = workbook.create_sheet('Results' if sheets == 1 else f'Results {sheets}')
+            sheet.append(header)
+            written = 1
+        sheet.append([cell(value) for value in row])
+        written += 1
+    if sheet is None:
+        workbook.create_sheet('Results').append(header)
+
+    with tempfile.TemporaryFile() as f:
+        workbook.save(f)
+        f.seek(0)
+        while True:
+            data = f.read(CHUNK_SIZE)
+            if not data:
+                break
+            yield data
+
+
+def logged(chunks, description):
+    """Pass the chunks through and log the size and duration of the export"""
+    started = time.perf_counter()
+    sent = 0
+    try:
+        for data in chunks:
+            sent += len(data)
+            yield data
+    finally:
+        logger.info('Export %s: %s bytes in %.2fs', description, sent, time.perf_counter() - started)
@@ -0,0 +1,135 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import tuple_
+
+from app import db
+from app.models import QuizResult, Quiz, User
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+SORT_COLUMNS = {
+    'completed_at': QuizResult.completed_at,
+    # Результат без балла идет как 0 и в ORDER BY, и в курсоре: NULL в курсоре обрывал листание.
+    # Литерал, а не параметр, чтобы совпасть с индексом ix_quiz_result_score_value
+    'score': db.func.coalesce(QuizResult.score, db.literal_column('0')),
+}
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d') if value else None
+    except ValueError:
+        return None
+
+
+def parse_filters(args):
+    """Read quiz/user/date filters and sorting from request args"""
+    sort = args.get('sort', 'completed_at')
+    order = args.get('order', 'desc')
+    return {
+        'quiz_id': args.get('quiz_id', type=int),
+        'user': (args.get('user') or '').strip(),
+        'date_from': _parse_date(args.get('date_from')),
+        'date_to': _parse_date(args.get('date_to')),
+        'sort': sort if sort in SORT_COLUMNS else 'completed_at',
+        'order': order if order in ('asc', 'desc') else 'desc',
+    }
+
+
+def filter_query(query, filters):
+    if filters.get('quiz_id'):
+        query = query.filter(QuizResult.quiz_id == filters['quiz_id'])
+    if filters.get('user'):
+        # Поиск по началу имени пользователя
+        query = query.filter(User.username_prefix(filters['user']))
+    if filters.get('date_from'):
+        query = query.filter(QuizResult.completed_at >= filters['date_from'])
+    if filters.get('date_to'):
+        # date_to включительно: до начала следующего дня
+        query = query.filter(QuizResult.completed_at < filters['date_to'] + timedelta(days=1))
+    return query
+
+
+def list_query(filters):
+    """Result rows for list views, without the details blob"""
+    query = db.session.query(
+        QuizResult.id, QuizResult.quiz_id, Quiz.title, User.username,
+        QuizResult.score, QuizResult.completed_at
+    ).join(User, QuizResult.user_id == User.id)\
+        .join(Quiz, QuizResult.quiz_id == Quiz.id)
+    return filter_query(query, filters)
+
+
+def encode_cursor(value, result_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, result_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor, sort):
+    try:
+        value, result_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if sort == 'completed_at':
+            value = datetime.fromisoformat(value)
+        return value, int(result_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def fetch_page(filters, cursor=None, limit=PAGE_SIZE):
+    """One page of results ordered by (sort column, id) plus the cursor for the next page"""
+    column = SORT_COLUMNS[filters['sort']]
+    descending = filters['order'] == 'desc'
+    limit = max(1, min(limit or PAGE_SIZE, MAX_PAGE_SIZE))
+
+    query = list_query(filters)
+    position = decode_cursor(cursor, filters['sort']) if cursor else None
+    if position is not None:
+        key = tuple_(column, QuizResult.id)
+        query = query.filter(key < position if descending else key > position)
+
+    if descending:
+        query = query.order_by(column.desc(), QuizResult.id.desc())
+    else:
+        query = query.order_by(column.asc(), QuizResult.id.asc())
+
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = [{
+        'id': row.id,
+        'quiz_id': row.quiz_id,
+        'title': row.title,
+        'username': row.username,
+        'score': row.score or 0,
+        'completed_at': row.completed_at.strftime('%Y-%m-%d %H:%M') if row.completed_at else '',
+    } for row in rows]
+
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        value = last.completed_at if filters['sort'] == 'completed_at' else last.score or 0
+        next_cursor = encode_cursor(value, last.id)
+    return items, next_cursor
+
+
+def latest_result(user_id, quiz_id):
+    """The user's most recent result of a quiz (ix_quiz_result_user_quiz_completed)"""
+    return db.session.execute(latest_statement(user_id, quiz_id)).scalars().first()
+
+
+def latest_statement(user_id, quiz_id):
+    return db.select(QuizResult).where(QuizResult.quiz_id == quiz_id, QuizResult.user_id == user_id)\
+        .order_by(QuizResult.completed_at.desc()).limit(1)
+
+
+def count_results(filters):
+    query = db.session.query(db.func.count(QuizResult.id))\
+        .join(User, QuizResult.user_id == User.id)\
+        .join(Quiz, QuizResult.quiz_id == Quiz.id)
+    return filter_query(query, filters).scalar()
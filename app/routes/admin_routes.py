@@ -1,9 +1,15 @@
-from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash, current_app, abort, Response, stream_with_context
 from flask_login import login_required, current_user
-from app import db, logger
-from app.models import QuizResult, User, Quiz, Question, Answer
+from app import db, logger, access_logger
+from app.models import QuizResult, User, Quiz, Question, Answer, QuizPool, QuizLinkBatch
+from app import quiz_cache, regrade, results_query, result_details, item_stats, quiz_import, quiz_store, http_cache, metrics, search, results_export, quiz_links, users
 from functools import wraps
+import csv
+import hmac
+import io
 import json
+import time
+from datetime import datetime
 
 
 admin_bp = Blueprint('admin', __name__, template_folder='../templates/admin')
@@ -12,7 +18,7 @@ def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if not current_user.is_authenticated or not current_user.is_admin:
-            logger.warning(f'Unauthorized access attempt by {current_user.username if current_user.is_authenticated else "anonymous"} to admin route')
+            logger.warning('Unauthorized access attempt by %s to admin route', current_user.username if current_user.is_authenticated else "anonymous")
             flash('Access denied. Admin privileges required.', 'error')
             return redirect(url_for('auth.login'))
         return f(*args, **kwargs)
@@ -21,9 +27,14 @@ def admin_required(f):
 @admin_bp.route('/admin')
 @admin_required
 def dashboard():
-    quizzes = Quiz.query.all()
-    logger.info(f'Admin {current_user.username} accessed admin dashboard')
-    return render_template('admin/dashboard.html', quizzes=quizzes)
+    quiz_table, table_hash = http_cache.render_fragment(
+        'admin/_quiz_table.html', lambda: {'quizzes': Quiz.query.all()})
+    etag = http_cache.page_etag('dashboard', table_hash, metrics.is_enabled())
+    if http_cache.is_fresh(etag):
+        return http_cache.not_modified(etag)
+    access_logger.info('Admin %s accessed admin dashboard', current_user.username)
+    return http_cache.cached_response(render_template('admin/dashboard.html', quiz_table=quiz_table,
+                                                      metrics_enabled=metrics.is_enabled()), etag)
 
 @admin_bp.route('/admin/create', methods=['GET', 'POST'])
 @admin_required
@@ -44,35 +55,44 @@ def create_quiz():
             db.session.add(quiz)
             db.session.flush()
 
-            for q_idx, q_data in enumerate(questions, 1):
-                question = Question(
-                    quiz_id=quiz.id,
-                    text=q_data['text'],
-                    order=q_idx
-                )
-                db.session.add(question)
-                db.session.flush()
-
-                for a_idx, a_data in enumerate(q_data['answers'], 1):
-                    answer = Answer(
-                        question_id=question.id,
-                        text=a_data['text'],
-                        is_correct=a_data['is_correct'],
-                        order=a_idx
-                    )
-                    db.session.add(answer)
+            # Все вопросы одной вставкой с RETURNING, ответы одним executemany
+            quiz_store.insert_questions(quiz.id, questions)
 
             db.session.commit()
-            logger.info(f'Quiz "{quiz_title}" created by {current_user.username}')
+            quiz_cache.invalidate(quiz.id)
+            logger.info('Quiz "%s" created by %s', quiz_title, current_user.username)
             return jsonify({'success': True, 'message': 'Quiz created successfully'})
         except Exception as e:
             db.session.rollback()
-            logger.error(f'Error creating quiz: {str(e)}')
+            logger.error('Error creating quiz: %s', e)
             return jsonify({'success': False, 'message': str(e)}), 500
 
     return render_template('admin/create_quiz.html')
 
 
+@admin_bp.route('/admin/import', methods=['GET', 'POST'])
+@admin_required
+def import_quiz():
+    reports = []
+    if request.method == 'POST':
+        for storage in request.files.getlist('files'):
+            if not storage.filename:
+                continue
+            try:
+                report = quiz_import.import_upload(storage, created_by=current_user.id)
+                reports.append((storage.filename, report))
+                logger.info('Admin %s imported "%s": %s questions, %s issues', current_user.username, storage.filename, report.questions, len(report.issues))
+            except Exception as e:
+                logger.error('Error importing %s: %s', storage.filename, e)
+                flash(f'{storage.filename}: {str(e)}', 'error')
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({'success': True, 'reports': [
+                dict(report._asdict(), filename=filename, issues=[issue._asdict() for issue in report.issues])
+                for filename, report in reports
+            ]})
+    return render_template('admin/import_quiz.html', reports=reports)
+
+
 # ... (существующий код dashboard и create_quiz остается без изменений)
 @admin_bp.route('/admin/edit/<int:quiz_id>', methods=['GET', 'POST'])
 @admin_required
@@ -82,17 +102,27 @@ def edit_quiz(quiz_id):
         try:
             quiz.title = request.form.get('title')
             quiz.description = request.form.get('description')
+            # Пул: каждая попытка получает draw_count случайных вопросов квиза
+            draw_count = request.form.get('draw_count', type=int) or 0
+            if draw_count > 0:
+                pool = quiz.pool or QuizPool(quiz_id=quiz.id)
+                pool.draw_count = draw_count
+                pool.shuffle_answers = 'shuffle_answers' in request.form
+                db.session.add(pool)
+            elif quiz.pool is not None:
+                db.session.delete(quiz.pool)
             db.session.commit()
-            logger.info(f'Quiz details "{quiz.title}" updated by {current_user.username}')
+            quiz_cache.invalidate(quiz_id)
+            logger.info('Quiz details "%s" updated by %s', quiz.title, current_user.username)
             flash('Quiz details updated successfully', 'success')
         except Exception as e:
             db.session.rollback()
-            logger.error(f'Error updating quiz details {quiz_id}: {str(e)}')
+            logger.error('Error updating quiz details %s: %s', quiz_id, e)
             flash(str(e), 'error')
         return redirect(url_for('admin.edit_quiz', quiz_id=quiz_id))
     
     questions = Question.query.filter_by(quiz_id=quiz_id).order_by(Question.order).all()
-    logger.info(f'Admin {current_user.username} accessed edit quiz {quiz_id}')
+    access_logger.info('Admin %s accessed edit quiz %s', current_user.username, quiz_id)
     return render_template('admin/edit_quiz.html', quiz=quiz, questions=questions)
 
 
@@ -100,8 +130,7 @@ def edit_quiz(quiz_id):
 @admin_required
 def edit_question(quiz_id, question_order):
     quiz = Quiz.query.get_or_404(quiz_id)
-    questions = Question.query.filter_by(quiz_id=quiz_id).order_by(Question.order).all()
-    total = len(questions)
+    total = Question.query.filter_by(quiz_id=quiz_id).count()
     if question_order < 1 or question_order > total + 1:
         flash('Invalid question order', 'error')
         return redirect(url_for('admin.edit_quiz', quiz_id=quiz_id))
@@ -111,28 +140,28 @@ def edit_question(quiz_id, question_order):
         question = Question(quiz_id=quiz_id, text='', order=question_order)
         db.session.add(question)
         db.session.commit()
+        quiz_cache.invalidate(quiz_id)
         answers = []
-        logger.info(f'New question {question_order} added to quiz {quiz_id} by {current_user.username}')
+        logger.info('New question %s added to quiz %s by %s', question_order, quiz_id, current_user.username)
     else:
-        question = questions[question_order - 1]
+        question = Question.query.filter_by(quiz_id=quiz_id)\
+            .order_by(Question.order, Question.id)\
+            .offset(question_order - 1)\
+            .first()
         answers = Answer.query.filter_by(question_id=question.id).order_by(Answer.order).all()
 
     if request.method == 'POST':
         try:
             data = request.get_json()
-            question.text = data.get('text')
-            Answer.query.filter_by(question_id=question.id).delete()
-            db.session.flush()
-            for a_idx, a_data in enumerate(data.get('answers', []), 1):
-                answer = Answer(
-                    question_id=question.id,
-                    text=a_data['text'],
-                    is_correct=a_data['is_correct'],
-                    order=a_idx
-                )
-                db.session.add(answer)
+            # Пишем только изменения: id ответов остаются стабильными между автосохранениями
+            changed = quiz_store.sync_answers(question, answers, data.get('answers', []))
+            if question.text != data.get('text'):
+                question.text = data.get('text')
+                changed += 1
             db.session.commit()
-            logger.info(f'Question {question_order} in quiz {quiz_id} updated by {current_user.username}')
+            if changed:
+                quiz_cache.invalidate(quiz_id)
+            logger.info('Question %s in quiz %s updated by %s', question_order, quiz_id, current_user.username)
             action = data.get('action')
             if action == 'next' and question_order < total + 1:
                 return jsonify({'success': True, 'redirect': url_for('admin.edit_question', quiz_id=quiz_id, question_order=question_order + 1)})
@@ -142,7 +171,7 @@ def edit_question(quiz_id, question_order):
                 return jsonify({'success': True, 'redirect': url_for('admin.edit_quiz', quiz_id=quiz_id)})
         except Exception as e:
             db.session.rollback()
-            logger.error(f'Error updating question {question_order} in quiz {quiz_id}: {str(e)}')
+            logger.error('Error updating question %s in quiz %s: %s', question_order, quiz_id, e)
             return jsonify({'success': False, 'message': str(e)}), 500
 
     question_data = {
@@ -151,121 +180,355 @@ def edit_question(quiz_id, question_order):
     }
     return render_template('admin/edit_question.html', quiz=quiz, question_data=question_data, question_order=question_order, total_questions=total + (1 if question_order > total else 0))
 
+@admin_bp.route('/admin/edit/question/<int:question_id>')
+@admin_required
+def edit_question_by_id(question_id):
+    """Jump from a search hit to the question's page in the editor"""
+    position = search.question_position(question_id)
+    if position is None:
+        abort(404)
+    quiz_id, question_order = position
+    return redirect(url_for('admin.edit_question', quiz_id=quiz_id, question_order=question_order))
+
+@admin_bp.route('/admin/search')
+@admin_required
+def search_questions():
+    """Ranked full-text search over question and answer text"""
+    query = request.args.get('q', '').strip()
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))  # LIMIT -1 в SQLite — без ограничения
+    try:
+        started = time.perf_counter()
+        hits = search.search(query, limit)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+    except Exception as e:
+        logger.error('Search for %r failed: %s', query, e)
+        return jsonify({'success': False, 'message': str(e)}), 500
+    for hit in hits:
+        hit['edit_url'] = url_for('admin.edit_question_by_id', question_id=hit['question_id'])
+    return jsonify({'success': True, 'query': query, 'hits': hits, 'elapsed_ms': round(elapsed_ms, 2)})
+
+@admin_bp.route('/admin/search/duplicates')
+@admin_required
+def duplicate_questions():
+    """Near-duplicate questions, by default across different quizzes"""
+    threshold = min(max(request.args.get('threshold', 0.8, type=float), 0.3), 1.0)
+    across_quizzes = request.args.get('same_quiz') != '1'
+    started = time.perf_counter()
+    groups = search.find_near_duplicates(threshold, across_quizzes=across_quizzes)
+    elapsed = time.perf_counter() - started
+    logger.info('Admin %s ran duplicate detection: %s groups in %.2fs', current_user.username, len(groups), elapsed)
+    if request.args.get('format') == 'json':
+        return jsonify({'success': True, 'threshold': threshold, 'groups': groups})
+    return render_template('admin/duplicates.html', groups=groups, threshold=threshold,
+                           across_quizzes=across_quizzes, elapsed=elapsed)
+
 @admin_bp.route('/admin/delete/<int:quiz_id>', methods=['POST'])
 @admin_required
 def delete_quiz(quiz_id):
     try:
         quiz = Quiz.query.get_or_404(quiz_id)
         title = quiz.title
+        quiz_store.delete_dependent_rows(quiz_id)
         db.session.delete(quiz)
         db.session.commit()
-        logger.info(f'Quiz "{title}" deleted by {current_user.username}')
+        quiz_cache.invalidate(quiz_id)
+        logger.info('Quiz "%s" deleted by %s', title, current_user.username)
         flash('Quiz deleted successfully', 'success')
         return jsonify({'success': True})
     except Exception as e:
         db.session.rollback()
-        logger.error(f'Error deleting quiz {quiz_id}: {str(e)}')
+        logger.error('Error deleting quiz %s: %s', quiz_id, e)
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@admin_bp.route('/admin/links/<int:quiz_id>', methods=['GET', 'POST'])
+@admin_required
+def quiz_links_page(quiz_id):
+    """Mint a batch of one-time links to a quiz and download them as CSV
+
+    Usernames one per line (or separated by commas); empty means every
+    active non-admin user. Admins never get links. Links are signed, not stored: a batch of any size is
+    one row in the DB.
+    """
+    quiz = Quiz.query.get_or_404(quiz_id)
+    if request.method == 'POST':
+        names = [name.strip() for name in request.form.get('usernames', '').replace(',', '\n').splitlines()]
+        names = [name for name in names if name]
+        try:
+            hours = int(request.form.get('hours') or current_app.config.get('QUIZ_LINK_TTL_HOURS', 72))
+        except ValueError:
+            hours = 0
+        if not 0 < hours <= 24 * 365:
+            flash('Срок действия должен быть от 1 часа до года', 'error')
+            return redirect(url_for('admin.quiz_links_page', quiz_id=quiz_id))
+
+        started = time.perf_counter()
+        recipients = quiz_links.resolve_users(names)
+        if not recipients:
+            flash('Пользователи не найдены', 'error')
+            return redirect(url_for('admin.quiz_links_page', quiz_id=quiz_id))
+        try:
+            batch, links = quiz_links.mint(quiz_id, recipients, hours, created_by=current_user.id)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error('Error minting links for quiz %s: %s', quiz_id, e)
+            flash('Не удалось создать ссылки', 'error')
+            return redirect(url_for('admin.quiz_links_page', quiz_id=quiz_id))
+        logger.info('Admin %s minted %s links to quiz %s (batch %s) in %.3fs', current_user.username,
+                    len(links), quiz_id, batch.id, time.perf_counter() - started)
+        missing = len(set(names)) - len(recipients) if names else 0
+        if missing:
+            logger.warning('Batch %s: %s usernames not found, inactive or admins', batch.id, missing)
+
+        base = url_for('quiz.open_link', token='', _external=True)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['username', 'url', 'expires_at'])
+        expires = batch.expires_at.strftime('%Y-%m-%d %H:%M')
+        writer.writerows((username, base + token, expires) for username, token in links)
+        return Response(buffer.getvalue(), mimetype='text/csv; charset=utf-8', headers={
+            'Content-Disposition': f'attachment; filename="quiz-{quiz_id}-links-{batch.id}.csv"',
+            'Cache-Control': 'no-store'
+        })
+
+    return render_template('admin/quiz_links.html', quiz=quiz, batches=quiz_links.batch_usage(quiz_id),
+                           default_hours=current_app.config.get('QUIZ_LINK_TTL_HOURS', 72), now=datetime.utcnow())
+
+@admin_bp.route('/admin/links/batch/<int:batch_id>/revoke', methods=['POST'])
+@admin_required
+def revoke_link_batch(batch_id):
+    batch = QuizLinkBatch.query.get_or_404(batch_id)
+    if batch.revoked_at is None:
+        batch.revoked_at = datetime.utcnow()
+        db.session.commit()
+        logger.info('Admin %s revoked link batch %s of quiz %s', current_user.username, batch_id, batch.quiz_id)
+    flash('Ссылки отозваны', 'success')
+    return redirect(url_for('admin.quiz_links_page', quiz_id=batch.quiz_id))
+
+@admin_bp.route('/admin/users')
+@admin_required
+def user_list():
+    """Users ordered by username, keyset-paginated, ?q= searches the start of the name"""
+    search_text = request.args.get('q', '').strip()
+    rows, next_after = users.fetch_page(search_text, after=request.args.get('after'))
+    total = users.count_users(search_text)
+    access_logger.info('Admin %s accessed user list', current_user.username)
+    return render_template('admin/users.html', users=rows, next_after=next_after, total=total, q=search_text)
+
+@admin_bp.route('/admin/users/import', methods=['POST'])
+@admin_required
+def import_users():
+    """Start a CSV import of users (username,password[,is_admin]); returns the job to poll"""
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return jsonify({'success': False, 'message': 'No file'}), 400
+    try:
+        rows, errors = users.parse_import(upload.stream)
+    except (UnicodeDecodeError, csv.Error) as e:
+        return jsonify({'success': False, 'message': f'Cannot read CSV: {e}'}), 400
+    job_id = users.start_job(current_app._get_current_object(), 'import', rows, errors)
+    logger.info('Admin %s started import of %s users (job %s)', current_user.username, len(rows), job_id)
+    return jsonify({'success': True, 'job_id': job_id,
+                    'status_url': url_for('admin.user_job_status', job_id=job_id)}), 202
+
+@admin_bp.route('/admin/users/bulk', methods=['POST'])
+@admin_required
+def bulk_users():
+    """Deactivate, activate or reset passwords of the selected users
+
+    (De)activation is one UPDATE; a reset hashes new passwords in a
+    background job whose passwords are downloaded once.
+    """
+    data = request.get_json(silent=True) or {}
+    action = data.get('action')
+    try:
+        user_ids = sorted({int(user_id) for user_id in data.get('user_ids') or []})
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid user ids'}), 400
+    if not user_ids:
+        return jsonify({'success': False, 'message': 'No users selected'}), 400
+
+    if action in ('deactivate', 'activate'):
+        changed = users.set_active(user_ids, action == 'activate', keep_id=current_user.id)
+        logger.info('Admin %s: %s %s users', current_user.username, action, changed)
+        return jsonify({'success': True, 'changed': changed})
+    if action == 'reset':
+        job_id = users.start_job(current_app._get_current_object(), 'reset', user_ids, current_user.id)
+        logger.info('Admin %s started password reset of %s users (job %s)', current_user.username,
+                    len(user_ids), job_id)
+        return jsonify({'success': True, 'job_id': job_id,
+                        'status_url': url_for('admin.user_job_status', job_id=job_id)}), 202
+    return jsonify({'success': False, 'message': f'Unknown action {action}'}), 400
+
+@admin_bp.route('/admin/users/jobs/<job_id>')
+@admin_required
+def user_job_status(job_id):
+    job = users.get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    if job.get('passwords'):
+        job['passwords_url'] = url_for('admin.user_job_passwords', job_id=job_id)
+    return jsonify(job)
+
+@admin_bp.route('/admin/users/jobs/<job_id>/passwords')
+@admin_required
+def user_job_passwords(job_id):
+    """CSV of the passwords a job generated; available for one download only"""
+    passwords = users.take_passwords(job_id)
+    if passwords is None:
+        abort(404)
+    logger.info('Admin %s downloaded %s passwords of job %s', current_user.username, len(passwords), job_id)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['username', 'password'])
+    writer.writerows(passwords)
+    return Response(buffer.getvalue(), mimetype='text/csv; charset=utf-8', headers={
+        'Content-Disposition': f'attachment; filename="passwords-{job_id[:8]}.csv"',
+        'Cache-Control': 'no-store'
+    })
+
+@admin_bp.route('/admin/regrade/<int:quiz_id>', methods=['POST'])
+@admin_required
+def regrade_quiz(quiz_id):
+    Quiz.query.get_or_404(quiz_id)
+    job_id = regrade.start_regrade(current_app._get_current_object(), quiz_id)
+    logger.info('Admin %s started regrade of quiz %s (job %s)', current_user.username, quiz_id, job_id)
+    return jsonify({'success': True, 'job_id': job_id,
+                    'status_url': url_for('admin.regrade_status', job_id=job_id)}), 202
+
+@admin_bp.route('/admin/regrade/jobs/<job_id>')
+@admin_required
+def regrade_status(job_id):
+    job = regrade.get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    return jsonify(job)
+
+@admin_bp.route('/admin/stats/<int:quiz_id>')
+@admin_required
+def quiz_stats(quiz_id):
+    analysis = item_stats.item_analysis(quiz_id)
+    if analysis is None:
+        abort(404)
+    access_logger.info('Admin %s accessed statistics of quiz %s', current_user.username, quiz_id)
+    return render_template('admin/quiz_stats.html', analysis=analysis)
+
+@admin_bp.route('/admin/stats/<int:quiz_id>/data')
+@admin_required
+def quiz_stats_data(quiz_id):
+    analysis = item_stats.item_analysis(quiz_id)
+    if analysis is None:
+        return jsonify({'success': False, 'message': 'Quiz not found'}), 404
+    return jsonify(analysis)
+
+@admin_bp.route('/admin/stats/<int:quiz_id>/rebuild', methods=['POST'])
+@admin_required
+def rebuild_quiz_stats(quiz_id):
+    try:
+        stats = item_stats.rebuild(quiz_id)
+        logger.info('Admin %s rebuilt statistics of quiz %s', current_user.username, quiz_id)
+        return jsonify({'success': True, **stats})
+    except LookupError as e:
+        return jsonify({'success': False, 'message': str(e)}), 404
+    except Exception as e:
+        logger.error('Error rebuilding statistics of quiz %s: %s', quiz_id, e)
         return jsonify({'success': False, 'message': str(e)}), 500
 
 @admin_bp.route('/admin/results')
 @admin_required
 def results_overview():
-    from sqlalchemy import text
-    query = text("""
-        SELECT qr.id, q.title, u.username, qr.score, qr.completed_at, qr.details
-        FROM quiz_result qr
-        inner join "user" u on qr.user_id = u.id
-        inner join quiz q on qr.quiz_id = q.id
-        order by qr.completed_at desc
-    """)
-    results = db.session.execute(query).fetchall()
+    filters = results_query.parse_filters(request.args)
+    results, next_cursor = results_query.fetch_page(filters)
+    total = results_query.count_results(filters)
+    quizzes = db.session.query(Quiz.id, Quiz.title).order_by(Quiz.title).all()
     
-    results_list = []
-    for row in results:
-        results_list.append({
-            'id': row[0],
-            'title': row[1],
-            'username': row[2],
-            'score': row[3],
-            'completed_at': row[4],
-            'details': row[5]  # JSON string, but not parsed here for overview
-        })
-    
-    logger.info(f'Admin {current_user.username} accessed test results overview')
-    return render_template('admin/results_overview.html', results=results_list)
+    access_logger.info('Admin %s accessed test results overview', current_user.username)
+    return render_template('admin/results_overview.html',
+                          results=results,
+                          next_cursor=next_cursor,
+                          total=total,
+                          filters=filters,
+                          quizzes=quizzes)
+
+@admin_bp.route('/admin/results/data')
+@admin_required
+def results_data():
+    """JSON pages of results for infinite scroll, keyset-paginated on (sort column, id)"""
+    filters = results_query.parse_filters(request.args)
+    results, next_cursor = results_query.fetch_page(
+        filters,
+        cursor=request.args.get('cursor'),
+        limit=request.args.get('limit', results_query.PAGE_SIZE, type=int)
+    )
+    return jsonify({'results': results, 'next_cursor': next_cursor})
+
+
+@admin_bp.route('/admin/results/export')
+@admin_required
+def export_results():
+    """Stream the filtered results as CSV (optionally gzipped) or XLSX
+
+    ?format=csv|xlsx, ?detail=questions (one row per answered question,
+    default) or summary, ?gzip=1 for CSV; filters as in the results list.
+    """
+    filters = results_query.parse_filters(request.args)
+    export_format = request.args.get('format', 'csv')
+    detail = request.args.get('detail', 'questions') != 'summary'
+    header = results_export.DETAIL_COLUMNS if detail else results_export.SUMMARY_COLUMNS
+    rows = results_export.iter_rows(filters, detail=detail)
+    filename = f'results-{datetime.now():%Y%m%d-%H%M}'
+
+    if export_format == 'xlsx':
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            return jsonify({'success': False, 'message': 'XLSX export needs openpyxl'}), 501
+        chunks = results_export.xlsx_chunks(header, rows)
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        filename += '.xlsx'
+    elif export_format == 'csv':
+        compress = request.args.get('gzip') == '1'
+        chunks = results_export.csv_chunks(header, rows, compress=compress)
+        mimetype = 'application/gzip' if compress else 'text/csv; charset=utf-8'
+        filename += '.csv.gz' if compress else '.csv'
+    else:
+        return jsonify({'success': False, 'message': f'Unknown format {export_format}'}), 400
 
+    logger.info('Admin %s exported results as %s (%s)', current_user.username, filename,
+                'questions' if detail else 'summary')
+    # stream_with_context держит контекст запроса (и сессию БД) открытым, пока идет выгрузка
+    return Response(stream_with_context(results_export.logged(chunks, filename)), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no'  # nginx не копит ответ целиком
+    })
 
 
 @admin_bp.route('/admin/results/<int:result_id>')
 @admin_required
 def quiz_result_details(result_id):
     result = QuizResult.query.get_or_404(result_id)
-    quiz = Quiz.query.get_or_404(result.quiz_id)
+    quiz = quiz_cache.get_compiled_quiz(result.quiz_id)
+    if quiz is None:
+        abort(404)
     user = User.query.get_or_404(result.user_id)
     
     try:
         raw_details = result.details or '{}'  # Fallback на пустой объект
-        data = json.loads(raw_details)
-        
-        # Извлекаем список деталей: если dict — берем .get('results'), если list — как есть
-        if isinstance(data, dict):
-            quiz_results = data.get('results', [])
-        elif isinstance(data, list):
-            quiz_results = data
-        else:
-            quiz_results = []
-        
-        logger.info(f'Result {result_id}: Loaded {len(quiz_results)} details items from raw: {raw_details[:100]}...')
+        _, quiz_results = result_details.parse_details(raw_details)
+        logger.debug('Result %s: Loaded %s details items from raw: %s...', result_id, len(quiz_results), raw_details[:100])
     except (json.JSONDecodeError, TypeError) as e:
-        logger.error(f'Invalid JSON in result {result_id} details: {str(e)}, raw: {result.details[:200]}')
+        logger.error('Invalid JSON in result %s details: %s, raw: %s', result_id, e, result.details[:200])
         quiz_results = []
         flash(f'Invalid result data for ID {result_id}. Check logs for details.', 'error')
     
-    detailed_results = []
-    for idx, dr in enumerate(quiz_results):
-        if not isinstance(dr, dict):
-            logger.warning(f'Result {result_id}: Item {idx} is not dict: {type(dr)}')
-            continue
-        
-        try:
-            q_id = int(dr.get('question_id', 0))
-            if q_id == 0:
-                logger.warning(f'Result {result_id}: Invalid question_id in item {idx}: {dr.get("question_id")}')
-                continue
-            
-            question = Question.query.get_or_404(q_id)
-            
-            # Безопасное приведение ID к int для user_answers и correct_answers
-            user_ans_ids = [int(a_id) for a_id in dr.get('user_answers', []) if str(a_id).strip().isdigit()]
-            user_ans_texts = []
-            for a_id in user_ans_ids:
-                answer = Answer.query.get(a_id)
-                if answer:
-                    user_ans_texts.append(answer.text)
-                else:
-                    logger.warning(f'Result {result_id}: Missing answer ID {a_id} for user_answers in item {idx}')
-            
-            correct_ans_ids = [int(a_id) for a_id in dr.get('correct_answers', []) if str(a_id).strip().isdigit()]
-            correct_ans_texts = []
-            for a_id in correct_ans_ids:
-                answer = Answer.query.get(a_id)
-                if answer:
-                    correct_ans_texts.append(answer.text)
-                else:
-                    logger.warning(f'Result {result_id}: Missing answer ID {a_id} for correct_answers in item {idx}')
-            
-            detailed_results.append({
-                'question_text': question.text,
-                'is_correct': dr.get('is_correct', False),
-                'user_answers_text': user_ans_texts,
-                'correct_answers_text': correct_ans_texts
-            })
-            logger.debug(f'Result {result_id}: Processed item {idx} for q_id {q_id}, correct: {dr.get("is_correct")}')
-        except Exception as e:
-            logger.error(f'Error processing detail {idx} in result {result_id}: {str(e)}, item: {dr}')
-            continue
+    def on_missing(kind, value, idx):
+        logger.warning('Result %s: Missing %s %s in item %s', result_id, kind, value, idx)
+    
+    # Все вопросы и ответы загружаются пачкой (кэш квиза + IN-запросы), без запроса на каждый элемент
+    detailed_results = result_details.resolve_items(result.quiz_id, quiz_results, on_missing=on_missing)
     
-    logger.info(f'Admin {current_user.username} accessed details for result {result_id} - {len(detailed_results)} processed items')
+    access_logger.info('Admin %s accessed details for result %s - %s processed items', current_user.username, result_id, len(detailed_results))
     
     if not detailed_results:
         flash('No valid question details found for this result. The test may have no questions or data is corrupted.', 'warning')
@@ -275,3 +538,33 @@ def quiz_result_details(result_id):
                           user=user, 
                           result=result, 
                           quiz_results=detailed_results)
+
+@admin_bp.route('/admin/metrics')
+@admin_required
+def metrics_page():
+    if not metrics.is_enabled():
+        flash('Метрики выключены (METRICS_ENABLED=1)', 'error')
+        return redirect(url_for('admin.dashboard'))
+    return render_template('admin/metrics.html', data=metrics.snapshot())
+
+@admin_bp.route('/admin/metrics/reset', methods=['POST'])
+@admin_required
+def reset_metrics():
+    metrics.reset()
+    logger.info('Admin %s reset request metrics', current_user.username)
+    return jsonify({'success': True})
+
+@admin_bp.route('/metrics')
+def prometheus_metrics():
+    """Prometheus text endpoint: for admins or with Authorization: Bearer <METRICS_TOKEN>"""
+    if not metrics.is_enabled():
+        abort(404)
+    token = current_app.config.get('METRICS_TOKEN')
+    authorized = current_user.is_authenticated and current_user.is_admin
+    if not authorized and token:
+        # Байты, а не str: compare_digest падает на не-ASCII строках из заголовка
+        authorized = hmac.compare_digest(request.headers.get('Authorization', '').encode(),
+                                         f'Bearer {token}'.encode())
+    if not authorized:
+        abort(403)
+    return Response(metrics.prometheus_text(), mimetype='text/plain; version=0.0.4')
@@ -19,7 +19,7 @@ def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if not current_user.is_authenticated or not current_user.is_admin:
-            logger.warning(f'Unauthorized access attempt by {current_user.username if current_user.is_authenticated else "anonymous"} to admin route')
+            logger.warning('Unauthorized access attempt by %s to admin route', current_user.username if current_user.is_authenticated else "anonymous")
             flash('Access denied. Admin privileges required.', 'error')
             return redirect(url_for('auth.login'))
         return f(*args, **kwargs)
@@ -28,7 +28,7 @@ def admin_required(f):
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
-        logger.info(f'User {current_user.username} already logged in, redirecting to quiz list')
+        logger.info('User %s already logged in, redirecting to quiz list', current_user.username)
         return redirect(url_for('quiz.list_quizzes'))
     
     if request.method == 'POST':
@@ -38,12 +38,16 @@ def login():
         user = User.query.filter_by(username=username).first()
         
         if user and user.check_password(password):
+            if not user.is_active:
+                logger.warning('Login attempt by deactivated user %s', username)
+                flash('Account is deactivated', 'error')
+                return render_template('auth/login.html')
             login_user(user)
-            logger.info(f'User {username} logged in successfully')
+            logger.info('User %s logged in successfully', username)
             next_page = request.args.get('next') or url_for('quiz.list_quizzes')
             return redirect(next_page)
         else:
-            logger.warning(f'Failed login attempt for username: {username}')
+            logger.warning('Failed login attempt for username: %s', username)
             flash('Invalid username or password', 'error')
     
     return render_template('auth/login.html')
@@ -67,7 +71,7 @@ def register():
         db.session.add(user)
         db.session.commit()
         
-        logger.info(f'New user registered: {username} (Admin: {is_admin})')
+        logger.info('New user registered: %s (Admin: %s)', username, is_admin)
         flash('Registration successful! Please login.', 'success')
         return redirect(url_for('auth.login'))
     
@@ -76,7 +80,7 @@ def register():
 @auth_bp.route('/logout')
 @login_required
 def logout():
-    logger.info(f'User {current_user.username} logged out')
+    logger.info('User %s logged out', current_user.username)
     logout_user()
     flash('You have been logged out', 'success')
     return redirect(url_for('auth.login'))
\ No newline at end of file
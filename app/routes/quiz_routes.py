@@ -1,134 +1,290 @@
-from flask import Blueprint, render_template, request, jsonify, session
-from flask_login import login_required, current_user
-from app import db, logger
-from app.models import Quiz, Question, Answer, QuizResult
-from datetime import datetime
+from flask import Blueprint, render_template, request, jsonify, abort, flash, redirect, url_for, current_app
+from flask_login import login_required, current_user, login_user
+from app import db, logger, access_logger
+from app.models import Quiz, QuizAttempt
+from app import quiz_cache, grading, result_details, submission_queue, http_cache, attempts, variants, quiz_links, user_cache, results_query
 import json
 
 quiz_bp = Blueprint('quiz', __name__, template_folder='../../templates/quiz')
 
+PAYLOAD_MAX_AGE = 86400  # for ?v=<content hash> URLs
+
 @quiz_bp.route('/')
 @login_required
 def list_quizzes():
     #Quiz.query.all()
     #quizzes = Quiz.query.filter_by(is_active=True).order_by(Quiz.created_at.desc()).all()
-    quizzes = Quiz.query.all()
-    logger.info(f'User {current_user.username} accessed quiz list')
-    return render_template('quiz/list.html', quizzes=quizzes)
+    # Таблица квизов рендерится один раз на версию таблицы и переиспользуется
+    quiz_table, table_hash = http_cache.render_fragment(
+        'quiz/_quiz_table.html', lambda: {'quizzes': Quiz.query.all()})
+    etag = http_cache.page_etag('list', table_hash)
+    if http_cache.is_fresh(etag):
+        return http_cache.not_modified(etag)
+    access_logger.info('User %s accessed quiz list', current_user.username)
+    return http_cache.cached_response(render_template('quiz/list.html', quiz_table=quiz_table), etag)
 
 @quiz_bp.route('/<int:quiz_id>/take')
 @login_required
 def take_quiz(quiz_id):
-    quiz = Quiz.query.get_or_404(quiz_id)
-    questions = Question.query.filter_by(quiz_id=quiz_id).order_by(Question.order).all()
+    # Вопросы и ответы берутся из скомпилированного кэша (один запрос на промах)
+    quiz = quiz_cache.get_compiled_quiz(quiz_id)
+    if quiz is None:
+        abort(404)
     
-    questions_data = []
-    for q in questions:
-        answers = Answer.query.filter_by(question_id=q.id).order_by(Answer.order).all()
-        questions_data.append({
-            'id': q.id,
-            'text': q.text,
-            'answers': [{'id': a.id, 'text': a.text} for a in answers]
-        })
+    etag = http_cache.page_etag('take', quiz.content_hash)
+    if http_cache.is_fresh(etag):
+        return http_cache.not_modified(etag)
+    access_logger.info('User %s started quiz %s', current_user.username, quiz_id)
+    # Вопросы квиза с пулом приходят вместе с попыткой: страница не зависит от размера банка
+    questions = [] if quiz.is_pooled else quiz.payload()
+    return http_cache.cached_response(render_template('quiz/take.html', quiz=quiz, questions=questions), etag)
+
+@quiz_bp.route('/link/<token>')
+def open_link(token):
+    """One-time quiz link: log the user in and open the quiz
+
+    The signature and expiry are checked without the DB; the only write is
+    the (batch, user) row in the used-link set.
+    """
+    try:
+        link = quiz_links.verify(token)
+    except quiz_links.InvalidLink as e:
+        logger.warning('Rejected quiz link: %s', e)
+        flash('Ссылка недействительна или срок ее действия истек', 'error')
+        return redirect(url_for('auth.login'))
+
+    if not quiz_links.redeem(link):
+        db.session.rollback()
+        # Повторный переход владельца ссылки, который уже вошел, не ошибка
+        if current_user.is_authenticated and current_user.id == link.user_id:
+            return redirect(url_for('quiz.take_quiz', quiz_id=link.quiz_id))
+        logger.warning('Quiz link of batch %s for user %s reused or revoked', link.batch_id, link.user_id)
+        flash('Ссылка уже использована или отозвана', 'error')
+        return redirect(url_for('auth.login'))
+
+    principal = user_cache.load_principal(link.user_id)
+    if principal is None or principal.is_admin:
+        # Ссылка входит без пароля: администратор так войти не может, даже со ссылкой из старой партии
+        db.session.rollback()
+        flash('Ссылка недействительна', 'error')
+        return redirect(url_for('auth.login'))
+    db.session.commit()
+    login_user(principal)
+    logger.info('User %s opened quiz %s by link of batch %s', principal.username, link.quiz_id, link.batch_id)
+    return redirect(url_for('quiz.take_quiz', quiz_id=link.quiz_id))
+
+@quiz_bp.route('/<int:quiz_id>/payload')
+@login_required
+def quiz_payload(quiz_id):
+    """Questions and answers of a quiz without the correct flags
+
+    The ETag is the quiz content hash. A request with ?v=<content hash> gets
+    a long-lived immutable response: the URL changes with the content.
+    """
+    quiz = quiz_cache.get_compiled_quiz(quiz_id)
+    if quiz is None:
+        return jsonify({'success': False, 'message': 'Quiz not found'}), 404
     
-    logger.info(f'User {current_user.username} started quiz {quiz_id}')
-    return render_template('quiz/take.html', quiz=quiz, questions=questions_data)
+    etag = quiz.content_hash
+    immutable = request.args.get('v') == etag
+    if request.if_none_match.contains(etag):
+        return http_cache.cached_response('', etag, max_age=PAYLOAD_MAX_AGE, immutable=immutable)
+    return http_cache.cached_response(jsonify({
+        'id': quiz.id,
+        'title': quiz.title,
+        'description': quiz.description,
+        'version': etag,
+        'draw_count': quiz.draw_count,
+        'questions': [] if quiz.is_pooled else quiz.payload()
+    }), etag, max_age=PAYLOAD_MAX_AGE, immutable=immutable)
+
+def _store_submission(quiz_id, full_results, attempt_id=None):
+    """Save a graded submission and return its queue token (None if written directly)"""
+    score = grading.score(full_results)
+    queue = submission_queue.get_queue(current_app)
+    if queue is not None:
+        # Закрытие попытки фиксируется до записи фоновым потоком, иначе он ждет блокировку SQLite
+        db.session.commit()
+        try:
+            # Запись в БД выполняет фоновый поток пачками (group commit)
+            return queue.submit(current_user.id, quiz_id, score, full_results, attempt_id=attempt_id).token
+        except submission_queue.QueueFull:
+            pass
+    pending = submission_queue.make_pending(current_user.id, quiz_id, score, full_results, attempt_id=attempt_id)
+    submission_queue.store_results([pending])
+    db.session.commit()
+    return None
+
 
 @quiz_bp.route('/<int:quiz_id>/submit', methods=['POST'])
 @login_required
 def submit_quiz(quiz_id):
     try:
-        user_answers = request.get_json()
+        user_answers = request.get_json(silent=True)
         
-        # Get correct answers
-        correct_answers = db.session.query(Question.id, Answer.id)\
-            .join(Answer, Question.id == Answer.question_id)\
-            .filter(Question.quiz_id == quiz_id, Answer.is_correct == True)\
-            .all()
+        # Ключ ответов строится один раз на версию квиза и хранится в памяти
+        key = grading.get_answer_key(quiz_id)
+        if key is None:
+            return jsonify({'success': False, 'message': 'Quiz not found'}), 404
+        if quiz_cache.get_compiled_quiz(quiz_id).is_pooled:
+            # Вариант квиза с пулом известен только попытке
+            return jsonify({'success': False, 'message': 'This quiz is submitted through an attempt'}), 400
         
-        correct_dict = {}
-        for q_id, a_id in correct_answers:
-            if q_id not in correct_dict:
-                correct_dict[q_id] = []
-            correct_dict[q_id].append(a_id)
+        try:
+            full_results = grading.grade(key, user_answers)
+        except (AttributeError, TypeError, ValueError) as e:
+            return jsonify({'success': False, 'message': f'Invalid answers: {e}'}), 400
+        token = _store_submission(quiz_id, full_results)
         
-        # Check answers
-        results = []
-        total = len(correct_dict)
-        correct = 0
+        access_logger.info('User %s completed quiz %s with score %s/%s', current_user.username, quiz_id,
+                           full_results['correct_count'], full_results['total_questions'])
+        
+        return jsonify(dict(full_results, result_token=token))  # Возвращаем то же для frontend
+    except Exception as e:
+        logger.error('Error submitting quiz %s for user %s: %s', quiz_id, current_user.username, e)
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+def _own_attempt(attempt_id):
+    """Open attempt of the current user, or None"""
+    owner = attempts.get_buffer(current_app).owner(attempt_id)
+    if owner is None or owner.user_id != current_user.id:
+        return None
+    return owner
+
+
+def _record_answers(buffer, owner, compiled, answers):
+    """Buffer {question_id: [answer_id, ...]} for questions served in the attempt"""
+    question_ids = owner.question_ids if owner.question_ids is not None else compiled.questions_by_id
+    for question_id, answer_ids in answers.items():
+        question_id = int(question_id)
+        if question_id not in question_ids:
+            raise ValueError(f'Question {question_id} was not served in this attempt')
+        buffer.record(owner.attempt_id, question_id, attempts.normalize_answer_ids(answer_ids))
+
+
+@quiz_bp.route('/<int:quiz_id>/attempt', methods=['POST'])
+@login_required
+def start_attempt(quiz_id):
+    """Start an attempt or resume the open one, with the answers saved so far
+
+    For a pooled quiz the response carries the attempt's variant: its drawn
+    questions with the answers in the attempt's order.
+    """
+    quiz = quiz_cache.get_compiled_quiz(quiz_id)
+    if quiz is None:
+        return jsonify({'success': False, 'message': 'Quiz not found'}), 404
+    
+    buffer = attempts.get_buffer(current_app)
+    attempt = attempts.start_attempt(current_user.id, quiz)
+    question_ids = variants.decode(attempt.variant)
+    buffer.remember(attempt.id, current_user.id, quiz_id, question_ids)
+    data = {
+        'success': True,
+        'attempt_id': attempt.id,
+        'started_at': attempt.started_at.isoformat(),
+        'answers': attempts.load_answers(buffer, attempt)
+    }
+    if question_ids is not None:
+        data['questions'] = quiz.payload(variants.questions(quiz, attempt.seed, question_ids))
+    return jsonify(data)
+
+
+@quiz_bp.route('/attempts/<int:attempt_id>/answer', methods=['POST'])
+@login_required
+def autosave_answer(attempt_id):
+    """Autosave the selection of one question; written to the DB in batches"""
+    owner = _own_attempt(attempt_id)
+    if owner is None:
+        return jsonify({'success': False, 'message': 'Attempt not found'}), 404
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        _record_answers(attempts.get_buffer(current_app), owner, quiz_cache.get_compiled_quiz(owner.quiz_id),
+                        {data['question_id']: data.get('answer_ids')})
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'success': False, 'message': f'Invalid answer: {e}'}), 400
+    return jsonify({'success': True})
+
+
+@quiz_bp.route('/attempts/<int:attempt_id>/submit', methods=['POST'])
+@login_required
+def submit_attempt(attempt_id):
+    """Grade an attempt from its stored answers and close it"""
+    owner = _own_attempt(attempt_id)
+    if owner is None:
+        return jsonify({'success': False, 'message': 'Attempt not found'}), 404
+    
+    buffer = attempts.get_buffer(current_app)
+    quiz_id = owner.quiz_id
+    try:
+        key = grading.get_answer_key(quiz_id)
+        if key is None:
+            return jsonify({'success': False, 'message': 'Quiz not found'}), 404
+        if owner.question_ids is not None:
+            # Оцениваются только вопросы выданного варианта
+            key = grading.variant_key(key, variants.decode(db.session.get(QuizAttempt, attempt_id).variant))
         
-        for q_id, user_a_ids in user_answers.items():
-            q_id = int(q_id)
-            user_a_ids = [int(a_id) for a_id in user_a_ids]
-            
-            correct_a_ids = correct_dict.get(q_id, [])
-            is_correct = set(user_a_ids) == set(correct_a_ids)
-            
-            if is_correct:
-                correct += 1
-            
-            results.append({
-                'question_id': q_id,
-                'is_correct': is_correct,
-                'user_answers': user_a_ids,
-                'correct_answers': correct_a_ids
-            })
+        # Клиент досылает ответы, автосохранение которых могло не успеть
+        data = request.get_json(silent=True) or {}
+        try:
+            _record_answers(buffer, owner, quiz_cache.get_compiled_quiz(quiz_id), data.get('answers') or {})
+        except (AttributeError, TypeError, ValueError) as e:
+            return jsonify({'success': False, 'message': f'Invalid answer: {e}'}), 400
+        # Ждет и сброс, идущий в фоне: после него все ответы попытки уже в БД
+        buffer.flush(attempt_id)
         
-        # Save result — ИСПРАВЛЕНО: сохраняем полный dict, а не только list
-        full_results = {
-            'total_questions': total,
-            'correct_count': correct,
-            'incorrect_count': total - correct,
-            'results': results  # list of {'question_id': ..., 'is_correct': ..., 'user_answers': [...], 'correct_answers': [...]}
-        }
-        result = QuizResult(
-            user_id=current_user.id,
-            quiz_id=quiz_id,
-            score=correct / total * 100 if total > 0 else 0,
-            details=json.dumps(full_results, ensure_ascii=False)
-        )
-        db.session.add(result)
-        db.session.commit()
+        # populate_existing: попытка могла быть загружена выше, ответы нужны из БД
+        attempt = db.session.get(QuizAttempt, attempt_id, populate_existing=True)
+        user_answers = json.loads(attempt.answers or '{}')
+        if not attempts.claim_attempt(buffer, attempt_id):
+            db.session.rollback()
+            return jsonify({'success': False, 'message': 'Attempt already submitted'}), 409
         
-        logger.info(f'User {current_user.username} completed quiz {quiz_id} with score {correct}/{total}')
+        full_results = grading.grade(key, user_answers)
+        try:
+            token = _store_submission(quiz_id, full_results, attempt_id=attempt_id)
+        except Exception:
+            db.session.rollback()
+            attempts.reopen_attempt(attempt_id)
+            db.session.commit()
+            raise
         
-        return jsonify(full_results)  # Возвращаем то же для frontend
+        access_logger.info('User %s completed quiz %s with score %s/%s', current_user.username, quiz_id,
+                           full_results['correct_count'], full_results['total_questions'])
+        return jsonify(dict(full_results, result_token=token, quiz_id=quiz_id))
     except Exception as e:
-        logger.error(f'Error submitting quiz {quiz_id} for user {current_user.username}: {str(e)}')
+        db.session.rollback()
+        logger.error('Error submitting attempt %s for user %s: %s', attempt_id, current_user.username, e)
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
 @quiz_bp.route('/<int:quiz_id>/result')
 @login_required
 def quiz_result(quiz_id):
-    result = QuizResult.query.filter_by(quiz_id=quiz_id, user_id=current_user.id).order_by(QuizResult.completed_at.desc()).first()
+    result = results_query.latest_result(current_user.id, quiz_id)
+    queue = submission_queue.get_queue(current_app)
+    if queue is not None:
+        # Результат из очереди еще может быть не записан в БД
+        pending = queue.get_pending(current_user.id, quiz_id, token=request.args.get('token'))
+        if pending and pending.quiz_id == quiz_id and (result is None or pending.completed_at >= result.completed_at):
+            result = pending
     if not result:
-        logger.warning(f'No result found for quiz {quiz_id} and user {current_user.username}')
+        logger.warning('No result found for quiz %s and user %s', quiz_id, current_user.username)
         flash('No result found for this quiz', 'error')
         return redirect(url_for('quiz.list_quizzes'))
     
-    quiz_results = json.loads(result.details)  # Теперь dict: {'total_questions': ..., 'results': [...]}
-    
-    # Загружаем вопросы и ответы для сопоставления ID с текстами
-    questions = Question.query.filter_by(quiz_id=quiz_id).order_by(Question.order).all()
-    all_answers = Answer.query.filter(Answer.question_id.in_([q.id for q in questions])).all()
-    answers_dict = {}  # {question_id: {answer_id: text}}
-    for a in all_answers:
-        if a.question_id not in answers_dict:
-            answers_dict[a.question_id] = {}
-        answers_dict[a.question_id][a.id] = a.text
+    quiz_results, items = result_details.parse_details(result.details)  # dict: {'total_questions': ..., 'results': [...]}
+    if not isinstance(quiz_results, dict):
+        # Старый формат: только список результатов
+        correct = sum(1 for item in items if isinstance(item, dict) and item.get('is_correct'))
+        quiz_results = {'total_questions': len(items), 'correct_count': correct, 'incorrect_count': len(items) - correct}
     
-    # Обогащаем results (список внутри dict)
-    for detail in quiz_results['results']:
-        q_id = detail['question_id']
-        question = next((q for q in questions if q.id == q_id), None)
-        if question:
-            detail['question_text'] = question.text
-            detail['user_answers_text'] = [answers_dict.get(q_id, {}).get(a_id, f'Unknown ({a_id})') for a_id in detail['user_answers']]
-            detail['correct_answers_text'] = [answers_dict.get(q_id, {}).get(a_id, f'Unknown ({a_id})') for a_id in detail['correct_answers']]
+    # Тексты вопросов и ответов берутся из кэша квиза, недостающие id — одним IN-запросом
+    quiz_results['results'] = result_details.resolve_items(quiz_id, items)
     
-    logger.info(f'User {current_user.username} viewed result for quiz {quiz_id}')
+    access_logger.info('User %s viewed result for quiz %s', current_user.username, quiz_id)
     return render_template('quiz/result.html', 
-                          quiz=Quiz.query.get(quiz_id), 
+                          quiz=quiz_cache.get_compiled_quiz(quiz_id) or result.quiz, 
                           result=result, 
                           quiz_results=quiz_results)  # Передаем dict напрямую
\ No newline at end of file
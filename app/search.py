@@ -0,0 +1,318 @@
+import re
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+from markupsafe import escape
+from sqlalchemy import event, text
+
+from app import db, logger
+
+# Одна строка индекса на вопрос: rowid = question.id, ответы склеены в одну колонку.
+# Триггеры поддерживают индекс при любой записи. Массовая вставка (quiz_store.insert_questions)
+# выключает триггеры вставки флагом search_state.deferred внутри своей транзакции и
+# индексирует новые вопросы одним INSERT ... SELECT: одна запись FTS на вопрос вместо пяти
+_DEFERRED = "(SELECT deferred FROM search_state WHERE id = 1) = 0"
+_ANSWERS_OF = "(SELECT group_concat(text, ' ') FROM answer WHERE question_id = {})"
+
+_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS question_fts USING fts5("
+    "question, answers, tokenize = 'unicode61 remove_diacritics 2')",
+    # Текст вопроса весит вдвое больше текста ответов
+    "INSERT INTO question_fts(question_fts, rank) VALUES ('rank', 'bm25(2.0, 1.0)')",
+    "CREATE TABLE IF NOT EXISTS search_state (id INTEGER PRIMARY KEY CHECK (id = 1), deferred INTEGER NOT NULL)",
+    "INSERT OR IGNORE INTO search_state (id, deferred) VALUES (1, 0)",
+    "CREATE INDEX IF NOT EXISTS ix_answer_question_id ON answer (question_id)",
+    f"CREATE TRIGGER IF NOT EXISTS question_fts_ai AFTER INSERT ON question WHEN {_DEFERRED} BEGIN "
+    f"INSERT INTO question_fts(rowid, question, answers) VALUES (new.id, new.text, {_ANSWERS_OF.format('new.id')}); END",
+    "CREATE TRIGGER IF NOT EXISTS question_fts_au AFTER UPDATE OF text ON question BEGIN "
+    "UPDATE question_fts SET question = new.text WHERE rowid = new.id; END",
+    "CREATE TRIGGER IF NOT EXISTS question_fts_ad AFTER DELETE ON question BEGIN "
+    "DELETE FROM question_fts WHERE rowid = old.id; END",
+    f"CREATE TRIGGER IF NOT EXISTS answer_fts_ai AFTER INSERT ON answer WHEN {_DEFERRED} BEGIN "
+    f"UPDATE question_fts SET answers = {_ANSWERS_OF.format('new.question_id')} WHERE rowid = new.question_id; END",
+    "CREATE TRIGGER IF NOT EXISTS answer_fts_au AFTER UPDATE OF text, question_id ON answer BEGIN "
+    f"UPDATE question_fts SET answers = {_ANSWERS_OF.format('old.question_id')} WHERE rowid = old.question_id; "
+    f"UPDATE question_fts SET answers = {_ANSWERS_OF.format('new.question_id')} WHERE rowid = new.question_id; END",
+    "CREATE TRIGGER IF NOT EXISTS answer_fts_ad AFTER DELETE ON answer BEGIN "
+    f"UPDATE question_fts SET answers = {_ANSWERS_OF.format('old.question_id')} WHERE rowid = old.question_id; END",
+)
+
+_INDEX_QUESTIONS = (
+    "INSERT OR REPLACE INTO question_fts(rowid, question, answers) "
+    "SELECT q.id, q.text, group_concat(a.text, ' ') FROM question q "
+    "LEFT JOIN answer a ON a.question_id = q.id WHERE q.id BETWEEN :first AND :last GROUP BY q.id"
+)
+
+_REBUILD = (
+    "DELETE FROM question_fts",
+    "INSERT INTO question_fts(rowid, question, answers) "
+    "SELECT q.id, q.text, group_concat(a.text, ' ') FROM question q "
+    "LEFT JOIN answer a ON a.question_id = q.id GROUP BY q.id",
+    "INSERT INTO question_fts(question_fts) VALUES ('optimize')",
+)
+
+# position — номер вопроса в редакторе (/admin/edit/<quiz>/question/<position>)
+_SEARCH = text(
+    "SELECT q.id, q.quiz_id, quiz.title, q.\"order\", "
+    "snippet(question_fts, 0, char(2), char(3), '…', 16) AS question_snippet, "
+    "snippet(question_fts, 1, char(2), char(3), '…', 10) AS answers_snippet, rank "
+    "FROM question_fts JOIN question q ON q.id = question_fts.rowid JOIN quiz ON quiz.id = q.quiz_id "
+    "WHERE question_fts MATCH :query ORDER BY rank LIMIT :limit"
+)
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+SIGNATURE_CHUNK = 2000  # questions per vectorized MinHash step
+
+
+def is_available(connection):
+    return connection.dialect.name == 'sqlite'
+
+
+def ensure_index(connection):
+    """Create the FTS table and its triggers if missing, filling it from existing questions
+
+    Returns True if the index was created. Idempotent: run by migration
+    0002 and after create_all.
+    """
+    if not is_available(connection):
+        return False
+    names = {row[0] for row in connection.execute(text(
+        "SELECT name FROM sqlite_master WHERE name IN ('question', 'answer', 'question_fts')"))}
+    if 'question_fts' in names or not {'question', 'answer'} <= names:
+        return False
+    started = time.perf_counter()
+    for statement in _DDL + _REBUILD:
+        connection.execute(text(statement))
+    logger.info('Search index created in %.2fs', time.perf_counter() - started)
+    return True
+
+
+_indexed = set()  # engine URLs known to have the index
+
+
+def has_index():
+    url = str(db.engine.url)
+    if url not in _indexed and db.engine.dialect.name == 'sqlite' and db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'search_state'")).first():
+        _indexed.add(url)
+    return url in _indexed
+
+
+@contextmanager
+def deferred():
+    """Switch off the insert triggers for a bulk insert in the caller's transaction
+
+    The flag is part of the transaction, so other connections never see it.
+    The caller must pass the new question ids to index_questions() before
+    committing.
+    """
+    if not has_index():
+        yield
+        return
+    db.session.execute(text("UPDATE search_state SET deferred = 1 WHERE id = 1"))
+    try:
+        yield
+    finally:
+        db.session.execute(text("UPDATE search_state SET deferred = 0 WHERE id = 1"))
+
+
+def index_questions(question_ids):
+    """Index questions inserted under deferred(), one statement per id range"""
+    if not question_ids or not has_index():
+        return
+    # id из INSERT ... RETURNING идут подряд, диапазон покрывает их одним запросом
+    ids = sorted(question_ids)
+    first = ids[0]
+    for prev, current in zip(ids, ids[1:] + [None]):
+        if current is None or current != prev + 1:
+            db.session.execute(text(_INDEX_QUESTIONS), {'first': first, 'last': prev})
+            first = current
+
+
+def rebuild_index():
+    """Refill the index from the question and answer tables (caller commits)"""
+    for statement in _REBUILD:
+        db.session.execute(text(statement))
+
+
+def match_query(query):
+    """FTS5 query for free text: every word must match, the last one as a prefix
+
+    Words are quoted, so FTS5 operators and punctuation in the input
+    (pg_hba.conf, "AND", -r) are searched as plain words.
+    """
+    words = _WORD.findall(query.lower())
+    if not words:
+        return None
+    return ' '.join(f'"{w}"' for w in words[:-1]) + f' "{words[-1]}"*'
+
+
+def _highlight(snippet):
+    if not snippet:
+        return ''
+    return str(escape(snippet)).replace('\x02', '<mark>').replace('\x03', '</mark>')
+
+
+def search(query, limit=20):
+    """Ranked questions matching query, best first
+
+    Returns [{'question_id', 'quiz_id', 'quiz_title', 'order', 'question', 'answers', 'score'}],
+    question/answers are escaped HTML snippets with the matches in <mark>.
+    """
+    match = match_query(query)
+    if match is None:
+        return []
+    rows = db.session.execute(_SEARCH, {'query': match, 'limit': limit}).all()
+    return [{
+        'question_id': row[0],
+        'quiz_id': row[1],
+        'quiz_title': row[2],
+        'order': row[3],
+        'question': _highlight(row[4]),
+        'answers': _highlight(row[5]),
+        'score': round(-row[6], 3)
+    } for row in rows]
+
+
+def _shingles(question, answers):
+    """32-bit hashes of the word bigrams (single words for one-word texts)"""
+    words = _WORD.findall(f'{question} {answers or ""}'.lower())
+    if len(words) < 2:
+        return {hash(w) & 0xFFFFFFFF for w in words}
+    return {hash(pair) & 0xFFFFFFFF for pair in zip(words, words[1:])}
+
+
+class _DisjointSet:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        parent = self.parent.setdefault(x, x)
+        if parent != x:
+            parent = self.parent[x] = self.find(parent)
+        return parent
+
+    def union(self, a, b):
+        self.parent[self.find(a)] = self.find(b)
+
+
+def find_near_duplicates(threshold=0.8, across_quizzes=True, num_hashes=64, bands=16, seed=1):
+    """Groups of questions whose text and answers are nearly identical
+
+    MinHash signatures of word-bigram sets are bucketed by LSH bands, so
+    only questions sharing a band are compared; a candidate is kept if the
+    exact Jaccard similarity of the sets is >= threshold. With
+    across_quizzes only questions of different quizzes are grouped (the
+    same bank imported twice). Returns [{'similarity', 'questions': [...]}].
+    """
+    rows = db.session.execute(text(
+        "SELECT q.id, q.quiz_id, quiz.title, q.\"order\", f.question, f.answers "
+        "FROM question_fts f JOIN question q ON q.id = f.rowid JOIN quiz ON quiz.id = q.quiz_id"
+    )).all()
+    if not rows:
+        return []
+
+    rng = np.random.default_rng(seed)
+    prime = np.uint64((1 << 32) + 15)
+    a = rng.integers(1, 1 << 31, num_hashes, dtype=np.uint64)
+    b = rng.integers(0, 1 << 31, num_hashes, dtype=np.uint64)
+    per_band = num_hashes // bands
+
+    sets = {}
+    for row in rows:
+        shingles = _shingles(row[4], row[5])
+        if shingles:
+            sets[row[0]] = shingles
+
+    buckets = defaultdict(list)  # {(band, signature bytes): [question_id, ...]}
+    ids = list(sets)
+    for start in range(0, len(ids), SIGNATURE_CHUNK):
+        # Подписи пачки вопросов одним вычислением: минимум по отрезкам склеенного массива шинглов
+        chunk = ids[start:start + SIGNATURE_CHUNK]
+        lengths = np.fromiter((len(sets[q_id]) for q_id in chunk), dtype=np.int64, count=len(chunk))
+        values = np.fromiter((h for q_id in chunk for h in sets[q_id]), dtype=np.uint64, count=int(lengths.sum()))
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        signatures = np.minimum.reduceat((a[:, None] * values[None, :] + b[:, None]) % prime, offsets, axis=1).T
+        for q_id, signature in zip(chunk, signatures):
+            for band in range(bands):
+                buckets[(band, signature[band * per_band:(band + 1) * per_band].tobytes())].append(q_id)
+
+    info = {row[0]: row for row in rows}
+    groups = _DisjointSet()
+    similarity = {}
+    checked = set()
+    for members in buckets.values():
+        if len(members) < 2:
+            continue
+        # Сравниваем с первым участником корзины: O(n) на корзину, группы все равно склеиваются
+        first = members[0]
+        for other in members[1:]:
+            pair = (first, other) if first < other else (other, first)
+            if pair in checked:
+                continue
+            checked.add(pair)
+            if across_quizzes and info[first][1] == info[other][1]:
+                continue
+            x, y = sets[first], sets[other]
+            jaccard = len(x & y) / len(x | y)
+            if jaccard >= threshold:
+                groups.union(first, other)
+                similarity[pair] = jaccard
+
+    clusters = defaultdict(list)
+    for q_id in groups.parent:
+        clusters[groups.find(q_id)].append(q_id)
+    min_similarity = defaultdict(lambda: 1.0)
+    for (first, _), jaccard in similarity.items():
+        root = groups.find(first)
+        min_similarity[root] = min(min_similarity[root], jaccard)
+
+    result = []
+    for root, members in clusters.items():
+        members.sort(key=lambda q_id: (info[q_id][1], info[q_id][3] or 0, q_id))
+        result.append({
+            'similarity': round(min_similarity[root], 3),
+            'questions': [{
+                'question_id': q_id,
+                'quiz_id': info[q_id][1],
+                'quiz_title': info[q_id][2],
+                'order': info[q_id][3],
+                'text': info[q_id][4]
+            } for q_id in members]
+        })
+    result.sort(key=lambda group: (-len(group['questions']), group['questions'][0]['quiz_id'],
+                                   group['questions'][0]['question_id']))
+    return result
+
+
+def question_position(question_id):
+    """(quiz_id, editor position) of a question, or None"""
+    row = db.session.execute(text(
+        "SELECT q.quiz_id, (SELECT count(*) FROM question p WHERE p.quiz_id = q.quiz_id "
+        "AND (coalesce(p.\"order\", -1), p.id) < (coalesce(q.\"order\", -1), q.id)) + 1 "
+        "FROM question q WHERE q.id = :id"
+    ), {'id': question_id}).first()
+    return None if row is None else (row[0], row[1])
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_after_tables(target, connection, **kw):
+    ensure_index(connection)
+
+
+def init_app(app):
+    """Check for the index at startup, read-only
+
+    The index is created by the migrations (`flask db upgrade`) and by
+    create_all; starting the app never changes the schema.
+    """
+    if not app.config.get('SEARCH_INDEX', True):
+        return
+    with app.app_context():
+        try:
+            if db.engine.dialect.name == 'sqlite' and not has_index():
+                logger.warning('Search index is missing, run `flask db upgrade` to create it')
+        finally:
+            db.session.remove()
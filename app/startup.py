@@ -0,0 +1,90 @@
+import os
+import time
+from contextlib import contextmanager
+
+from jinja2 import FileSystemBytecodeCache
+
+from app import db, logger, quiz_cache, grading
+
+
+class StartupTimer:
+    """Wall time of the named startup phases, in order"""
+
+    def __init__(self, import_seconds=None):
+        self.phases = []  # [(name, seconds)]
+        if import_seconds is not None:
+            self.phases.append(('import app', import_seconds))
+        self.details = {}
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    @property
+    def total(self):
+        return sum(seconds for _, seconds in self.phases)
+
+    def report(self):
+        lines = [f'{name:<22}{seconds * 1000:>9.1f} ms' for name, seconds in self.phases]
+        lines.append(f'{"total":<22}{self.total * 1000:>9.1f} ms')
+        lines.extend(f'{key}: {value}' for key, value in self.details.items())
+        return '\n'.join(lines)
+
+
+def enable_bytecode_cache(app):
+    """Keep compiled templates on disk so a new worker skips Jinja compilation
+
+    Must run before app.jinja_env is first used.
+    """
+    directory = app.config.get('TEMPLATE_CACHE_DIR')
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    cache = FileSystemBytecodeCache(directory)
+    app.jinja_options = dict(app.jinja_options, bytecode_cache=cache)
+    return cache
+
+
+def precompile_templates(app):
+    """Load every template into the environment's in-memory cache
+
+    With the bytecode cache this is a disk read per template, otherwise
+    a compile; either way the first request no longer pays for it.
+    """
+    env = app.jinja_env
+    names = env.list_templates(extensions=('html',))
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+def warm_quiz_caches(app):
+    """Compile active quizzes and their answer keys before traffic arrives"""
+    from app.models import Quiz
+    limit = app.config.get('QUIZ_CACHE_SIZE', 128)
+    with app.app_context():
+        quiz_ids = [row.id for row in db.session.query(Quiz.id).filter(Quiz.is_active.isnot(False))
+                    .order_by(Quiz.created_at.desc()).limit(limit)]
+        for quiz_id in quiz_ids:
+            quiz_cache.get_compiled_quiz(quiz_id)
+            grading.get_answer_key(quiz_id)
+        db.session.remove()
+    return len(quiz_ids)
+
+
+def finish(app, timer):
+    """Run the optional warm-up phases and record the startup report"""
+    if app.config.get('STARTUP_PRECOMPILE_TEMPLATES'):
+        with timer.phase('precompile templates'):
+            timer.details['templates'] = precompile_templates(app)
+    if app.config.get('STARTUP_WARM_QUIZZES'):
+        with timer.phase('warm quiz caches'):
+            timer.details['quizzes warmed'] = warm_quiz_caches(app)
+    app.extensions['startup'] = timer
+    logger.info('App started in %.1f ms: %s', timer.total * 1000,
+                ', '.join(f'{name} {seconds * 1000:.1f} ms' for name, seconds in timer.phases))
+    return timer
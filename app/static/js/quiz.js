@@ -7,17 +7,35 @@ document.addEventListener('DOMContentLoaded', function() {
     const submitBtn = document.getElementById('submitQuizBtn');
     
     const quizId = window.quizConfig.id;
-    const questions = window.quizConfig.questions;
+    let questions = window.quizConfig.questions;
     
     let currentQuestion = 0;
     const userAnswers = {};
+    let attemptId = null;
+    
+    function showEmpty() {
+        quizContainer.innerHTML = '<p class="text-center text-slate-500 py-10">Вопросы не найдены.</p>';
+    }
     
     function initQuiz() {
-        if (!questions || questions.length === 0) {
-            quizContainer.innerHTML = '<p class="text-center text-slate-500 py-10">Вопросы не найдены.</p>';
-            return;
-        }
-        showQuestion(currentQuestion);
+        // Попытка хранится на сервере: после перезагрузки страницы ответы восстанавливаются.
+        // Для квиза с пулом вопросов сервер присылает вариант этой попытки
+        fetch(`/quizzes/${quizId}/attempt`, { method: 'POST' })
+            .then(response => response.json())
+            .then(data => {
+                if (data.success === false) throw new Error(data.message);
+                attemptId = data.attempt_id;
+                if (data.questions) questions = data.questions;
+                if (!questions || questions.length === 0) return showEmpty();
+                Object.entries(data.answers || {}).forEach(([qId, aIds]) => { userAnswers[qId] = aIds; });
+                const firstOpen = questions.findIndex(q => !userAnswers[q.id]);
+                showQuestion(firstOpen === -1 ? questions.length - 1 : firstOpen);
+            })
+            .catch(error => {
+                console.error('Attempt could not be started:', error);
+                if (!questions || questions.length === 0) return showEmpty();
+                showQuestion(currentQuestion);
+            });
     }
     
     function showQuestion(index) {
@@ -89,10 +107,28 @@ document.addEventListener('DOMContentLoaded', function() {
     
     function saveAnswers() {
         const question = questions[currentQuestion];
+        if (!question) return;
         const inputs = document.querySelectorAll(`input[name="q-${question.id}"]:checked`);
-        userAnswers[question.id] = Array.from(inputs).map(i => parseInt(i.value));
+        const selected = Array.from(inputs).map(i => parseInt(i.value));
+        const previous = userAnswers[question.id] || [];
+        userAnswers[question.id] = selected;
+        if (attemptId && selected.join(',') !== previous.join(',')) {
+            autosave(question.id, selected);
+        }
     }
     
+    function autosave(questionId, answerIds) {
+        // keepalive: запрос доходит, даже если страницу уже закрывают
+        fetch(`/quizzes/attempts/${attemptId}/answer`, {
+            method: 'POST',
+            keepalive: true,
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ question_id: questionId, answer_ids: answerIds })
+        }).catch(error => console.error('Autosave failed:', error));
+    }
+    
+    quizContainer.addEventListener('change', saveAnswers);
+    
     prevBtn.addEventListener('click', function() {
         saveAnswers();
         showQuestion(currentQuestion - 1);
@@ -110,17 +146,25 @@ document.addEventListener('DOMContentLoaded', function() {
         submitBtn.disabled = true;
         submitBtn.innerHTML = '<span class="animate-spin material-icons mr-2 text-sm">sync</span> Отправка...';
         
-        fetch(`/quizzes/${quizId}/submit`, {
+        // Оценивается сохраненное на сервере состояние попытки; ответы досылаются на случай незавершенного автосохранения
+        // Под asgi.py ответы принимает асинхронный API (apiBase), под run.py — маршруты Flask
+        const apiBase = window.quizConfig.apiBase;
+        const url = attemptId
+            ? (apiBase ? `${apiBase}/attempts/${attemptId}/submit` : `/quizzes/attempts/${attemptId}/submit`)
+            : `${apiBase ? `${apiBase}/quizzes` : '/quizzes'}/${quizId}/submit`;
+        fetch(url, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify(userAnswers)
+            body: JSON.stringify(attemptId ? { answers: userAnswers } : userAnswers)
         })
         .then(response => response.json())
         .then(data => {
             if (data.success === false) throw new Error(data.message);
-            window.location.href = `/quizzes/${quizId}/result`;
+            // token позволяет показать результат, который еще стоит в очереди на запись
+            const token = data.result_token ? `?token=${encodeURIComponent(data.result_token)}` : '';
+            window.location.href = `/quizzes/${quizId}/result${token}`;
         })
         .catch(error => {
             console.error('Error:', error);
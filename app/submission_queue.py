@@ -0,0 +1,264 @@
+import atexit
+import json
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from app import db, logger, responses, item_stats, attempts
+from app.models import QuizResult
+
+
+class PendingResult(NamedTuple):
+    """A graded submission that may not be committed yet"""
+    token: str
+    user_id: int
+    quiz_id: int
+    score: float
+    completed_at: datetime
+    details: str
+    results: list
+    committed: Optional[threading.Event]  # set once the row is committed
+    attempt_id: Optional[int] = None  # attempt closed by this submission, linked to the result
+
+
+class QueueFull(Exception):
+    pass
+
+
+class CommitTimeout(QueueFull):
+    """A durable submission was not picked up in time and was taken back from the queue"""
+
+
+def store_results(pending):
+    """Insert QuizResult rows with their responses and statistics, link attempts (caller commits)"""
+    rows = [QuizResult(user_id=p.user_id, quiz_id=p.quiz_id, score=p.score,
+                       completed_at=p.completed_at, details=p.details) for p in pending]
+    db.session.add_all(rows)
+    db.session.flush()
+
+    response_rows = []
+    for p, row in zip(pending, rows):
+        response_rows.extend(responses.response_rows(row.id, p.results))
+        item_stats.record_submission(p.quiz_id, p.score, p.results)
+        if p.attempt_id is not None:
+            attempts.link_result(p.attempt_id, row.id)
+    responses.insert_responses(response_rows)
+    return rows
+
+
+def make_pending(user_id, quiz_id, score, full_results, durable=False, attempt_id=None):
+    return PendingResult(
+        token=uuid.uuid4().hex,
+        user_id=user_id,
+        quiz_id=quiz_id,
+        score=score,
+        completed_at=datetime.utcnow(),
+        details=json.dumps(full_results, ensure_ascii=False),
+        results=full_results['results'],
+        committed=threading.Event() if durable else None,
+        attempt_id=attempt_id
+    )
+
+
+class SubmissionQueue:
+    """Write-behind queue that group-commits submissions
+
+    Requests enqueue graded results; one writer thread inserts them in a
+    single transaction every flush_interval seconds or batch_size items.
+    In 'durable' mode the request waits until its batch is committed, so
+    many submissions share one fsync. In 'async' mode it returns at once
+    and up to one batch can be lost if the process dies. The queue is
+    bounded: when it is full enqueue waits up to put_timeout, then raises
+    QueueFull so the caller can fall back to a direct write. A durable
+    submission the writer has not taken within commit_timeout is withdrawn
+    the same way (CommitTimeout); one that is being written is waited for.
+    A submission that cannot be written reopens the attempt it closed, so
+    the user can submit it again.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.mode = app.config.get('SUBMIT_QUEUE_MODE', 'off')
+        self.batch_size = app.config.get('SUBMIT_QUEUE_BATCH_SIZE', 200)
+        self.flush_interval = app.config.get('SUBMIT_QUEUE_FLUSH_MS', 50) / 1000
+        self.put_timeout = app.config.get('SUBMIT_QUEUE_PUT_TIMEOUT', 2.0)
+        self.commit_timeout = app.config.get('SUBMIT_QUEUE_COMMIT_TIMEOUT', 30.0)
+        self._queue = queue.Queue(maxsize=app.config.get('SUBMIT_QUEUE_MAX_SIZE', 5000))
+        self._pending = {}  # {token: PendingResult} until committed
+        self._failed = set()  # tokens of durable submissions that could not be written
+        self._waiting = set()  # tokens of durable submissions whose request is waiting
+        self._sealed = set()  # tokens in the batch being written
+        self._cancelled = set()  # tokens withdrawn after a commit timeout, skipped by the writer
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+
+    @property
+    def durable(self):
+        return self.mode == 'durable'
+
+    def _ensure_writer(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='submission-writer', daemon=True)
+                    self._thread.start()
+                    atexit.register(self.stop)
+
+    def submit(self, user_id, quiz_id, score, full_results, attempt_id=None):
+        """Enqueue a graded submission and return its PendingResult"""
+        pending = make_pending(user_id, quiz_id, score, full_results, durable=self.durable, attempt_id=attempt_id)
+        token = pending.token
+        self._ensure_writer()
+        with self._lock:
+            self._pending[token] = pending
+            if self.durable:
+                self._waiting.add(token)
+        try:
+            try:
+                self._queue.put(pending, timeout=self.put_timeout)
+            except queue.Full:
+                with self._lock:
+                    self._pending.pop(token, None)
+                raise QueueFull('Submission queue is full')
+
+            if self.durable:
+                self._wait_committed(pending)
+        finally:
+            if self.durable:
+                with self._lock:
+                    self._waiting.discard(token)
+                    self._failed.discard(token)
+        return pending
+
+    def _wait_committed(self, pending):
+        """Block until the writer committed a durable submission; raise if it was not saved"""
+        token = pending.token
+        if not pending.committed.wait(self.commit_timeout):
+            with self._lock:
+                if token not in self._sealed:
+                    # Писатель ее еще не взял: забираем из очереди, вызывающий запишет сам
+                    self._pending.pop(token, None)
+                    self._cancelled.add(token)
+                    logger.warning('Submission %s not picked up within %ss, writing it directly',
+                                   token, self.commit_timeout)
+                    raise CommitTimeout('Submission was not written in time')
+            # Уже пишется: успех сообщаем только после коммита
+            if not pending.committed.wait(self.commit_timeout):
+                logger.error('Submission %s still not committed after %ss', token, 2 * self.commit_timeout)
+                raise RuntimeError('Submission was not committed in time')
+        with self._lock:
+            if token in self._failed:
+                raise RuntimeError('Submission could not be saved')
+
+    def get_pending(self, user_id, quiz_id=None, token=None):
+        """Most recent uncommitted result of a user (and quiz), or by token"""
+        with self._lock:
+            if token is not None:
+                pending = self._pending.get(token)
+                return pending if pending and pending.user_id == user_id else None
+            candidates = [p for p in self._pending.values()
+                          if p.user_id == user_id and (quiz_id is None or p.quiz_id == quiz_id)]
+        return max(candidates, key=lambda p: p.completed_at) if candidates else None
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _seal(self, batch):
+        """Drop withdrawn submissions from a batch and mark the rest as being written"""
+        with self._lock:
+            cancelled = {p.token for p in batch} & self._cancelled
+            self._cancelled -= cancelled
+            batch = [p for p in batch if p.token not in cancelled]
+            self._sealed.update(p.token for p in batch)
+        return batch
+
+    def _write(self, batch):
+        batch = self._seal(batch)
+        if not batch:
+            return
+        started = time.perf_counter()
+        try:
+            store_results(batch)
+            db.session.commit()
+            failed = []
+        except Exception as e:
+            db.session.rollback()
+            logger.error('Group commit of %s submissions failed, retrying one by one: %s', len(batch), e)
+            failed = []
+            for pending in batch:
+                try:
+                    store_results([pending])
+                    db.session.commit()
+                except Exception as item_error:
+                    db.session.rollback()
+                    failed.append(pending)
+                    logger.error('Lost submission %s of user %s for quiz %s: %s',
+                                 pending.token, pending.user_id, pending.quiz_id, item_error)
+            self._reopen_attempts(failed)
+
+        with self._lock:
+            for pending in batch:
+                self._pending.pop(pending.token, None)
+                self._sealed.discard(pending.token)
+            # Только для ждущих запросов: они и удаляют метку
+            self._failed.update(p.token for p in failed if p.token in self._waiting)
+        for pending in batch:
+            if pending.committed is not None:
+                pending.committed.set()
+        logger.debug('Group-committed %s submissions in %.3fs', len(batch) - len(failed), time.perf_counter() - started)
+
+    def _reopen_attempts(self, failed):
+        """Reopen the attempts closed by submissions that could not be written"""
+        attempt_ids = [p.attempt_id for p in failed if p.attempt_id is not None]
+        if not attempt_ids:
+            return
+        # В режиме async запрос уже вернул токен: без этого попытка осталась бы закрытой без результата
+        try:
+            for attempt_id in attempt_ids:
+                attempts.reopen_attempt(attempt_id)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error('Could not reopen attempts %s after a failed write: %s', attempt_ids, e)
+        else:
+            logger.warning('Reopened attempts %s after their results could not be saved', attempt_ids)
+
+    def _run(self):
+        with self.app.app_context():
+            while not (self._stopping.is_set() and self._queue.empty()):
+                batch = self._next_batch()
+                if batch:
+                    self._write(batch)
+                    db.session.remove()
+
+    def stop(self):
+        """Drain the queue and stop the writer thread"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.commit_timeout)
+
+
+def init_app(app):
+    if app.config.get('SUBMIT_QUEUE_MODE', 'off') in ('durable', 'async'):
+        app.extensions['submission_queue'] = SubmissionQueue(app)
+
+
+def get_queue(app):
+    return app.extensions.get('submission_queue')
@@ -0,0 +1,88 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import event
+
+from app import db
+from app.models import User
+
+
+class Principal(UserMixin):
+    """Detached snapshot of a user: everything a request needs to authorize"""
+    __slots__ = ('id', 'username', 'is_admin')
+
+    def __init__(self, id, username, is_admin):
+        self.id = id
+        self.username = username
+        self.is_admin = bool(is_admin)
+
+    def __repr__(self):
+        return f'<Principal {self.username}>'
+
+
+_cache = OrderedDict()  # {user_id: (expires_at, Principal)}, least recently used first
+_lock = Lock()
+
+
+def load_principal(user_id):
+    """Return the user's Principal, reading the DB only on a miss or after the TTL
+
+    None for a missing or deactivated user, which logs the session out.
+    """
+    principal = cached(user_id)
+    if principal is not None:
+        return principal
+
+    row = db.session.execute(principal_statement(user_id)).first()
+    if row is None:
+        invalidate(user_id)
+        return None
+    return remember(row, current_app.config)
+
+
+def principal_statement(user_id):
+    """The row a Principal is built from, none for a deactivated user"""
+    return db.select(User.id, User.username, User.is_admin)\
+        .where(User.id == user_id, User.is_active.isnot(False))
+
+
+def cached(user_id):
+    """The cached Principal while its TTL lasts, else None"""
+    with _lock:
+        entry = _cache.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            _cache.move_to_end(user_id)
+            return entry[1]
+    return None
+
+
+def remember(row, config):
+    """Cache the Principal of a principal_statement row"""
+    principal = Principal(*row)
+    expires_at = time.monotonic() + config.get('USER_CACHE_TTL', 300)
+    maxsize = config.get('USER_CACHE_SIZE', 1024)
+    with _lock:
+        _cache[principal.id] = (expires_at, principal)
+        _cache.move_to_end(principal.id)
+        while len(_cache) > maxsize:
+            _cache.popitem(last=False)
+    return principal
+
+
+def invalidate(user_id=None):
+    """Drop one user (or everyone) after the user row was changed"""
+    with _lock:
+        if user_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(user_id, None)
+
+
+# Изменения через ORM сбрасывают кэш сами; массовые UPDATE/DELETE должны вызвать invalidate()
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    invalidate(target.id)
@@ -0,0 +1,268 @@
+import csv
+import io
+import multiprocessing
+import os
+import secrets
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock, Thread
+
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+
+from app import db, logger, user_cache
+from app.models import User
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+INSERT_BATCH_SIZE = 500  # users hashed and inserted per transaction
+MAX_ERRORS = 1000  # row errors kept in a job status
+USERNAME_MAX = 64
+
+_jobs = {}  # {job_id: status dict}
+_jobs_lock = Lock()
+_passwords = {}  # {job_id: [(username, password), ...]} новые пароли до первой выгрузки
+
+
+def fetch_page(search='', after=None, limit=PAGE_SIZE):
+    """One page of users ordered by username plus the username to continue after
+
+    search matches the start of the username, see User.username_prefix.
+    """
+    limit = max(1, min(limit or PAGE_SIZE, MAX_PAGE_SIZE))
+    query = db.session.query(User.id, User.username, User.is_admin, User.is_active, User.created_at)
+    query = _prefix_filter(query, search)
+    if after:
+        query = query.filter(User.username > after)
+    rows = query.order_by(User.username).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, rows[-1].username if has_more else None
+
+
+def count_users(search=''):
+    return _prefix_filter(db.session.query(db.func.count(User.id)), search).scalar()
+
+
+def _prefix_filter(query, search):
+    if search:
+        query = query.filter(User.username_prefix(search))
+    return query
+
+
+def set_active(user_ids, active, keep_id=None):
+    """Activate or deactivate users in one UPDATE; keep_id (the acting admin) is skipped"""
+    query = db.session.query(User).filter(User.id.in_(user_ids))
+    if keep_id is not None:
+        query = query.filter(User.id != keep_id)
+    changed = query.update({'is_active': active}, synchronize_session=False)
+    db.session.commit()
+    # Массовый UPDATE не вызывает события ORM: кэш пользователей сбрасывается явно
+    user_cache.invalidate()
+    return changed
+
+
+def new_password():
+    return secrets.token_urlsafe(9)
+
+
+def hash_passwords(passwords, pool=None):
+    """Password hashes in input order, computed on the process pool if there is one"""
+    if pool is None:
+        return [generate_password_hash(password) for password in passwords]
+    return list(pool.map(generate_password_hash, passwords, chunksize=max(1, len(passwords) // 64)))
+
+
+def _make_pool(app, size):
+    workers = app.config.get('USER_HASH_WORKERS') or os.cpu_count() or 1
+    workers = min(workers, size)
+    if workers <= 1:
+        return None
+    # spawn, а не fork: процесс веб-сервера многопоточный, дочерний процесс от fork может зависнуть на чужой блокировке
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def parse_import(stream):
+    """Valid rows and errors of an import CSV
+
+    Columns: username, password and optionally is_admin (1/true/yes/да).
+    A header row is optional. An empty password gets a random one, which
+    is returned with the job result. Returns ([row dict], [error dict]).
+    """
+    rows, errors, seen = [], [], set()
+    reader = csv.reader(io.StringIO(stream.read().decode('utf-8-sig')))
+    for line, record in enumerate(reader, 1):
+        if not record or not any(cell.strip() for cell in record):
+            continue
+        username = record[0].strip()
+        if line == 1 and username.lower() in ('username', 'login', 'логин'):
+            continue
+        password = record[1] if len(record) > 1 else ''
+        is_admin = len(record) > 2 and record[2].strip().lower() in ('1', 'true', 'yes', 'да')
+        if not username:
+            errors.append({'line': line, 'username': '', 'message': 'empty username'})
+        elif len(username) > USERNAME_MAX:
+            errors.append({'line': line, 'username': username[:USERNAME_MAX], 'message': 'username too long'})
+        elif username in seen:
+            errors.append({'line': line, 'username': username, 'message': 'duplicate in file'})
+        else:
+            seen.add(username)
+            rows.append({'line': line, 'username': username, 'password': password, 'is_admin': is_admin})
+    return rows, errors
+
+
+def _existing_usernames(usernames):
+    existing = set()
+    for start in range(0, len(usernames), 500):
+        chunk = usernames[start:start + 500]
+        existing.update(name for (name,) in db.session.query(User.username).filter(User.username.in_(chunk)))
+    return existing
+
+
+def _insert_batch(batch, hashes):
+    """Insert one batch in a transaction; on a conflict fall back to row by row
+
+    Returns the per-row errors.
+    """
+    values = [{'username': row['username'], 'password_hash': password_hash, 'is_admin': row['is_admin'],
+               'is_active': True} for row, password_hash in zip(batch, hashes)]
+    try:
+        db.session.execute(User.__table__.insert(), values)
+        db.session.commit()
+        return []
+    except IntegrityError:
+        db.session.rollback()
+
+    # Кто-то создал пользователя с тем же именем между проверкой и вставкой
+    errors = []
+    for row, value in zip(batch, values):
+        try:
+            db.session.execute(User.__table__.insert(), [value])
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            errors.append({'line': row['line'], 'username': row['username'], 'message': 'username already exists'})
+    return errors
+
+
+def import_users(app, rows, errors=(), progress=None):
+    """Create users from parsed rows: hash on a process pool, insert in batches
+
+    errors are the parse errors to report along. Returns stats with
+    per-row errors and the generated passwords.
+    """
+    started = time.perf_counter()
+    stats = {'total': len(rows) + len(errors), 'processed': len(errors), 'created': 0, 'errors': list(errors)}
+    existing = _existing_usernames([row['username'] for row in rows])
+    todo = []
+    for row in rows:
+        if row['username'] in existing:
+            stats['errors'].append({'line': row['line'], 'username': row['username'],
+                                    'message': 'username already exists'})
+        else:
+            todo.append(row)
+    generated = []
+    for row in todo:
+        if not row['password']:
+            row['password'] = new_password()
+            generated.append((row['username'], row['password']))
+    stats['processed'] += len(rows) - len(todo)
+
+    pool = _make_pool(app, len(todo))
+    try:
+        for start in range(0, len(todo), INSERT_BATCH_SIZE):
+            batch = todo[start:start + INSERT_BATCH_SIZE]
+            hashes = hash_passwords([row['password'] for row in batch], pool)
+            batch_errors = _insert_batch(batch, hashes)
+            stats['errors'].extend(batch_errors)
+            stats['created'] += len(batch) - len(batch_errors)
+            stats['processed'] += len(batch)
+            if progress:
+                progress(stats)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    failed = {error['username'] for error in stats['errors']}
+    stats['passwords'] = [(name, password) for name, password in generated if name not in failed]
+    stats['elapsed'] = time.perf_counter() - started
+    logger.info('Imported %s/%s users in %.2fs, %s errors', stats['created'], len(rows), stats['elapsed'],
+                len(stats['errors']))
+    return stats
+
+
+def reset_passwords(app, user_ids, keep_id=None, progress=None):
+    """Give the users new random passwords: hashed on the pool, written with one executemany"""
+    started = time.perf_counter()
+    query = db.session.query(User.id, User.username).filter(User.id.in_(user_ids))
+    if keep_id is not None:
+        query = query.filter(User.id != keep_id)
+    users = query.order_by(User.username).all()
+    passwords = [new_password() for _ in users]
+    pool = _make_pool(app, len(users))
+    try:
+        hashes = hash_passwords(passwords, pool)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    if users:
+        db.session.execute(User.__table__.update().where(User.__table__.c.id == db.bindparam('user_id')),
+                           [{'user_id': user.id, 'password_hash': password_hash}
+                            for user, password_hash in zip(users, hashes)])
+        db.session.commit()
+    stats = {'total': len(users), 'processed': len(users), 'updated': len(users), 'errors': [],
+             'passwords': [(user.username, password) for user, password in zip(users, passwords)],
+             'elapsed': time.perf_counter() - started}
+    logger.info('Reset passwords of %s users in %.2fs', len(users), stats['elapsed'])
+    if progress:
+        progress(stats)
+    return stats
+
+
+def _run_job(app, job_id, task, args):
+    def progress(stats):
+        with _jobs_lock:
+            _jobs[job_id].update({key: value for key, value in stats.items() if key != 'errors'},
+                                 errors=stats['errors'][:MAX_ERRORS], error_count=len(stats['errors']))
+
+    with app.app_context():
+        try:
+            stats = task(app, *args, progress=progress)
+            passwords = stats.pop('passwords', [])
+            if passwords:
+                with _jobs_lock:
+                    _passwords[job_id] = passwords
+            progress(stats)
+            with _jobs_lock:
+                _jobs[job_id].update(status='done', passwords=len(passwords))
+        except Exception as e:
+            db.session.rollback()
+            logger.error('User job %s failed: %s', job_id, e)
+            with _jobs_lock:
+                _jobs[job_id].update(status='error', message=str(e))
+        finally:
+            db.session.remove()
+
+
+def start_job(app, kind, *args):
+    """Run import_users or reset_passwords in a background thread and return the job id"""
+    task = {'import': import_users, 'reset': reset_passwords}[kind]
+    job_id = uuid.uuid4().hex
+    with _jobs_lock:
+        _jobs[job_id] = {'job_id': job_id, 'kind': kind, 'status': 'running', 'processed': 0,
+                         'errors': [], 'error_count': 0}
+    Thread(target=_run_job, args=(app, job_id, task, args), daemon=True, name=f'users-{kind}').start()
+    return job_id
+
+
+def get_job(job_id):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
+
+
+def take_passwords(job_id):
+    """Generated passwords of a finished job; handed out once and then forgotten"""
+    with _jobs_lock:
+        return _passwords.pop(job_id, None)
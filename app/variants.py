@@ -0,0 +1,47 @@
+import random
+import secrets
+
+
+def new_seed():
+    return secrets.randbits(31)
+
+
+def draw(compiled, seed):
+    """Question ids served for seed: draw_count random ids of a pooled quiz, else all in order
+
+    random.sample over the compiled id array costs O(draw_count) for a
+    large bank, so a variant does not depend on the bank size.
+    """
+    if not compiled.is_pooled:
+        return compiled.question_ids
+    ids = compiled.question_ids
+    return tuple(random.Random(seed).sample(ids, min(compiled.draw_count, len(ids))))
+
+
+def questions(compiled, seed, question_ids):
+    """CompiledQuestions of a variant, answers shuffled if the quiz asks for it
+
+    Questions deleted since the variant was drawn are skipped.
+    """
+    served = [compiled.questions_by_id[q_id] for q_id in question_ids if q_id in compiled.questions_by_id]
+    if not compiled.shuffle_answers:
+        return served
+    # Свой генератор от того же seed: порядок ответов одинаков при каждом возобновлении попытки
+    rng = random.Random(seed ^ 0x5f3759df)
+    shuffled = []
+    for q in served:
+        answers = list(q.answers)
+        rng.shuffle(answers)
+        shuffled.append(q._replace(answers=tuple(answers)))
+    return shuffled
+
+
+def encode(question_ids):
+    return ','.join(str(q_id) for q_id in question_ids)
+
+
+def decode(value):
+    """Question ids of a stored variant, None for an attempt of the whole quiz"""
+    if value is None:
+        return None
+    return tuple(int(q_id) for q_id in value.split(',') if q_id)
@@ -0,0 +1,24 @@
+#prod: uvicorn with the async API tier, see ASGI_* in app/config.py
+import uvicorn
+
+from app import create_app
+from app.async_api import create_asgi_app
+
+flask_app = create_app()
+app = create_asgi_app(flask_app)
+
+
+if __name__ == '__main__':
+    config = flask_app.config
+    workers = config['ASGI_WORKERS']
+    # Каждый процесс uvicorn импортирует asgi:app заново, один процесс обслуживает уже созданное приложение
+    uvicorn.run(
+        app if workers == 1 else 'asgi:app',
+        host=config['ASGI_HOST'],
+        port=config['ASGI_PORT'],
+        workers=workers,
+        limit_concurrency=config['ASGI_LIMIT_CONCURRENCY'],
+        backlog=config['ASGI_BACKLOG'],
+        timeout_keep_alive=config['ASGI_KEEP_ALIVE'],
+        proxy_headers=True
+    )
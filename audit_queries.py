@@ -0,0 +1,25 @@
+import argparse
+import sys
+
+from app import create_app
+from app.query_audit import audit, format_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='EXPLAIN QUERY PLAN every hot query; exit 1 on a full table scan')
+    parser.add_argument('-v', '--verbose', action='store_true', help='print the plans of all statements')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        reports = audit()
+    print(format_report(reports, verbose=args.verbose))
+    failed = [report.name for report in reports if not report.ok]
+    if failed:
+        print(f'{len(failed)} of {len(reports)} hot paths fall back to a full table scan or failed')
+        sys.exit(1)
+    print(f'All {len(reports)} hot paths use indexes')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+import argparse
+
+from app import create_app, db, logger
+from app.models import QuizResponse
+from app.responses import backfill_responses, DEFAULT_CHUNK_SIZE
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fill the quiz_response table from stored QuizResult details')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        QuizResponse.__table__.create(db.engine, checkfirst=True)
+
+        def progress(stats):
+            print(f'{stats["processed"]} results processed, {stats["inserted"]} responses inserted')
+
+        try:
+            stats = backfill_responses(args.chunk_size, progress=progress)
+        except Exception as e:
+            db.session.rollback()
+            logger.error('Error backfilling responses: %s', e)
+            raise
+        print(f'Inserted {stats["inserted"]} responses for {stats["processed"]} results in {stats["elapsed"]:.2f}s, '
+              f'{stats["failed"]} failed')
+
+
+if __name__ == '__main__':
+    main()
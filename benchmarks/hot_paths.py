@@ -0,0 +1,258 @@
+"""Load test of the quiz hot paths through the Flask test client
+
+Usage: python benchmarks/hot_paths.py [--users 50] [--quizzes 10] [--questions 30] [--results 2000]
+                                      [--workers 8] [--requests 200] [--scenarios take,submit,...]
+                                      [--save-baseline FILE] [--compare FILE] [--tolerance 0.25]
+
+Seeds a fresh temporary database (question text from the zquiz banks),
+then runs each scenario with concurrent workers and reports throughput,
+p50/p95/p99 latency and SQL statements per request. --save-baseline
+writes the report as JSON; --compare checks a run against such a file
+and exits with status 1 on a regression. Runs fully offline.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event  # noqa: E402
+
+from app import create_app, db, quiz_cache  # noqa: E402
+from app.config import Config  # noqa: E402
+from benchmarks.seed import seed_database, random_submission  # noqa: E402
+
+SCENARIOS = ('take', 'submit', 'results_overview', 'result_details', 'edit_question')
+
+
+def make_config(tmp):
+    """Config with the database, logs and template cache in tmp, nothing written to the checkout"""
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+        LOG_FOLDER = os.path.join(tmp, 'logs')
+        TEMPLATE_CACHE_DIR = os.path.join(tmp, 'jinja')
+    return BenchConfig
+
+
+class QueryCounter:
+    """SQL statements executed by the current thread"""
+
+    def __init__(self, engine):
+        self._local = threading.local()
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self._local.n = getattr(self._local, 'n', 0) + 1
+
+    def reset(self):
+        self._local.n = 0
+
+    @property
+    def value(self):
+        return getattr(self._local, 'n', 0)
+
+
+class Context:
+    """Seeded ids and compiled quizzes the scenarios draw from"""
+
+    def __init__(self, app, seeded):
+        from app.models import QuizResult
+        self.app = app
+        self.admin_id = seeded['admin_id']
+        self.user_ids = seeded['user_ids']
+        self.quiz_ids = seeded['quiz_ids']
+        with app.app_context():
+            self.quizzes = {quiz_id: quiz_cache.get_compiled_quiz(quiz_id) for quiz_id in self.quiz_ids}
+            self.result_ids = [row.id for row in db.session.query(QuizResult.id)]
+
+
+def _take(client, ctx, rng):
+    return client.get(f'/quizzes/{rng.choice(ctx.quiz_ids)}/take')
+
+
+def _submit(client, ctx, rng):
+    quiz_id = rng.choice(ctx.quiz_ids)
+    return client.post(f'/quizzes/{quiz_id}/submit', json=random_submission(rng, ctx.quizzes[quiz_id], 0.6))
+
+
+def _results_overview(client, ctx, rng):
+    return client.get('/admin/results')
+
+
+def _result_details(client, ctx, rng):
+    return client.get(f'/admin/results/{rng.choice(ctx.result_ids)}')
+
+
+def _edit_question(client, ctx, rng):
+    # Автосохранение: тот же набор ответов, текст меняется — одна строка UPDATE
+    quiz = ctx.quizzes[rng.choice(ctx.quiz_ids)]
+    order = rng.randint(1, len(quiz.questions))
+    question = quiz.questions[order - 1]
+    return client.post(f'/admin/edit/{quiz.id}/question/{order}', json={
+        'text': question.text + (' ' if rng.random() < 0.5 else ''),
+        'answers': [{'id': a.id, 'text': a.text, 'is_correct': a.is_correct} for a in question.answers],
+        'action': 'save'
+    })
+
+
+RUNNERS = {
+    'take': (_take, False),
+    'submit': (_submit, False),
+    'results_overview': (_results_overview, True),
+    'result_details': (_result_details, True),
+    'edit_question': (_edit_question, True),
+}
+
+
+def _client(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(q * len(values))) - 1))]
+
+
+def run_scenario(name, ctx, counter, workers, requests, warmup, rng_seed):
+    runner, admin = RUNNERS[name]
+    samples = []  # (latency, queries, status)
+    lock = threading.Lock()
+    per_worker = [requests // workers + (1 if i < requests % workers else 0) for i in range(workers)]
+
+    def worker(idx, n):
+        rng = random.Random(rng_seed * 1000 + idx)
+        client = _client(ctx.app, ctx.admin_id if admin else ctx.user_ids[idx % len(ctx.user_ids)])
+        for _ in range(warmup):
+            runner(client, ctx, rng)
+        local = []
+        for _ in range(n):
+            counter.reset()
+            started = time.perf_counter()
+            response = runner(client, ctx, rng)
+            local.append((time.perf_counter() - started, counter.value, response.status_code))
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i, n)) for i, n in enumerate(per_worker)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(s[0] for s in samples)
+    total = len(samples)
+    return {
+        'requests': total,
+        'errors': sum(1 for s in samples if s[2] >= 400),
+        'throughput': total / elapsed if elapsed else 0.0,
+        'p50_ms': _percentile(latencies, 0.50) * 1000,
+        'p95_ms': _percentile(latencies, 0.95) * 1000,
+        'p99_ms': _percentile(latencies, 0.99) * 1000,
+        'queries_per_request': sum(s[1] for s in samples) / total if total else 0.0,
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Regressions of report against baseline, as printable lines"""
+    problems = []
+    for name, current in report['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if base is None:
+            continue
+        if current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            problems.append(f'{name}: p95 {current["p95_ms"]:.1f} ms vs {base["p95_ms"]:.1f} ms')
+        if current['throughput'] < base['throughput'] * (1 - tolerance):
+            problems.append(f'{name}: throughput {current["throughput"]:.0f}/s vs {base["throughput"]:.0f}/s')
+        # Число запросов детерминировано, поэтому допуск маленький
+        if current['queries_per_request'] > base['queries_per_request'] + 0.5:
+            problems.append(f'{name}: {current["queries_per_request"]:.1f} queries/request '
+                            f'vs {base["queries_per_request"]:.1f}')
+        if current['errors'] > base['errors']:
+            problems.append(f'{name}: {current["errors"]} errors vs {base["errors"]}')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--quizzes', type=int, default=10)
+    parser.add_argument('--questions', type=int, default=30, help='questions per quiz')
+    parser.add_argument('--results', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per scenario')
+    parser.add_argument('--warmup', type=int, default=2, help='unmeasured requests per worker')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save-baseline', metavar='FILE')
+    parser.add_argument('--compare', metavar='FILE')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown')
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = [s for s in scenarios if s not in RUNNERS]
+    if unknown:
+        parser.error(f'unknown scenarios: {", ".join(unknown)} (choose from {", ".join(SCENARIOS)})')
+
+    tmp = tempfile.mkdtemp(prefix='qm-bench-')
+    app = create_app(make_config(tmp))
+    started = time.perf_counter()
+    with app.app_context():
+        seeded = seed_database(args.users, args.quizzes, args.questions, args.results, rng_seed=args.seed)
+        counter = QueryCounter(db.engine)
+    print(f'Seeded {args.users} users, {args.quizzes} quizzes x {args.questions} questions, '
+          f'{args.results} results in {time.perf_counter() - started:.1f}s ({tmp})')
+    ctx = Context(app, seeded)
+
+    report = {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'args': {k: v for k, v in vars(args).items() if k not in ('save_baseline', 'compare')}
+        },
+        'scenarios': {}
+    }
+    print(f'{"scenario":<18}{"req":>6}{"err":>5}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"SQL/req":>9}')
+    for name in scenarios:
+        r = run_scenario(name, ctx, counter, args.workers, args.requests, args.warmup, args.seed)
+        report['scenarios'][name] = r
+        print(f'{name:<18}{r["requests"]:>6}{r["errors"]:>5}{r["throughput"]:>9.0f}{r["p50_ms"]:>9.1f}'
+              f'{r["p95_ms"]:>9.1f}{r["p99_ms"]:>9.1f}{r["queries_per_request"]:>9.1f}')
+
+    with app.app_context():
+        db.engine.dispose()
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f'Baseline saved to {args.save_baseline}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        problems = compare(report, baseline, args.tolerance)
+        if problems:
+            print('Regressions against ' + args.compare + ':')
+            for line in problems:
+                print('  ' + line)
+            sys.exit(1)
+        print(f'No regressions against {args.compare}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Synthetic database for the benchmarks, with question text from the zquiz banks"""
+import glob
+import os
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+from app import db, grading, quiz_cache
+from app.models import User, Quiz
+from app.quiz_import import BankParser
+from app.quiz_store import insert_questions
+from app.submission_queue import make_pending, store_results
+
+ZQUIZ_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'zquiz')
+PASSWORD = 'bench'
+CHUNK = 500
+
+
+def load_bank_questions(folder=ZQUIZ_DIR):
+    """All parseable questions of the *.txt banks in folder"""
+    pool = []
+    for path in sorted(glob.glob(os.path.join(folder, '*.txt'))):
+        with open(path, encoding='utf-8-sig') as f:
+            pool.extend(BankParser().parse(f))
+    return pool
+
+
+def _synthetic_question(i):
+    return {'text': f'Synthetic question {i}',
+            'answers': [{'text': f'Answer {j}', 'is_correct': j == 0} for j in range(4)]}
+
+
+def random_submission(rng, compiled, correct_rate):
+    """Pick answers for every question, the correct ones with probability correct_rate"""
+    submission = {}
+    for q in compiled.questions:
+        if not q.answers:
+            continue
+        correct = [a.id for a in q.answers if a.is_correct]
+        if correct and rng.random() < correct_rate:
+            submission[str(q.id)] = correct
+        else:
+            submission[str(q.id)] = [rng.choice(q.answers).id]
+    return submission
+
+
+def seed_database(users=50, quizzes=10, questions=30, results=2000, rng_seed=42, banks=ZQUIZ_DIR, progress=None):
+    """Create users, quizzes and graded results in the current app's (empty) database
+
+    Returns {'admin_id', 'user_ids', 'quiz_ids'}. Runs inside an app context.
+    """
+    rng = random.Random(rng_seed)
+    db.create_all()
+
+    # Один хэш на всех: генерация хэша пароля — самая дорогая часть создания пользователя
+    password_hash = generate_password_hash(PASSWORD)
+    db.session.execute(insert(User), [{'username': 'bench_admin', 'password_hash': password_hash, 'is_admin': True}] + [
+        {'username': f'bench_user_{i:05d}', 'password_hash': password_hash, 'is_admin': False}
+        for i in range(users)
+    ])
+    admin_id = db.session.query(User.id).filter_by(username='bench_admin').scalar()
+    user_ids = [row.id for row in db.session.query(User.id).filter(User.username.like('bench_user_%'))]
+
+    pool = load_bank_questions(banks)
+    quiz_ids = []
+    for i in range(quizzes):
+        if len(pool) >= questions:
+            chosen = rng.sample(pool, questions)
+        else:
+            chosen = [_synthetic_question(n) for n in range(questions)]
+        quiz = Quiz(title=f'Bench quiz {i + 1}', description='Synthetic benchmark quiz',
+                    created_by=admin_id, is_active=True)
+        db.session.add(quiz)
+        db.session.flush()
+        insert_questions(quiz.id, chosen)
+        quiz_ids.append(quiz.id)
+    db.session.commit()
+    quiz_cache.invalidate()
+
+    compiled = {quiz_id: quiz_cache.get_compiled_quiz(quiz_id) for quiz_id in quiz_ids}
+    keys = {quiz_id: grading.get_answer_key(quiz_id) for quiz_id in quiz_ids}
+    now = datetime.utcnow()
+    batch = []
+    for n in range(results):
+        quiz_id = rng.choice(quiz_ids)
+        full_results = grading.grade(keys[quiz_id], random_submission(rng, compiled[quiz_id], rng.uniform(0.3, 0.9)))
+        pending = make_pending(rng.choice(user_ids), quiz_id, grading.score(full_results), full_results)
+        batch.append(pending._replace(completed_at=now - timedelta(minutes=rng.randint(0, 90 * 24 * 60))))
+        if len(batch) >= CHUNK:
+            store_results(batch)
+            db.session.commit()
+            batch = []
+            if progress:
+                progress(n + 1, results)
+    if batch:
+        store_results(batch)
+        db.session.commit()
+
+    return {'admin_id': admin_id, 'user_ids': user_ids, 'quiz_ids': quiz_ids}
@@ -0,0 +1,137 @@
+"""Concurrent submit_quiz throughput with default vs tuned SQLite settings
+
+Usage: python benchmarks/submit_concurrency.py [--workers 16] [--submits 50] [--readers 4]
+
+Each mode runs against a fresh temporary database: writer threads post
+quiz submissions while reader threads keep opening the results page.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db  # noqa: E402
+from app.config import Config  # noqa: E402
+
+
+def make_config(tmp, tuned):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+        LOG_FOLDER = os.path.join(tmp, 'logs')
+        TEMPLATE_CACHE_DIR = os.path.join(tmp, 'jinja')
+        SQLITE_TUNING = tuned
+        if not tuned:
+            SQLALCHEMY_ENGINE_OPTIONS = {}
+    return BenchConfig
+
+
+def seed(app, n_questions):
+    from app.models import User, Quiz
+    from app.quiz_store import insert_questions
+
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', is_admin=True)
+        user.set_password('bench')
+        quiz = Quiz(title='Bench quiz', created_by=None, is_active=True)
+        db.session.add_all([user, quiz])
+        db.session.flush()
+        insert_questions(quiz.id, [
+            {'text': f'Question {i}', 'answers': [{'text': f'Answer {j}', 'is_correct': j == 0} for j in range(4)]}
+            for i in range(n_questions)
+        ])
+        db.session.commit()
+        return user.id, quiz.id
+
+
+def run_mode(tuned, args):
+    tmp = tempfile.mkdtemp(prefix='qm-bench-')
+    app = create_app(make_config(tmp, tuned))
+    user_id, quiz_id = seed(app, args.questions)
+
+    from app import quiz_cache
+    quiz_cache.invalidate()
+    with app.app_context():
+        compiled = quiz_cache.get_compiled_quiz(quiz_id)
+    submission = {str(q.id): [random.choice(q.answers).id] for q in compiled.questions}
+
+    errors = []
+    latencies = []
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def client():
+        c = app.test_client()
+        with c.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        return c
+
+    def writer():
+        c = client()
+        for _ in range(args.submits):
+            started = time.perf_counter()
+            response = c.post(f'/quizzes/{quiz_id}/submit', json=submission)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code != 200:
+                    errors.append(response.get_json().get('message'))
+
+    def reader():
+        c = client()
+        while not stop.is_set():
+            c.get(f'/quizzes/{quiz_id}/result')
+
+    readers = [threading.Thread(target=reader) for _ in range(args.readers)]
+    writers = [threading.Thread(target=writer) for _ in range(args.workers)]
+    for t in readers:
+        t.start()
+    started = time.perf_counter()
+    for t in writers:
+        t.start()
+    for t in writers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for t in readers:
+        t.join()
+
+    with app.app_context():
+        db.engine.dispose()
+
+    latencies.sort()
+    total = len(latencies)
+    return {
+        'mode': 'tuned' if tuned else 'default',
+        'submits': total,
+        'errors': len(errors),
+        'throughput': total / elapsed if elapsed else 0.0,
+        'p50_ms': latencies[total // 2] * 1000 if total else 0.0,
+        'p95_ms': latencies[int(total * 0.95) - 1] * 1000 if total else 0.0,
+        'sample_error': errors[0] if errors else '',
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--submits', type=int, default=50, help='submissions per worker')
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--questions', type=int, default=50)
+    args = parser.parse_args()
+
+    for tuned in (False, True):
+        r = run_mode(tuned, args)
+        print(f'{r["mode"]:>8}: {r["submits"]} submits, {r["throughput"]:.0f}/s, '
+              f'p50 {r["p50_ms"]:.1f} ms, p95 {r["p95_ms"]:.1f} ms, {r["errors"]} errors'
+              + (f' (e.g. {r["sample_error"]})' if r['errors'] else ''))
+
+
+if __name__ == '__main__':
+    main()
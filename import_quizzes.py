@@ -0,0 +1,49 @@
+import argparse
+import os
+import time
+
+from app import create_app, db, logger
+from app.models import User
+from app.quiz_import import import_file
+
+
+def bank_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith('.txt'):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import zquiz plain-text question banks as quizzes')
+    parser.add_argument('paths', nargs='+', help='bank files or directories with *.txt banks')
+    parser.add_argument('--owner', default='admin', help='username recorded as the quiz author')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        owner = User.query.filter_by(username=args.owner).first()
+        started = time.perf_counter()
+        reports = []
+        try:
+            # Все файлы импортируются одной транзакцией
+            for path in bank_files(args.paths):
+                report = import_file(path, created_by=owner.id if owner else None, commit=False)
+                reports.append(report)
+                print(f'{path}: "{report.title}" {report.questions} questions, {report.answers} answers')
+                for issue in report.issues:
+                    print(f'  {path}:{issue.line}: {issue.message}')
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error('Error importing question banks: %s', e)
+            raise
+        elapsed = time.perf_counter() - started
+        print(f'Imported {sum(r.questions for r in reports)} questions from {len(reports)} files in {elapsed:.3f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,17 @@
-from app import create_app, db, logger
+from flask_migrate import upgrade
+
+from app import create_app, logger
 
 def init_db():
     app = create_app()
     with app.app_context():
         try:
-            db.create_all()
+            # Миграции идемпотентны: создают новую БД и доводят существующую до текущей схемы
+            upgrade()
             logger.info('Database initialized successfully')
         except Exception as e:
-            logger.error(f'Error initializing database: {str(e)}')
+            logger.error('Error initializing database: %s', e)
             raise
 
 if __name__ == '__main__':
-    init_db()
\ No newline at end of file
+    init_db()
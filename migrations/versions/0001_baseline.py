@@ -0,0 +1,94 @@
+"""baseline: the original five tables
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-18 20:30:00.000000
+
+Databases older than the migrations (like the shipped quizmaster.db) already
+have these tables: every step skips what exists, so `flask db upgrade` works
+on them in place.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_baseline'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _has_table(name):
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade():
+    if not _has_table('user'):
+        op.create_table('user',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=64), nullable=True),
+        sa.Column('password_hash', sa.String(length=128), nullable=True),
+        sa.Column('is_admin', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('user', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_user_username'), ['username'], unique=True)
+
+    if not _has_table('quiz'):
+        op.create_table('quiz',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=128), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('created_by', sa.Integer(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(['created_by'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+    if not _has_table('question'):
+        op.create_table('question',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('quiz_id', sa.Integer(), nullable=True),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('order', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['quiz_id'], ['quiz.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+    if not _has_table('quiz_result'):
+        op.create_table('quiz_result',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('quiz_id', sa.Integer(), nullable=True),
+        sa.Column('score', sa.Float(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.Column('details', sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(['quiz_id'], ['quiz.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+    if not _has_table('answer'):
+        op.create_table('answer',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('question_id', sa.Integer(), nullable=True),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('is_correct', sa.Boolean(), nullable=True),
+        sa.Column('order', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['question_id'], ['question.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('answer')
+    op.drop_table('quiz_result')
+    op.drop_table('question')
+    op.drop_table('quiz')
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_username'))
+
+    op.drop_table('user')
@@ -0,0 +1,193 @@
+"""tables and columns added since the baseline
+
+Revision ID: 0002_feature_tables
+Revises: 0001_baseline
+Create Date: 2026-10-18 20:31:00.000000
+
+Responses, item statistics, question pools, attempts, one-time links,
+user.is_active and the full-text search index. Until now these came from
+create_all and startup code, so any of them may already exist: each step
+checks first.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_feature_tables'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+
+def _inspector():
+    return sa.inspect(op.get_bind())
+
+
+def _has_table(name):
+    return _inspector().has_table(name)
+
+
+def _has_index(table, name):
+    return any(index['name'] == name for index in _inspector().get_indexes(table))
+
+
+def _has_column(table, name):
+    return any(column['name'] == name for column in _inspector().get_columns(table))
+
+
+def _create_indexes(table, indexes):
+    missing = [(name, columns) for name, columns in indexes if not _has_index(table, name)]
+    if missing:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for name, columns in missing:
+                batch_op.create_index(name, columns, unique=False)
+
+
+def upgrade():
+    if not _has_table('quiz_response'):
+        op.create_table('quiz_response',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('result_id', sa.Integer(), nullable=False),
+        sa.Column('question_id', sa.Integer(), nullable=False),
+        sa.Column('is_correct', sa.Boolean(), nullable=True),
+        sa.Column('answer_ids', sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(['question_id'], ['question.id'], ),
+        sa.ForeignKeyConstraint(['result_id'], ['quiz_result.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+    _create_indexes('quiz_response', [('ix_quiz_response_question_id', ['question_id']),
+                                      ('ix_quiz_response_result_id', ['result_id'])])
+
+    if not _has_table('question_stat'):
+        op.create_table('question_stat',
+        sa.Column('question_id', sa.Integer(), nullable=False),
+        sa.Column('quiz_id', sa.Integer(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('correct', sa.Integer(), nullable=False),
+        sa.Column('score_sum', sa.Float(), nullable=False),
+        sa.Column('score_sum_correct', sa.Float(), nullable=False),
+        sa.Column('score_sum_sq', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['question_id'], ['question.id'], ),
+        sa.ForeignKeyConstraint(['quiz_id'], ['quiz.id'], ),
+        sa.PrimaryKeyConstraint('question_id')
+        )
+    _create_indexes('question_stat', [('ix_question_stat_quiz_id', ['quiz_id'])])
+
+    if not _has_table('answer_stat'):
+        op.create_table('answer_stat',
+        sa.Column('answer_id', sa.Integer(), nullable=False),
+        sa.Column('question_id', sa.Integer(), nullable=True),
+        sa.Column('picks', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['answer_id'], ['answer.id'], ),
+        sa.ForeignKeyConstraint(['question_id'], ['question.id'], ),
+        sa.PrimaryKeyConstraint('answer_id')
+        )
+    _create_indexes('answer_stat', [('ix_answer_stat_question_id', ['question_id'])])
+
+    if not _has_table('quiz_pool'):
+        op.create_table('quiz_pool',
+        sa.Column('quiz_id', sa.Integer(), nullable=False),
+        sa.Column('draw_count', sa.Integer(), nullable=False),
+        sa.Column('shuffle_answers', sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(['quiz_id'], ['quiz.id'], ),
+        sa.PrimaryKeyConstraint('quiz_id')
+        )
+
+    if not _has_table('quiz_attempt'):
+        op.create_table('quiz_attempt',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('quiz_id', sa.Integer(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('submitted_at', sa.DateTime(), nullable=True),
+        sa.Column('answers', sa.Text(), nullable=False),
+        sa.Column('result_id', sa.Integer(), nullable=True),
+        sa.Column('seed', sa.Integer(), nullable=True),
+        sa.Column('variant', sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(['quiz_id'], ['quiz.id'], ),
+        sa.ForeignKeyConstraint(['result_id'], ['quiz_result.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+    else:
+        # Попытки появились раньше вариантов: у первых таблиц нет seed и variant
+        for name, type_ in (('seed', sa.Integer()), ('variant', sa.Text())):
+            if not _has_column('quiz_attempt', name):
+                with op.batch_alter_table('quiz_attempt', schema=None) as batch_op:
+                    batch_op.add_column(sa.Column(name, type_, nullable=True))
+    _create_indexes('quiz_attempt', [('ix_quiz_attempt_quiz_id', ['quiz_id']),
+                                     ('ix_quiz_attempt_user_quiz_open', ['user_id', 'quiz_id', 'submitted_at'])])
+
+    if not _has_table('quiz_link_batch'):
+        op.create_table('quiz_link_batch',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('quiz_id', sa.Integer(), nullable=False),
+        sa.Column('created_by', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('revoked_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['created_by'], ['user.id'], ),
+        sa.ForeignKeyConstraint(['quiz_id'], ['quiz.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+    _create_indexes('quiz_link_batch', [('ix_quiz_link_batch_quiz_id', ['quiz_id'])])
+
+    if not _has_table('quiz_link_use'):
+        op.create_table('quiz_link_use',
+        sa.Column('batch_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('used_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['batch_id'], ['quiz_link_batch.id'], ),
+        sa.PrimaryKeyConstraint('batch_id', 'user_id'),
+        sqlite_with_rowid=False
+        )
+
+    if not _has_column('user', 'is_active'):
+        with op.batch_alter_table('user', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('is_active', sa.Boolean(), server_default=sa.text('1'), nullable=False))
+
+    _create_indexes('answer', [('ix_answer_question_id', ['question_id'])])
+
+    # Таблица FTS5 и триггеры: идемпотентный DDL из app.search, при старте приложение схему не меняет
+    from app import search
+    search.ensure_index(op.get_bind())
+
+
+def downgrade():
+    for statement in ('DROP TRIGGER IF EXISTS question_fts_ai', 'DROP TRIGGER IF EXISTS question_fts_au',
+                      'DROP TRIGGER IF EXISTS question_fts_ad', 'DROP TRIGGER IF EXISTS answer_fts_ai',
+                      'DROP TRIGGER IF EXISTS answer_fts_au', 'DROP TRIGGER IF EXISTS answer_fts_ad',
+                      'DROP TABLE IF EXISTS question_fts', 'DROP TABLE IF EXISTS search_state',
+                      'DROP INDEX IF EXISTS ix_answer_question_id'):
+        op.execute(statement)
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('is_active')
+
+    op.drop_table('quiz_link_use')
+    with op.batch_alter_table('quiz_link_batch', schema=None) as batch_op:
+        batch_op.drop_index('ix_quiz_link_batch_quiz_id')
+
+    op.drop_table('quiz_link_batch')
+    with op.batch_alter_table('quiz_attempt', schema=None) as batch_op:
+        batch_op.drop_index('ix_quiz_attempt_user_quiz_open')
+        batch_op.drop_index('ix_quiz_attempt_quiz_id')
+
+    op.drop_table('quiz_attempt')
+    op.drop_table('quiz_pool')
+    with op.batch_alter_table('answer_stat', schema=None) as batch_op:
+        batch_op.drop_index('ix_answer_stat_question_id')
+
+    op.drop_table('answer_stat')
+    with op.batch_alter_table('question_stat', schema=None) as batch_op:
+        batch_op.drop_index('ix_question_stat_quiz_id')
+
+    op.drop_table('question_stat')
+    with op.batch_alter_table('quiz_response', schema=None) as batch_op:
+        batch_op.drop_index('ix_quiz_response_result_id')
+        batch_op.drop_index('ix_quiz_response_question_id')
+
+    op.drop_table('quiz_response')
@@ -0,0 +1,45 @@
+"""composite indexes for the hot query shapes
+
+Revision ID: 0003_hot_path_indexes
+Revises: 0002_feature_tables
+Create Date: 2026-10-18 20:32:00.000000
+
+question (quiz_id, order): compile_quiz, behind take_quiz, payload and submit.
+quiz_result (user_id, quiz_id, completed_at): the latest result of a user.
+quiz_result (quiz_id, completed_at), (completed_at), (score): the results
+list and its sort orders. user lower(username): prefix search of users
+in the results filter and the user list. answer.question_id is covered by
+ix_answer_question_id from 0002. Checked by audit_queries.py.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_hot_path_indexes'
+down_revision = '0002_feature_tables'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('question', 'ix_question_quiz_order', ['quiz_id', 'order']),
+    ('quiz_result', 'ix_quiz_result_user_quiz_completed', ['user_id', 'quiz_id', 'completed_at']),
+    ('quiz_result', 'ix_quiz_result_quiz_completed', ['quiz_id', 'completed_at']),
+    ('quiz_result', 'ix_quiz_result_completed', ['completed_at']),
+    ('quiz_result', 'ix_quiz_result_score', ['score']),
+    ('user', 'ix_user_username_lower', [sa.text('lower(username)')]),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    existing = {table: {index['name'] for index in inspector.get_indexes(table)}
+                for table in {table for table, _, _ in INDEXES}}
+    for table, name, columns in INDEXES:
+        if name not in existing[table]:
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for table, name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
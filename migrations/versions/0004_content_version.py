@@ -0,0 +1,32 @@
+"""content_version: quiz content changes visible to every process
+
+Revision ID: 0004_content_version
+Revises: 0003_hot_path_indexes
+Create Date: 2026-10-18 22:10:00.000000
+
+Triggers on quiz, question, answer and quiz_pool bump a single counter row.
+The compiled quiz cache of each process reads it at most every
+QUIZ_CACHE_CHECK_SECONDS and drops itself when it moved, so edits from
+another worker, the CLI importer or a regrade no longer leave stale
+quizzes, answer keys and fragments behind.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_content_version'
+down_revision = '0003_hot_path_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    from app import quiz_cache
+    quiz_cache.ensure_version_table(op.get_bind())
+
+
+def downgrade():
+    from app import quiz_cache
+    for name in quiz_cache.VERSION_TRIGGERS:
+        op.execute(f'DROP TRIGGER IF EXISTS {name}')
+    op.execute('DROP TABLE IF EXISTS content_version')
@@ -0,0 +1,32 @@
+"""index the results sort key coalesce(score, 0) instead of score
+
+Revision ID: 0005_result_score_value_index
+Revises: 0004_content_version
+Create Date: 2026-10-18 22:40:00.000000
+
+The results list sorts and pages by coalesce(score, 0) so that results
+without a score keep their place in the keyset cursor. The plain score
+index served only that sort and is replaced.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_result_score_value_index'
+down_revision = '0004_content_version'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('quiz_result')}
+    if 'ix_quiz_result_score_value' not in existing:
+        op.create_index('ix_quiz_result_score_value', 'quiz_result', [sa.text('coalesce(score, 0)')], unique=False)
+    if 'ix_quiz_result_score' in existing:
+        op.drop_index('ix_quiz_result_score', table_name='quiz_result')
+
+
+def downgrade():
+    op.create_index('ix_quiz_result_score', 'quiz_result', ['score'], unique=False)
+    op.drop_index('ix_quiz_result_score_value', table_name='quiz_result')
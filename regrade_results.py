@@ -0,0 +1,30 @@
+import argparse
+
+from app import create_app, logger
+from app.regrade import regrade_quiz, DEFAULT_CHUNK_SIZE
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-score stored quiz results against the current answer key')
+    parser.add_argument('quiz_id', type=int)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        def progress(stats):
+            print(f'{stats["processed"]} results processed ({stats["rate"]:.0f}/s)')
+
+        try:
+            stats = regrade_quiz(args.quiz_id, args.chunk_size, progress=progress)
+        except Exception as e:
+            logger.error('Error regrading quiz %s: %s', args.quiz_id, e)
+            raise
+        print(f'Updated {stats["updated"]} of {stats["processed"]} results in {stats["elapsed"]:.2f}s, '
+              f'{stats["failed"]} failed, {stats["skipped"]} skipped (questions deleted since), '
+              f'{stats["kept"]} answers kept (edited since), '
+              f'{stats["lowered"]} scores lowered')
+
+
+if __name__ == '__main__':
+    main()
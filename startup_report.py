@@ -0,0 +1,37 @@
+import argparse
+import os
+import shutil
+import time
+
+from app import create_app
+from app.config import Config
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure app startup: import, app factory and warm-up phases')
+    parser.add_argument('--precompile', action='store_true', help='precompile all templates at startup')
+    parser.add_argument('--warm', action='store_true', help='compile active quizzes and answer keys at startup')
+    parser.add_argument('--clear-cache', action='store_true', help='delete the template bytecode cache first')
+    args = parser.parse_args()
+
+    class StartupConfig(Config):
+        STARTUP_PRECOMPILE_TEMPLATES = args.precompile or Config.STARTUP_PRECOMPILE_TEMPLATES
+        STARTUP_WARM_QUIZZES = args.warm or Config.STARTUP_WARM_QUIZZES
+
+    if args.clear_cache and Config.TEMPLATE_CACHE_DIR and os.path.isdir(Config.TEMPLATE_CACHE_DIR):
+        shutil.rmtree(Config.TEMPLATE_CACHE_DIR)
+
+    app = create_app(StartupConfig)
+    timer = app.extensions['startup']
+
+    # Первый запрос показывает, что осталось оплатить первому пользователю
+    started = time.perf_counter()
+    response = app.test_client().get('/auth/login')
+    first_request = time.perf_counter() - started
+
+    print(timer.report())
+    print(f'first request (/auth/login, {response.status_code}): {first_request * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import flask_migrate
+import pytest
+
+from app import create_app, db, quiz_cache, user_cache, attempts, submission_queue
+from app.config import Config
+from app.models import User, Quiz, Question, Answer
+
+
+@pytest.fixture
+def app(tmp_path):
+    """App on a fresh database migrated to head, one per test"""
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'test.db')
+        LOG_FOLDER = str(tmp_path / 'logs')
+        LOG_ASYNC = False
+        TEMPLATE_CACHE_DIR = str(tmp_path / 'jinja')
+        SUBMIT_QUEUE_MODE = 'off'
+        QUIZ_CACHE_CHECK_SECONDS = 0
+
+    # Кэши модульные, а id в новой базе начинаются заново
+    quiz_cache.invalidate()
+    user_cache.invalidate()
+    app = create_app(TestConfig)
+    with app.app_context():
+        flask_migrate.upgrade()
+    yield app
+    # Фоновые писатели останавливаются до удаления базы
+    queue = submission_queue.get_queue(app)
+    if queue is not None:
+        queue.stop()
+    attempts.get_buffer(app).stop()
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    quiz_cache.invalidate()
+    user_cache.invalidate()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def make_user(username, is_admin=False):
+    user = User(username=username, is_admin=is_admin)
+    user.set_password('secret')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def make_quiz(questions, title='Quiz'):
+    """Quiz from [(question text, [(answer text, is_correct), ...]), ...]"""
+    quiz = Quiz(title=title, is_active=True)
+    db.session.add(quiz)
+    db.session.flush()
+    for order, (text, answers) in enumerate(questions, 1):
+        question = Question(quiz_id=quiz.id, text=text, order=order)
+        db.session.add(question)
+        db.session.flush()
+        for a_order, (a_text, is_correct) in enumerate(answers, 1):
+            db.session.add(Answer(question_id=question.id, text=a_text, is_correct=is_correct, order=a_order))
+    db.session.commit()
+    return quiz
+
+
+def login(client, user):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
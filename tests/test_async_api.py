@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+from flask_login.utils import encode_cookie
+
+from app.async_api import create_asgi_app
+from app.models import Question
+
+from conftest import make_user, make_quiz
+
+
+def _call(asgi_app, method, path, cookies=None, body=b''):
+    """One request through the ASGI app; returns (status, JSON body)"""
+    headers = [(b'content-type', b'application/json')]
+    if cookies:
+        headers.append((b'cookie', '; '.join(f'{k}={v}' for k, v in cookies.items()).encode()))
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+             'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+             'root_path': '', 'headers': headers, 'client': ('127.0.0.1', 1), 'server': ('testserver', 80)}
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        await asgi_app(scope, receive, send)
+        await asgi_app.state.api.engine.dispose()
+
+    asyncio.run(run())
+    status = next(m['status'] for m in sent if m['type'] == 'http.response.start')
+    data = b''.join(m.get('body', b'') for m in sent if m['type'] == 'http.response.body')
+    return status, json.loads(data) if data else None
+
+
+def _setup(app):
+    with app.app_context():
+        user = make_user('student')
+        quiz = make_quiz([('Q1', [('a', True), ('b', False)])])
+        question = Question.query.filter_by(quiz_id=quiz.id).one()
+        answers = {str(question.id): [question.answers.first().id]}
+        remember = encode_cookie(str(user.id))
+        return quiz.id, answers, remember
+
+
+def test_remember_cookie_logs_in_without_a_session(app):
+    quiz_id, answers, remember = _setup(app)
+    asgi_app = create_asgi_app(app)
+    path = f'/api/quizzes/{quiz_id}/submit'
+
+    assert _call(asgi_app, 'POST', path, body=json.dumps(answers).encode())[0] == 401
+    assert _call(asgi_app, 'POST', path, cookies={'remember_token': remember + 'x'},
+                 body=json.dumps(answers).encode())[0] == 401
+
+    status, data = _call(asgi_app, 'POST', path, cookies={'remember_token': remember},
+                         body=json.dumps(answers).encode())
+    assert status == 200
+    assert data['correct_count'] == 1
+
+
+def test_submit_without_a_valid_body_is_a_bad_request(app):
+    quiz_id, _, remember = _setup(app)
+    asgi_app = create_asgi_app(app)
+    path = f'/api/quizzes/{quiz_id}/submit'
+
+    for body in (b'', b'not json', b'[1, 2]', b'{"1": 5}'):
+        status, data = _call(asgi_app, 'POST', path, cookies={'remember_token': remember}, body=body)
+        assert status == 400, body
+        assert data['success'] is False
@@ -0,0 +1,83 @@
+import threading
+
+from app import attempts
+from app.models import Question
+
+from conftest import make_user, make_quiz, login
+
+
+def _attempt(app, client):
+    with app.app_context():
+        user = make_user('student')
+        quiz = make_quiz([('Q1', [('a', True), ('b', False)]),
+                          ('Q2', [('c', True), ('d', False)])])
+        answers = {q.id: q.answers.first().id for q in Question.query.filter_by(quiz_id=quiz.id)}
+        login(client, user)
+        quiz_id = quiz.id
+    attempt_id = client.post(f'/quizzes/{quiz_id}/attempt').get_json()['attempt_id']
+    for question_id, answer_id in answers.items():
+        response = client.post(f'/quizzes/attempts/{attempt_id}/answer',
+                               json={'question_id': question_id, 'answer_ids': [answer_id]})
+        assert response.status_code == 200
+    return attempt_id
+
+
+def _hold_background_flush(app, monkeypatch):
+    """Start a full flush in another thread and stop it between the swap and the write"""
+    buffer = attempts.get_buffer(app)
+    taken, release = threading.Event(), threading.Event()
+    write = buffer._write
+
+    def slow_write(batch):
+        if threading.current_thread().name == 'test-flush':
+            taken.set()
+            release.wait(5)
+        write(batch)
+
+    monkeypatch.setattr(buffer, '_write', slow_write)
+
+    def run():
+        with app.app_context():
+            buffer.flush()
+
+    flusher = threading.Thread(target=run, name='test-flush')
+    flusher.start()
+    assert taken.wait(5)
+    return flusher, release
+
+
+def test_submit_waits_for_answers_taken_by_a_background_flush(app, client, monkeypatch):
+    attempt_id = _attempt(app, client)
+    buffer = attempts.get_buffer(app)
+    flusher, release = _hold_background_flush(app, monkeypatch)
+    assert buffer._pending == {}  # ответы уже забраны фоновым сбросом, но не записаны
+
+    responses = []
+    submit = threading.Thread(target=lambda: responses.append(
+        client.post(f'/quizzes/attempts/{attempt_id}/submit', json={'answers': {}})))
+    submit.start()
+    submit.join(0.3)
+    assert submit.is_alive()  # ждет сброса, а не оценивает без этих ответов
+    release.set()
+    submit.join(5)
+    flusher.join(5)
+
+    data = responses[0].get_json()
+    assert data['correct_count'] == 2
+    assert data['total_questions'] == 2
+
+
+def test_pending_for_waits_for_a_flush_in_progress(app, client, monkeypatch):
+    attempt_id = _attempt(app, client)
+    buffer = attempts.get_buffer(app)
+    flusher, release = _hold_background_flush(app, monkeypatch)
+
+    seen = []
+    reader = threading.Thread(target=lambda: seen.append(buffer.pending_for(attempt_id)))
+    reader.start()
+    reader.join(0.3)
+    assert reader.is_alive()
+    release.set()
+    reader.join(5)
+    flusher.join(5)
+    assert seen == [{}]
@@ -0,0 +1,53 @@
+from app import db
+from app.models import User, Quiz
+
+from conftest import make_user, make_quiz, login
+
+
+def _setup(app, client):
+    with app.app_context():
+        user = make_user('student')
+        quiz_id = make_quiz([('Q1', [('a', True)])]).id
+        login(client, user)
+        return user.id, quiz_id
+
+
+def test_unchanged_page_is_not_modified(app, client):
+    _, quiz_id = _setup(app, client)
+
+    for url in ('/quizzes/', f'/quizzes/{quiz_id}/take'):
+        response = client.get(url)
+        assert response.status_code == 200
+        etag = response.headers['ETag']
+        assert 'no-cache' in response.headers['Cache-Control']
+
+        again = client.get(url, headers={'If-None-Match': etag})
+        assert again.status_code == 304
+        assert again.get_data() == b''
+        assert again.headers['ETag'] == etag
+
+
+def test_quiz_change_refreshes_the_page(app, client):
+    _, quiz_id = _setup(app, client)
+    etag = client.get(f'/quizzes/{quiz_id}/take').headers['ETag']
+
+    with app.app_context():
+        db.session.get(Quiz, quiz_id).title = 'Renamed'
+        db.session.commit()
+
+    response = client.get(f'/quizzes/{quiz_id}/take', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'Renamed' in response.get_data(as_text=True)
+
+
+def test_role_change_refreshes_the_navbar(app, client):
+    user_id, _ = _setup(app, client)
+    etag = client.get('/quizzes/').headers['ETag']
+
+    with app.app_context():
+        db.session.get(User, user_id).is_admin = True
+        db.session.commit()
+
+    response = client.get('/quizzes/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
@@ -0,0 +1,71 @@
+import json
+import sqlite3
+
+import pytest
+
+from app import db, grading, item_stats, responses
+from app.models import Question, QuizResult, QuizResponse, QuestionStat, AnswerStat, QuizAttempt, Quiz
+
+from conftest import make_user, make_quiz, login
+
+
+def _submit(user, quiz_id, user_answers):
+    full_results = grading.grade(grading.get_answer_key(quiz_id), user_answers)
+    score = grading.score(full_results)
+    result = QuizResult(user_id=user.id, quiz_id=quiz_id, score=score, details=json.dumps(full_results))
+    db.session.add(result)
+    db.session.flush()
+    responses.insert_responses(responses.response_rows(result.id, full_results['results']))
+    item_stats.record_submission(quiz_id, score, full_results['results'])
+    db.session.commit()
+
+
+def _setup():
+    user = make_user('student')
+    quiz = make_quiz([('Q1', [('a', True), ('b', False)])])
+    question = Question.query.filter_by(quiz_id=quiz.id).one()
+    answer_id = question.answers.first().id
+    _submit(user, quiz.id, {question.id: [answer_id]})
+    return user, quiz.id, question.id
+
+
+def test_rebuild_blocks_writers_between_reads_and_replace(app, monkeypatch):
+    with app.app_context():
+        _, quiz_id, question_id = _setup()
+        database_path = db.engine.url.database
+        read_chunks = item_stats._iter_response_chunks
+
+        def chunks_then_write(*args):
+            yield from read_chunks(*args)
+            # Отправка из другого соединения посреди пересборки должна ждать ее коммита
+            other = sqlite3.connect(database_path, timeout=0)
+            try:
+                with pytest.raises(sqlite3.OperationalError, match='locked'):
+                    other.execute('UPDATE quiz_result SET score = score')
+            finally:
+                other.close()
+
+        monkeypatch.setattr(item_stats, '_iter_response_chunks', chunks_then_write)
+        stats = item_stats.rebuild(quiz_id)
+
+        assert stats['responses'] == 1
+        assert db.session.get(QuestionStat, question_id).attempts == 1
+
+
+def test_delete_quiz_removes_dependent_rows(app, client):
+    with app.app_context():
+        user, quiz_id, question_id = _setup()
+        db.session.add(QuizAttempt(user_id=user.id, quiz_id=quiz_id, answers='{}'))
+        db.session.commit()
+        login(client, make_user('admin', is_admin=True))
+
+    assert client.post(f'/admin/delete/{quiz_id}').get_json()['success']
+
+    with app.app_context():
+        assert db.session.get(Quiz, quiz_id) is None
+        assert QuestionStat.query.count() == 0
+        assert AnswerStat.query.count() == 0
+        assert QuizResponse.query.count() == 0
+        assert QuizAttempt.query.count() == 0
+        # Результаты остаются, как и раньше
+        assert QuizResult.query.count() == 1
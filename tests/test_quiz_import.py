@@ -0,0 +1,60 @@
+import os
+
+from app.quiz_import import BankParser
+
+BANKS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'zquiz')
+
+
+def _parse(name):
+    parser = BankParser()
+    with open(os.path.join(BANKS, name), encoding='utf-8-sig') as f:
+        return parser, list(parser.parse(f))
+
+
+def _correct(question):
+    return [a['text'] for a in question['answers'] if a['is_correct']]
+
+
+def test_sample_bank_with_header_and_answer_comments():
+    parser, questions = _parse('z_1.txt')
+
+    assert parser.title == 'Вопросы по администрированию PostgreSQL'
+    assert parser.issues == []
+    assert len(questions) == 50
+    first = questions[0]
+    assert first['line'] == 2
+    assert first['text'] == 'Какой файл конфигурации отвечает за параметры аутентификации и подключения клиентов?'
+    assert _correct(first) == ['pg_hba.conf']
+    assert len(_correct(questions[22])) == 2  # "a, b"
+    # "b (для plain-формата). pg_restore для ..." — комментарий после буквы
+    assert _correct(questions[23]) == ['psql']
+
+
+def test_sample_bank_with_letter_runs():
+    parser, questions = _parse('101-500_1.txt')
+
+    assert parser.issues == []
+    assert len(questions) == 63
+    init_systems = next(q for q in questions if 'init systems' in q['text'])
+    assert _correct(init_systems) == ['systemd', 'Upstart', 'SysV init']  # "BCE"
+
+
+def _answer(value):
+    parser = BankParser()
+    lines = ['1. Question', 'a) one', 'b) two', 'c) three', f'Answer: {value}']
+    return parser, list(parser.parse(lines))
+
+
+def test_every_letter_of_the_answer_line_is_read():
+    for value in ('A and B', 'a, b', 'AB', 'a и b', 'a/b'):
+        parser, questions = _answer(value)
+        assert parser.issues == []
+        assert _correct(questions[0]) == ['one', 'two'], value
+
+
+def test_unreadable_answer_line_is_an_issue():
+    parser, questions = _answer('b or maybe c')
+
+    assert questions == []
+    assert [(issue.line, issue.message) for issue in parser.issues] == \
+        [(5, 'cannot read "b or maybe c" as option letters')]
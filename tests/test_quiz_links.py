@@ -0,0 +1,68 @@
+from app import db, quiz_links
+from app.models import QuizLinkUse
+
+from conftest import make_user, make_quiz, login
+
+
+def _mint(quiz_id, users):
+    batch, links = quiz_links.mint(quiz_id, users, 24)
+    db.session.commit()
+    return batch.id, dict(links)
+
+
+def test_resolve_users_skips_admins_and_inactive_users(app):
+    with app.app_context():
+        make_user('student')
+        make_user('teacher', is_admin=True)
+        make_user('gone').is_active = False
+        db.session.commit()
+
+        assert [row.username for row in quiz_links.resolve_users(['teacher', 'student', 'gone'])] == ['student']
+        assert [row.username for row in quiz_links.resolve_users()] == ['student']
+
+
+def test_mint_form_skips_admins(app, client):
+    with app.app_context():
+        make_user('student')
+        login(client, make_user('teacher', is_admin=True))
+        quiz_id = make_quiz([('Q1', [('a', True)])]).id
+
+    response = client.post(f'/admin/links/{quiz_id}', data={'usernames': 'teacher\nstudent', 'hours': '1'})
+
+    assert response.status_code == 200
+    rows = response.get_data(as_text=True).splitlines()
+    assert [row.split(',')[0] for row in rows[1:]] == ['student']
+
+
+def test_link_of_an_admin_does_not_log_in(app, client):
+    with app.app_context():
+        admin = make_user('teacher', is_admin=True)
+        quiz_id = make_quiz([('Q1', [('a', True)])]).id
+        # Партия со ссылкой администратора, выпущенная до исправления
+        _, links = _mint(quiz_id, [(admin.id, admin.username)])
+
+    response = client.get(f'/quizzes/link/{links["teacher"]}')
+
+    assert response.status_code == 302
+    assert '/auth/login' in response.headers['Location']
+    with client.session_transaction() as session:
+        assert '_user_id' not in session
+    with app.app_context():
+        assert QuizLinkUse.query.count() == 0
+
+
+def test_link_logs_the_student_in_once(app, client):
+    with app.app_context():
+        student = make_user('student')
+        quiz_id = make_quiz([('Q1', [('a', True)])]).id
+        _, links = _mint(quiz_id, [(student.id, student.username)])
+        student_id = student.id
+
+    response = client.get(f'/quizzes/link/{links["student"]}')
+    assert response.headers['Location'].endswith(f'/quizzes/{quiz_id}/take')
+    with client.session_transaction() as session:
+        assert session['_user_id'] == str(student_id)
+
+    other = app.test_client()
+    response = other.get(f'/quizzes/link/{links["student"]}')
+    assert '/auth/login' in response.headers['Location']
@@ -0,0 +1,27 @@
+from app import db, quiz_store
+from app.models import Question, Answer, AnswerStat
+
+from conftest import make_quiz
+
+
+def test_sync_answers_keeps_ids_and_drops_stats_of_removed_answers(app):
+    with app.app_context():
+        quiz = make_quiz([('Q1', [('a', True), ('b', False), ('c', False)])])
+        question = Question.query.filter_by(quiz_id=quiz.id).one()
+        a, b, c = question.answers.order_by(Answer.order).all()
+        db.session.add_all([AnswerStat(answer_id=answer.id, question_id=question.id, picks=3)
+                            for answer in (a, b, c)])
+        db.session.commit()
+
+        changed = quiz_store.sync_answers(question, [a, b, c], [
+            {'id': a.id, 'text': 'a', 'is_correct': True},
+            {'id': None, 'text': 'c', 'is_correct': True},
+            {'id': None, 'text': 'd', 'is_correct': False},
+        ])
+        db.session.commit()
+
+        rows = Answer.query.filter_by(question_id=question.id).order_by(Answer.order).all()
+        assert [(row.text, row.is_correct) for row in rows] == [('a', True), ('c', True), ('d', False)]
+        assert rows[0].id == a.id and rows[1].id == c.id
+        assert changed == 3  # c обновлен, d добавлен, b удален
+        assert {stat.answer_id for stat in AnswerStat.query.all()} == {a.id, c.id}
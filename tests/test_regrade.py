@@ -0,0 +1,95 @@
+import json
+
+from app import db, quiz_cache, grading, regrade
+from app.models import Question, Answer, QuizResult
+
+from conftest import make_user, make_quiz
+
+
+def _store_result(user, quiz_id, user_answers):
+    full_results = grading.grade(grading.get_answer_key(quiz_id), user_answers)
+    result = QuizResult(user_id=user.id, quiz_id=quiz_id, score=grading.score(full_results),
+                        details=json.dumps(full_results))
+    db.session.add(result)
+    db.session.commit()
+    return result.id
+
+
+def _setup(app):
+    user = make_user('student')
+    quiz = make_quiz([('Q1', [('a', True), ('b', False)]),
+                      ('Q2', [('c', True), ('d', False)])])
+    q1, q2 = Question.query.filter_by(quiz_id=quiz.id).order_by(Question.order).all()
+    answers = {q.id: [a.id for a in Answer.query.filter_by(question_id=q.id).order_by(Answer.order)]
+               for q in (q1, q2)}
+    result_id = _store_result(user, quiz.id, {q1.id: [answers[q1.id][0]], q2.id: [answers[q2.id][0]]})
+    return quiz.id, q1, q2, result_id
+
+
+def _replace_answers(question, answers):
+    """What the old edit_question did: delete the answers and insert them again"""
+    Answer.query.filter_by(question_id=question.id).delete()
+    for order, (text, is_correct) in enumerate(answers, 1):
+        db.session.add(Answer(question_id=question.id, text=text, is_correct=is_correct, order=order))
+    db.session.commit()
+    quiz_cache.invalidate(question.quiz_id)
+
+
+def test_regrade_keeps_verdicts_of_replaced_answers(app):
+    with app.app_context():
+        quiz_id, q1, q2, result_id = _setup(app)
+        _replace_answers(q1, [('a', True), ('b', False)])
+
+        stats = regrade.regrade_quiz(quiz_id)
+
+        assert stats['updated'] == 1
+        assert stats['kept'] == 1
+        assert stats['lowered'] == 0
+        result = db.session.get(QuizResult, result_id)
+        assert result.score == 100
+        details = json.loads(result.details)
+        assert details['correct_count'] == 2
+        assert all(item['is_correct'] for item in details['results'])
+
+
+def test_regrade_reports_lowered_scores(app):
+    with app.app_context():
+        quiz_id, q1, q2, result_id = _setup(app)
+        # Исправленный ключ: правильным стал второй ответ Q2
+        for answer in Answer.query.filter_by(question_id=q2.id):
+            answer.is_correct = not answer.is_correct
+        db.session.commit()
+        quiz_cache.invalidate(quiz_id)
+
+        stats = regrade.regrade_quiz(quiz_id)
+
+        assert stats['kept'] == 0
+        assert stats['lowered'] == 1
+        assert db.session.get(QuizResult, result_id).score == 50
+
+
+def test_regrade_skips_results_with_deleted_questions(app):
+    with app.app_context():
+        quiz_id, q1, q2, result_id = _setup(app)
+        db.session.delete(q1)
+        db.session.commit()
+        quiz_cache.invalidate(quiz_id)
+        details_before = db.session.get(QuizResult, result_id).details
+
+        stats = regrade.regrade_quiz(quiz_id)
+
+        assert stats['skipped'] == 1
+        assert stats['updated'] == 0
+        result = db.session.get(QuizResult, result_id)
+        assert result.score == 100
+        assert result.details == details_before
+
+
+def test_grade_ignores_questions_outside_the_key(app):
+    with app.app_context():
+        quiz_id, q1, q2, _ = _setup(app)
+        key = grading.get_answer_key(quiz_id)
+        full_results = grading.grade(key, {q1.id: [], 999999: []})
+        assert full_results['correct_count'] == 0
+        assert full_results['total_questions'] == 2
+        assert [item['question_id'] for item in full_results['results']] == [q1.id]
@@ -0,0 +1,74 @@
+import csv
+import gzip
+import io
+
+from app import db, grading, results_export, submission_queue
+from app.models import Question
+
+from conftest import make_user, make_quiz, login
+
+
+def _setup(app, client):
+    with app.app_context():
+        login(client, make_user('teacher', is_admin=True))
+        student = make_user('@student')
+        quiz = make_quiz([('=SUM(A1:A9)', [('-1', True), ('+1', False)]), ('Plain', [('ok', True)])])
+        questions = Question.query.filter_by(quiz_id=quiz.id).order_by(Question.order).all()
+        answers = {q.id: [q.answers.first().id] for q in questions}
+        full_results = grading.grade(grading.get_answer_key(quiz.id), answers)
+        pending = submission_queue.make_pending(student.id, quiz.id, grading.score(full_results), full_results)
+        submission_queue.store_results([pending])
+        db.session.commit()
+
+
+def _rows(data):
+    text = data.decode('utf-8')
+    assert text.startswith('\ufeff')
+    return list(csv.reader(io.StringIO(text[1:])))
+
+
+def test_csv_export_escapes_formulas(app, client):
+    _setup(app, client)
+
+    response = client.get('/admin/results/export?format=csv')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'].endswith('.csv"')
+    header, first, second = _rows(response.get_data())
+    assert header == results_export.DETAIL_COLUMNS
+    row = dict(zip(header, first))
+    assert row['username'] == "'@student"
+    assert row['question'] == "'=SUM(A1:A9)"
+    assert row['user_answers'] == "'-1"
+    assert row['score'] == '100.0'
+    assert dict(zip(header, second))['question'] == 'Plain'
+
+
+def test_gzip_export_is_the_same_csv(app, client):
+    _setup(app, client)
+    plain = client.get('/admin/results/export?format=csv&detail=summary').get_data()
+
+    response = client.get('/admin/results/export?format=csv&detail=summary&gzip=1')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/gzip'
+    assert response.headers['Content-Disposition'].endswith('.csv.gz"')
+    assert gzip.decompress(response.get_data()) == plain
+    header, row = _rows(plain)
+    assert header == results_export.SUMMARY_COLUMNS
+    assert row[-2:] == ['2', '2']
+
+
+def test_csv_chunks_stream_valid_gzip(monkeypatch):
+    monkeypatch.setattr(results_export, 'CHUNK_SIZE', 64)
+    rows = [[n, f'=cmd{n}', 'text'] for n in range(100)]
+
+    plain = list(results_export.csv_chunks(['n', 'value', 'text'], iter(rows)))
+    chunks = list(results_export.csv_chunks(['n', 'value', 'text'], iter(rows), compress=True))
+
+    assert len(plain) > 2 and len(chunks) >= 2
+    # Заголовок уходит сразу и уже распаковывается сам по себе
+    assert gzip.GzipFile(fileobj=io.BytesIO(chunks[0])).read1() == plain[0]
+    assert gzip.decompress(b''.join(chunks)) == b''.join(plain)
+    assert _rows(b''.join(plain))[1] == ['0', "'=cmd0", 'text']
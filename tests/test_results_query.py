@@ -0,0 +1,25 @@
+from werkzeug.datastructures import MultiDict
+
+from app import db, results_query
+from app.models import QuizResult
+
+from conftest import make_user, make_quiz
+
+
+def test_score_pages_walk_past_results_without_score(app):
+    with app.app_context():
+        user = make_user('student')
+        quiz = make_quiz([('Q1', [('a', True)])])
+        scores = [None, 50.0, None, 100.0, 0.0, None]
+        db.session.add_all([QuizResult(user_id=user.id, quiz_id=quiz.id, score=score) for score in scores])
+        db.session.commit()
+
+        for order in ('desc', 'asc'):
+            filters = results_query.parse_filters(MultiDict({'sort': 'score', 'order': order}))
+            seen, cursor = [], None
+            while True:
+                items, cursor = results_query.fetch_page(filters, cursor=cursor, limit=1)
+                seen.extend(item['id'] for item in items)
+                if cursor is None:
+                    break
+            assert sorted(seen) == list(range(1, len(scores) + 1))
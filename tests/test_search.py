@@ -0,0 +1,84 @@
+from sqlalchemy import text
+
+from app import db, quiz_store, search
+from app.models import Question, Answer
+
+from conftest import make_quiz
+
+
+def _found(query):
+    return [row['question_id'] for row in search.search(query)]
+
+
+def _fts_rows():
+    return db.session.execute(text('SELECT rowid, question, answers FROM question_fts ORDER BY rowid')).all()
+
+
+def test_triggers_keep_the_index_in_sync(app):
+    with app.app_context():
+        quiz = make_quiz([('Which file holds client authentication rules?',
+                           [('pg_hba.conf', True), ('postgresql.conf', False)])])
+        question = Question.query.filter_by(quiz_id=quiz.id).one()
+        assert _found('authentication') == [question.id]
+        assert _found('pg_hba.conf') == [question.id]
+
+        question.text = 'Which file maps OS users to roles?'
+        db.session.commit()
+        assert _found('authentication') == []
+        assert _found('maps') == [question.id]
+
+        answer = Answer.query.filter_by(question_id=question.id, text='pg_hba.conf').one()
+        answer.text = 'pg_ident.conf'
+        db.session.commit()
+        assert _found('pg_hba') == []
+        assert _found('pg_ident') == [question.id]
+
+        db.session.delete(answer)
+        db.session.commit()
+        assert _found('pg_ident') == []
+
+        db.session.delete(question)
+        db.session.commit()
+        assert _found('maps') == []
+        assert _fts_rows() == []
+
+
+def test_bulk_insert_defers_the_triggers_and_indexes_once(app):
+    with app.app_context():
+        quiz_id = make_quiz([]).id
+        question_ids = quiz_store.insert_questions(quiz_id, [
+            {'text': f'Bulk question {n}', 'answers': [{'text': f'option{n} one', 'is_correct': True},
+                                                       {'text': f'option{n} two', 'is_correct': False}]}
+            for n in range(3)
+        ])
+        db.session.commit()
+
+        assert db.session.execute(text('SELECT deferred FROM search_state')).scalar() == 0
+        assert [(row[0], row[2]) for row in _fts_rows()] == \
+            [(q_id, f'option{n} one option{n} two') for n, q_id in enumerate(question_ids)]
+        assert sorted(_found('bulk question')) == sorted(question_ids)
+        assert _found('option1') == [question_ids[1]]
+
+        # Триггеры снова включены после массовой вставки
+        db.session.add(Answer(question_id=question_ids[0], text='late', is_correct=False, order=3))
+        db.session.commit()
+        assert _found('late') == [question_ids[0]]
+
+
+def test_rebuild_restores_a_lost_index(app):
+    with app.app_context():
+        make_quiz([('Checkpoint tuning', [('max_wal_size', True)])])
+        before = _fts_rows()
+        db.session.execute(text('DELETE FROM question_fts'))
+        db.session.commit()
+        assert _found('checkpoint') == []
+
+        search.rebuild_index()
+        db.session.commit()
+        assert _fts_rows() == before
+        assert len(_found('checkpoint')) == 1
+
+
+def test_match_query_quotes_operators():
+    assert search.match_query('pg_hba.conf AND -r') == '"pg_hba" "conf" "and" "r"*'
+    assert search.match_query('  ...  ') is None
@@ -0,0 +1,24 @@
+import sqlite3
+
+from app import create_app
+from app.config import Config
+
+
+def test_startup_does_not_change_the_schema(tmp_path):
+    path = tmp_path / 'old.db'
+    sqlite3.connect(path).executescript(
+        'CREATE TABLE question (id INTEGER PRIMARY KEY, quiz_id INTEGER, text TEXT, "order" INTEGER);'
+        'CREATE TABLE answer (id INTEGER PRIMARY KEY, question_id INTEGER, text TEXT, is_correct BOOLEAN, "order" INTEGER);'
+    )
+
+    class OldDatabase(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{path}'
+        LOG_FOLDER = str(tmp_path / 'logs')
+        LOG_ASYNC = False
+        TEMPLATE_CACHE_DIR = str(tmp_path / 'jinja')
+        SUBMIT_QUEUE_MODE = 'off'
+
+    create_app(OldDatabase)
+
+    names = {row[0] for row in sqlite3.connect(path).execute('SELECT name FROM sqlite_master')}
+    assert names == {'question', 'answer'}
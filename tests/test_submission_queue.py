@@ -0,0 +1,140 @@
+import threading
+
+import pytest
+
+from app import db, submission_queue
+from app.models import Question, QuizAttempt, QuizResult
+
+from conftest import make_user, make_quiz, login
+
+
+def _use_queue(app, mode, **config):
+    app.config.update(SUBMIT_QUEUE_MODE=mode, **config)
+    queue = submission_queue.SubmissionQueue(app)
+    app.extensions['submission_queue'] = queue
+    return queue
+
+
+def _attempt(app, client):
+    with app.app_context():
+        user = make_user('student')
+        quiz = make_quiz([('Q1', [('a', True), ('b', False)])])
+        question = Question.query.filter_by(quiz_id=quiz.id).one()
+        answers = {str(question.id): [question.answers.first().id]}
+        login(client, user)
+        quiz_id = quiz.id
+    attempt_id = client.post(f'/quizzes/{quiz_id}/attempt').get_json()['attempt_id']
+    return attempt_id, answers
+
+
+def _submit(client, attempt_id, answers):
+    return client.post(f'/quizzes/attempts/{attempt_id}/submit', json={'answers': answers})
+
+
+def _linked_result(app, attempt_id):
+    with app.app_context():
+        attempt = db.session.get(QuizAttempt, attempt_id)
+        assert attempt.submitted_at is not None
+        return attempt.result_id
+
+
+@pytest.mark.parametrize('mode', ['async', 'durable'])
+def test_queued_submission_links_the_attempt(app, client, mode):
+    queue = _use_queue(app, mode)
+    attempt_id, answers = _attempt(app, client)
+
+    response = _submit(client, attempt_id, answers)
+    assert response.status_code == 200
+    assert response.get_json()['correct_count'] == 1
+    queue.stop()
+
+    result_id = _linked_result(app, attempt_id)
+    assert result_id is not None
+    with app.app_context():
+        assert db.session.get(QuizResult, result_id).score == 100
+
+
+def test_durable_commit_timeout_falls_back_to_direct_write(app, client):
+    queue = _use_queue(app, 'durable', SUBMIT_QUEUE_COMMIT_TIMEOUT=0.2)
+    queue._ensure_writer = lambda: None  # писатель завис: никто не берет из очереди
+    attempt_id, answers = _attempt(app, client)
+
+    response = _submit(client, attempt_id, answers)
+
+    assert response.status_code == 200
+    assert response.get_json()['result_token'] is None
+    assert _linked_result(app, attempt_id) is not None
+    # Отозванная отправка не будет записана второй раз
+    batch = queue._next_batch()
+    assert len(batch) == 1
+    queue._write(batch)
+    with app.app_context():
+        assert QuizResult.query.count() == 1
+    assert not queue._pending and not queue._cancelled and not queue._sealed
+
+
+def test_durable_failed_write_raises_and_forgets_the_token(app, monkeypatch):
+    queue = _use_queue(app, 'durable')
+
+    def broken(pending):
+        raise RuntimeError('disk full')
+
+    monkeypatch.setattr(submission_queue, 'store_results', broken)
+    with pytest.raises(RuntimeError, match='could not be saved'):
+        queue.submit(1, 1, 100.0, {'results': []})
+    assert not queue._failed and not queue._waiting and not queue._pending
+    queue.stop()
+
+
+def test_durable_submit_waits_for_a_batch_being_written(app, monkeypatch):
+    queue = _use_queue(app, 'durable', SUBMIT_QUEUE_COMMIT_TIMEOUT=0.5)
+    release = threading.Event()
+    store_results = submission_queue.store_results
+
+    def slow_store(pending):
+        release.wait(5)  # дольше одного commit_timeout
+        return store_results(pending)
+
+    monkeypatch.setattr(submission_queue, 'store_results', slow_store)
+    with app.app_context():
+        user = make_user('student')
+        quiz = make_quiz([('Q1', [('a', True)])])
+        user_id, quiz_id = user.id, quiz.id
+    timer = threading.Timer(0.7, release.set)
+    timer.start()
+    with app.app_context():
+        pending = queue.submit(user_id, quiz_id, 100.0, {'results': []})
+    timer.join()
+
+    assert pending.committed.is_set()
+    queue.stop()
+    with app.app_context():
+        assert QuizResult.query.count() == 1
+
+
+def test_async_failed_batch_reopens_the_attempt(app, client, monkeypatch):
+    queue = _use_queue(app, 'async')
+    attempt_id, answers = _attempt(app, client)
+    store_results = submission_queue.store_results
+
+    def broken(pending):
+        raise RuntimeError('disk full')
+
+    monkeypatch.setattr(submission_queue, 'store_results', broken)
+    response = _submit(client, attempt_id, answers)
+    # Запрос уже получил токен, запись падает позже в фоновом потоке
+    assert response.status_code == 200
+    assert response.get_json()['result_token'] is not None
+    queue.stop()
+
+    with app.app_context():
+        attempt = db.session.get(QuizAttempt, attempt_id)
+        assert attempt.submitted_at is None and attempt.result_id is None
+        assert QuizResult.query.count() == 0
+
+    # Попытку можно отправить снова
+    monkeypatch.setattr(submission_queue, 'store_results', store_results)
+    queue = _use_queue(app, 'async')
+    assert _submit(client, attempt_id, answers).status_code == 200
+    queue.stop()
+    assert _linked_result(app, attempt_id) is not None
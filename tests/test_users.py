@@ -0,0 +1,55 @@
+import io
+
+from app import users
+from app.models import User
+
+from conftest import make_user
+
+
+def _parse(text):
+    return users.parse_import(io.BytesIO(text.encode('utf-8-sig')))
+
+
+def test_parse_import_reports_bad_rows():
+    rows, errors = _parse('username,password,is_admin\nann,pw1,да\n,x\nann,pw2\nbob,,\n')
+
+    assert [(row['line'], row['username'], row['password'], row['is_admin']) for row in rows] == \
+        [(2, 'ann', 'pw1', True), (5, 'bob', '', False)]
+    assert [(error['line'], error['message']) for error in errors] == \
+        [(3, 'empty username'), (4, 'duplicate in file')]
+
+
+def test_import_inserts_in_batches(app, monkeypatch):
+    app.config['USER_HASH_WORKERS'] = 1
+    monkeypatch.setattr(users, 'INSERT_BATCH_SIZE', 2)
+    with app.app_context():
+        make_user('taken')
+        rows, errors = _parse('taken,x\nann,pw1\nbob,\ncid,pw3\n')
+
+        stats = users.import_users(app, rows, errors)
+
+        assert (stats['total'], stats['processed'], stats['created']) == (4, 4, 3)
+        assert [(error['line'], error['message']) for error in stats['errors']] == [(1, 'username already exists')]
+        assert [name for name, _ in stats['passwords']] == ['bob']
+        assert User.query.filter_by(username='ann').one().check_password('pw1')
+        assert User.query.filter_by(username='bob').one().check_password(stats['passwords'][0][1])
+
+
+def test_conflicting_batch_falls_back_to_row_by_row(app, monkeypatch):
+    app.config['USER_HASH_WORKERS'] = 1
+    monkeypatch.setattr(users, 'INSERT_BATCH_SIZE', 3)
+    # Пользователь появился между проверкой имен и вставкой
+    monkeypatch.setattr(users, '_existing_usernames', lambda usernames: set())
+    with app.app_context():
+        make_user('bob')
+        rows, errors = _parse('ann,pw1\nbob,\ncid,pw3\ndan,pw4\n')
+
+        stats = users.import_users(app, rows, errors)
+
+        assert stats['created'] == 3
+        assert [(error['line'], error['username'], error['message']) for error in stats['errors']] == \
+            [(2, 'bob', 'username already exists')]
+        # Пароль сгенерирован для строки, которая не записалась, и не выдается
+        assert stats['passwords'] == []
+        assert sorted(name for (name,) in User.query.with_entities(User.username)) == ['ann', 'bob', 'cid', 'dan']
+        assert User.query.filter_by(username='bob').one().check_password('secret')
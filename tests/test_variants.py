@@ -0,0 +1,85 @@
+from app import db, grading, quiz_cache, variants
+from app.models import QuizPool
+
+from conftest import make_user, make_quiz, login
+
+
+def _pooled_quiz(draw_count=3, shuffle_answers=True):
+    quiz = make_quiz([(f'Q{n}', [(f'{n}a', True), (f'{n}b', False), (f'{n}c', False)]) for n in range(1, 7)])
+    db.session.add(QuizPool(quiz_id=quiz.id, draw_count=draw_count, shuffle_answers=shuffle_answers))
+    db.session.commit()
+    return quiz_cache.get_compiled_quiz(quiz.id)
+
+
+def _correct_answers(compiled, question_ids):
+    return {q_id: [a.id for a in compiled.questions_by_id[q_id].answers if a.is_correct] for q_id in question_ids}
+
+
+def test_draw_is_deterministic_per_seed(app):
+    with app.app_context():
+        compiled = _pooled_quiz()
+
+        drawn = variants.draw(compiled, 12345)
+        assert drawn == variants.draw(compiled, 12345)
+        assert len(drawn) == 3 and len(set(drawn)) == 3
+        assert set(drawn) <= set(compiled.question_ids)
+        assert len({variants.draw(compiled, seed) for seed in range(20)}) > 1
+        assert variants.decode(variants.encode(drawn)) == drawn
+
+        served = variants.questions(compiled, 12345, drawn)
+        assert [q.id for q in served] == list(drawn)
+        assert [[a.id for a in q.answers] for q in served] == \
+            [[a.id for a in q.answers] for q in variants.questions(compiled, 12345, drawn)]
+        assert all({a.id for a in q.answers} == {a.id for a in compiled.questions_by_id[q.id].answers}
+                   for q in served)
+
+
+def test_quiz_without_pool_serves_all_questions_in_order(app):
+    with app.app_context():
+        compiled = quiz_cache.get_compiled_quiz(make_quiz([('Q1', [('a', True)]), ('Q2', [('b', True)])]).id)
+
+        assert not compiled.is_pooled
+        assert variants.draw(compiled, 1) == compiled.question_ids
+        assert variants.decode(None) is None
+
+
+def test_variant_key_grades_only_served_questions(app):
+    with app.app_context():
+        compiled = _pooled_quiz()
+        drawn = variants.draw(compiled, 7)
+        other = next(q_id for q_id in compiled.question_ids if q_id not in drawn)
+        key = grading.variant_key(grading.answer_key(compiled), drawn)
+
+        answers = _correct_answers(compiled, drawn)
+        answers[other] = []  # не выданный вопрос не считается
+        full_results = grading.grade(key, answers)
+
+        assert full_results['total_questions'] == 3
+        assert full_results['correct_count'] == 3
+        assert grading.score(full_results) == 100
+        assert full_results['variant'] == list(drawn)
+        assert [item['question_id'] for item in full_results['results']] == list(drawn)
+
+
+def test_attempt_serves_the_same_variant_and_grades_against_it(app, client):
+    with app.app_context():
+        login(client, make_user('student'))
+        compiled = _pooled_quiz()
+        quiz_id = compiled.id
+
+    started = client.post(f'/quizzes/{quiz_id}/attempt').get_json()
+    served = [q['id'] for q in started['questions']]
+    assert len(served) == 3
+    resumed = client.post(f'/quizzes/{quiz_id}/attempt').get_json()
+    assert resumed['attempt_id'] == started['attempt_id']
+    assert resumed['questions'] == started['questions']
+
+    other = next(q_id for q_id in compiled.question_ids if q_id not in served)
+    attempt_id = started['attempt_id']
+    rejected = client.post(f'/quizzes/attempts/{attempt_id}/submit', json={'answers': {str(other): []}})
+    assert rejected.status_code == 400
+
+    answers = {str(q_id): a_ids for q_id, a_ids in _correct_answers(compiled, served).items()}
+    data = client.post(f'/quizzes/attempts/{attempt_id}/submit', json={'answers': answers}).get_json()
+    assert (data['total_questions'], data['correct_count']) == (3, 3)
+    assert data['variant'] == served